@@ -0,0 +1,67 @@
+"""Token verification with cold and warm keys, and with the token cache."""
+
+import pathlib
+import tempfile
+from typing import Any
+
+import harness
+import jwt
+
+from fastapi_utils.dependencies import authorize
+from fastapi_utils.dependencies.caches import KeyCache, TokenCache
+
+
+def run(timer: harness.Timer) -> list[dict[str, Any]]:
+    algorithm = authorize.encryption_config["jwt"]["algorithm"]
+    params = {"algorithm": algorithm}
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        private_path, public_path = harness.write_key_pair(
+            pathlib.Path(tmp_dir), algorithm
+        )
+        token = jwt.encode(
+            {"user_id": "user"}, private_path.read_bytes(), algorithm=algorithm
+        )
+        key_cache = KeyCache(public_path, algorithm)
+        previous_key_cache = authorize.VERIFICATION_KEY_CACHE
+        previous_token_cache = authorize.get_token_cache()
+        authorize.set_verification_key_cache(key_cache)
+        try:
+
+            def cold():
+                key_cache.invalidate()
+                authorize.decrypt_authorize_token(token)
+
+            results.append(
+                timer.measure(
+                    "auth.decrypt_authorize_token",
+                    cold,
+                    params={**params, "key": "cold"},
+                )
+            )
+            results.append(
+                timer.measure(
+                    "auth.decrypt_authorize_token",
+                    lambda: authorize.decrypt_authorize_token(token),
+                    params={**params, "key": "warm"},
+                )
+            )
+
+            authorize.set_token_cache(TokenCache())
+            results.append(
+                timer.measure(
+                    "auth.get_authorization_context",
+                    lambda: authorize.get_authorization_context(token),
+                    params={**params, "token_cache": "hit"},
+                )
+            )
+        finally:
+            authorize.set_verification_key_cache(previous_key_cache)
+            authorize.set_token_cache(previous_token_cache)
+    return results
+
+
+if __name__ == "__main__":
+    for result in run(harness.Timer()):
+        print(harness.format_result(result))
@@ -0,0 +1,55 @@
+"""Token signing throughput of `TokenSigner`."""
+
+import pathlib
+import tempfile
+from typing import Any
+
+import harness
+
+from fastapi_utils.dependencies.caches import KeyCache
+from fastapi_utils.dependencies.encrypt import TokenSigner
+
+ALGORITHMS = ("RS256", "ES256")
+BATCH_SIZE = 200
+
+
+def run(timer: harness.Timer) -> list[dict[str, Any]]:
+    results = []
+    for algorithm in ALGORITHMS:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            private_path, _ = harness.write_key_pair(pathlib.Path(tmp_dir), algorithm)
+            signer = TokenSigner(KeyCache(private_path, algorithm))
+            batch = [{"user_id": f"user-{i}"} for i in range(BATCH_SIZE)]
+            try:
+                results.append(
+                    timer.measure(
+                        "encrypt.create_access_token",
+                        lambda signer=signer, batch=batch: signer.create_access_token(
+                            batch[0], 5
+                        ),
+                        params={"algorithm": algorithm},
+                    )
+                )
+                for parallel in (False, True):
+                    results.append(
+                        timer.measure(
+                            "encrypt.create_access_tokens",
+                            lambda signer=signer, batch=batch, parallel=parallel: (
+                                signer.create_access_tokens(batch, 5, parallel=parallel)
+                            ),
+                            params={
+                                "algorithm": algorithm,
+                                "batch": BATCH_SIZE,
+                                "parallel": parallel,
+                            },
+                            items=BATCH_SIZE,
+                        )
+                    )
+            finally:
+                signer.close()
+    return results
+
+
+if __name__ == "__main__":
+    for result in run(harness.Timer()):
+        print(harness.format_result(result))
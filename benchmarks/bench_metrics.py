@@ -0,0 +1,63 @@
+"""Render time of the metrics endpoint against the number of series."""
+
+from typing import Any
+
+import fastapi
+import harness
+from prometheus_client import CollectorRegistry, generate_latest
+
+from fastapi_utils.prometheus_instrument import PrometheusInstrumentator, metrics
+
+HANDLERS = (10, 100, 1000)
+STATUSES = ("2xx", "4xx", "5xx")
+
+
+def create_app(handlers: int) -> tuple[fastapi.FastAPI, CollectorRegistry]:
+    """App whose registry holds the default metrics of `handlers` handlers."""
+    app = fastapi.FastAPI()
+    registry = CollectorRegistry()
+    instrumentation = metrics.default(registry=registry)
+    for i in range(handlers):
+        for status in STATUSES:
+            instrumentation(
+                metrics.Info(None, None, "GET", f"/resource{i}", status, 0.05)
+            )
+    PrometheusInstrumentator(registry=registry).instrument(app).expose(app)
+    return app, registry
+
+
+def run(timer: harness.Timer) -> list[dict[str, Any]]:
+    results = []
+    for handlers in HANDLERS:
+        app, registry = create_app(handlers)
+        client = harness.ASGIClient(app)
+        series = sum(len(metric.samples) for metric in registry.collect())
+        params = {"handlers": handlers, "series": series}
+
+        results.append(
+            timer.measure(
+                "metrics.generate_latest",
+                lambda registry=registry: generate_latest(registry),
+                params=params,
+            )
+        )
+        for encoding in ("identity", "gzip"):
+
+            async def scrape(client=client, encoding=encoding):
+                await client.request(
+                    "GET", "/metrics", headers=[("accept-encoding", encoding)]
+                )
+
+            results.append(
+                timer.measure_async(
+                    "metrics.endpoint",
+                    scrape,
+                    params={**params, "encoding": encoding},
+                )
+            )
+    return results
+
+
+if __name__ == "__main__":
+    for result in run(harness.Timer()):
+        print(harness.format_result(result))
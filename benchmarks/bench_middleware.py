@@ -0,0 +1,75 @@
+"""Overhead of `PrometheusMiddleware` compared to the same app without it."""
+
+from typing import Any, Optional
+
+import fastapi
+import harness
+from prometheus_client import CollectorRegistry
+
+from fastapi_utils.prometheus_instrument import PrometheusInstrumentator
+from fastapi_utils.prometheus_instrument.aggregation import AggregatedMetrics
+
+
+def create_app() -> fastapi.FastAPI:
+    app = fastapi.FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def read_item(item_id: int, q: Optional[str] = None):
+        return {"item_id": item_id, "q": q}
+
+    @app.post("/items")
+    async def create_item(item: dict[str, Any]):
+        return item
+
+    return app
+
+
+def instrumented_app(variant: str) -> fastapi.FastAPI:
+    app = create_app()
+    registry = CollectorRegistry()
+    instrumentator = PrometheusInstrumentator(registry=registry)
+    if variant == "aggregated":
+        instrumentator.add(AggregatedMetrics(registry=registry).instrumentation)
+    instrumentator.instrument(
+        app,
+        resolve_handler_after_routing=variant == "routed",
+        latency_breakdown=variant == "breakdown",
+    )
+    return app
+
+
+# `breakdown` wraps FastAPI's request handler for all apps, it runs last.
+VARIANTS = ("bare", "default", "routed", "aggregated", "breakdown")
+
+
+def run(timer: harness.Timer) -> list[dict[str, Any]]:
+    results = []
+    for variant in VARIANTS:
+        app = create_app() if variant == "bare" else instrumented_app(variant)
+        client = harness.ASGIClient(app)
+
+        async def get(client=client):
+            await client.request("GET", "/items/1?q=query")
+
+        async def post(client=client):
+            await client.request(
+                "POST",
+                "/items",
+                headers=[("content-type", "application/json")],
+                body=b'{"name": "item"}',
+            )
+
+        for method, func in (("GET", get), ("POST", post)):
+            results.append(
+                timer.measure_async(
+                    "middleware.request",
+                    func,
+                    params={"variant": variant, "method": method},
+                )
+            )
+    return results
+
+
+if __name__ == "__main__":
+    for result in run(harness.Timer()):
+        print(harness.format_result(result))
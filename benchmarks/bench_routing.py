@@ -0,0 +1,83 @@
+"""Handler lookup of the instrumentation against apps of growing size."""
+
+from typing import Any
+
+import fastapi
+import harness
+
+from fastapi_utils.prometheus_instrument import routing
+
+SIZES = (10, 100, 1000)
+
+
+def create_app(size: int) -> fastapi.FastAPI:
+    """App with `size` routes, half static and half templated, and a mount
+    holding a tenth of them."""
+    app = fastapi.FastAPI()
+
+    def endpoint():
+        return None
+
+    for i in range(size // 2):
+        app.get(f"/static{i}")(endpoint)
+        app.get(f"/resource{i}/{{item_id}}")(endpoint)
+
+    mounted = fastapi.FastAPI()
+    for i in range(max(size // 10, 1)):
+        mounted.get(f"/resource{i}/{{item_id}}")(endpoint)
+    app.mount("/mounted", mounted)
+    return app
+
+
+def scope(app: fastapi.FastAPI, path: str) -> dict[str, Any]:
+    return {
+        "type": "http",
+        "app": app,
+        "method": "GET",
+        "path": path,
+        "root_path": "",
+        "headers": [],
+        "query_string": b"",
+    }
+
+
+def run(timer: harness.Timer) -> list[dict[str, Any]]:
+    results = []
+    for size in SIZES:
+        app = create_app(size)
+        last = size // 2 - 1
+        cases = {
+            "first": scope(app, "/static0"),
+            "last_static": scope(app, f"/static{last}"),
+            "last_templated": scope(app, f"/resource{last}/1"),
+            "mounted": scope(app, f"/mounted/resource{max(size // 10, 1) - 1}/1"),
+            "not_found": scope(app, "/does/not/exist"),
+        }
+        routing.get_route_index(app)
+
+        for case, case_scope in cases.items():
+            params = {"routes": size, "case": case}
+            results.append(
+                timer.measure(
+                    "routing.get_route_name",
+                    lambda case_scope=case_scope: routing.get_scope_route_name(
+                        case_scope
+                    ),
+                    params=params,
+                )
+            )
+            results.append(
+                timer.measure(
+                    "routing.scan",
+                    lambda case_scope=case_scope, app=app: routing._get_route_name(
+                        case_scope, app.routes
+                    ),
+                    params=params,
+                )
+            )
+    return results
+
+
+if __name__ == "__main__":
+    for result in run(harness.Timer()):
+        print(harness.format_result(result))
@@ -0,0 +1,241 @@
+"""Timing, in-process ASGI client and result format shared by the benchmarks."""
+
+import asyncio
+import json
+import pathlib
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from importlib import metadata
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+PACKAGES = ("fastapi", "starlette", "prometheus-client", "pyjwt", "cryptography")
+
+
+class Timer:
+    """Runs a function enough times per repeat to get stable timings.
+
+    `quick` trades stability for speed, to smoke test the benchmarks.
+    """
+
+    def __init__(self, *, quick: bool = False):
+        self.repeat = 3 if quick else 7
+        self.min_time = 0.02 if quick else 0.2
+
+    def measure(
+        self,
+        name: str,
+        func: Callable[[], Any],
+        *,
+        params: Optional[dict[str, Any]] = None,
+        items: int = 1,
+    ) -> dict[str, Any]:
+        """Times `func`.
+
+        Args:
+            name: Name of the benchmark.
+            func: Function to time, one call being one operation.
+            params: Parameters of the benchmark, part of its identity when
+                results are compared.
+            items: Number of items processed by one operation, used for the
+                throughput.
+        """
+
+        def run(number: int) -> float:
+            start_time = time.perf_counter()
+            for _ in range(number):
+                func()
+            return time.perf_counter() - start_time
+
+        return self._measure(name, run, params, items)
+
+    def measure_async(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[Any]],
+        *,
+        params: Optional[dict[str, Any]] = None,
+        items: int = 1,
+    ) -> dict[str, Any]:
+        """Times the coroutine function `func`, all calls share one event loop."""
+        loop = asyncio.new_event_loop()
+
+        def run(number: int) -> float:
+            async def runs() -> float:
+                start_time = time.perf_counter()
+                for _ in range(number):
+                    await func()
+                return time.perf_counter() - start_time
+
+            return loop.run_until_complete(runs())
+
+        try:
+            return self._measure(name, run, params, items)
+        finally:
+            loop.close()
+
+    def _measure(
+        self,
+        name: str,
+        run: Callable[[int], float],
+        params: Optional[dict[str, Any]],
+        items: int,
+    ) -> dict[str, Any]:
+        number = 1
+        while True:
+            elapsed = run(number)
+            if elapsed >= self.min_time / 5:
+                break
+            number *= 4
+        number = max(1, int(number * self.min_time / elapsed))
+
+        timings = [run(number) / number for _ in range(self.repeat)]
+        median = statistics.median(timings)
+        return {
+            "name": name,
+            "params": params or {},
+            "number": number,
+            "repeat": self.repeat,
+            "min": min(timings),
+            "median": median,
+            "stdev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+            "items_per_second": items / median,
+        }
+
+
+class ASGIClient:
+    """Calls an ASGI app in-process: no network, no HTTP parsing.
+
+    Only the app and its middlewares are measured, unlike `httpx` or the
+    Starlette test client, whose own overhead exceeds the one of most
+    middlewares.
+    """
+
+    def __init__(self, app: Callable[..., Awaitable[None]]):
+        self.app = app
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        headers: Iterable[tuple[str, str]] = (),
+        body: bytes = b"",
+    ) -> tuple[int, bytes]:
+        path, _, query_string = path.partition("?")
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": query_string.encode(),
+            "headers": [
+                (key.lower().encode(), value.encode()) for key, value in headers
+            ],
+            "client": ("127.0.0.1", 50000),
+            "server": ("testserver", 80),
+        }
+        status = 0
+        chunks = []
+        body_sent = False
+
+        async def receive() -> dict[str, Any]:
+            nonlocal body_sent
+            if body_sent:
+                return {"type": "http.disconnect"}
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message: dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        return status, b"".join(chunks)
+
+
+def environment() -> dict[str, Any]:
+    """Describes where the results were measured, to compare like with like."""
+    versions = {}
+    for package in PACKAGES:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "commit": commit,
+        "packages": versions,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+
+
+def write_results(results: list[dict[str, Any]], output: Optional[str]) -> None:
+    document = {"environment": environment(), "results": results}
+    if output:
+        with open(output, "w") as file:
+            json.dump(document, file, indent=2)
+    else:
+        json.dump(document, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+
+def format_result(result: dict[str, Any]) -> str:
+    params = ",".join(f"{key}={value}" for key, value in result["params"].items())
+    return (
+        f"{result['name']:<32} {params:<40} "
+        f"{result['median'] * 1e6:12.2f} us {result['items_per_second']:14.1f} /s"
+    )
+
+
+def write_key_pair(
+    directory: pathlib.Path, algorithm: str
+) -> tuple[pathlib.Path, pathlib.Path]:
+    """Writes `private.pem` and `public.pem` for `algorithm` into `directory`.
+
+    Returns:
+        The paths of the private and the public key.
+    """
+    if algorithm.startswith("ES"):
+        private_key = ec.generate_private_key(ec.SECP256R1())
+    else:
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_path = directory / "private.pem"
+    public_path = directory / "public.pem"
+    private_path.write_bytes(
+        private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+    )
+    public_path.write_bytes(
+        private_key.public_key().public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+    )
+    return private_path, public_path
@@ -0,0 +1,94 @@
+"""Runs the benchmarks and writes the results as JSON.
+
+Everything runs in-process: requests are sent to the ASGI apps directly, with
+no server and no network.
+
+Usage:
+
+    PYTHONPATH=src python benchmarks/run.py --output results.json
+    PYTHONPATH=src python benchmarks/run.py --only routing,middleware --quick
+    PYTHONPATH=src python benchmarks/run.py --compare baseline.json
+
+With `--compare`, the median of every benchmark is compared to the one with
+the same name and parameters in the baseline, and the exit status is 1 if
+one of them is slower by more than `--max-regression`.
+"""
+
+import argparse
+import importlib
+import json
+import sys
+from typing import Any, Optional
+
+import harness
+
+BENCHMARKS = ("middleware", "routing", "auth", "encrypt", "metrics")
+
+
+def _key(result: dict[str, Any]) -> str:
+    return json.dumps([result["name"], result["params"]], sort_keys=True)
+
+
+def compare(
+    results: list[dict[str, Any]],
+    baseline: list[dict[str, Any]],
+    max_regression: float,
+) -> list[str]:
+    """Prints the change of every result, returns the regressed ones."""
+    baseline_medians = {_key(result): result["median"] for result in baseline}
+    regressions = []
+    for result in results:
+        baseline_median = baseline_medians.get(_key(result))
+        if baseline_median is None:
+            continue
+        change = result["median"] / baseline_median - 1
+        line = f"{harness.format_result(result)} {change:+8.1%}"
+        if change > max_regression:
+            regressions.append(line)
+        print(line, file=sys.stderr)
+    return regressions
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--only",
+        help=f"Comma separated benchmarks to run, among {', '.join(BENCHMARKS)}.",
+    )
+    parser.add_argument(
+        "--quick", action="store_true", help="Fewer, shorter runs, to smoke test."
+    )
+    parser.add_argument("--output", help="JSON file to write, default stdout.")
+    parser.add_argument("--compare", help="JSON results to compare with.")
+    parser.add_argument("--max-regression", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    names = args.only.split(",") if args.only else BENCHMARKS
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    timer = harness.Timer(quick=args.quick)
+    results = []
+    for name in names:
+        module = importlib.import_module(f"bench_{name}")
+        for result in module.run(timer):
+            print(harness.format_result(result), file=sys.stderr)
+            results.append(result)
+
+    harness.write_results(results, args.output)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(results, baseline, args.max_regression)
+        if regressions:
+            print(f"{len(regressions)} regression(s):", file=sys.stderr)
+            for line in regressions:
+                print(line, file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,97 @@
+import contextlib
+import functools
+import time
+from typing import AsyncIterator, Awaitable, Callable
+
+import anyio
 import fastapi
 import pydantic as pdt
+import utils
+from prometheus_client import REGISTRY, CollectorRegistry, Gauge
+
 from fastapi_utils.middlewares.exception_handlers import *
 from fastapi_utils.exceptions.resources import *
+from fastapi_utils.lifespan import add_lifespan
+from fastapi_utils.prometheus_instrument.metrics import get_or_create
+
+logger = utils.get_logger()
+
+WARM_UP_DURATION_NAME = "fastapi_utils_warm_up_duration_seconds"
+
+
+async def warm_up_verification_key(app: fastapi.FastAPI) -> None:
+    from fastapi_utils.dependencies import authorize
+
+    key_cache = authorize.get_verification_key_cache()
+    if not await anyio.Path(key_cache.path).exists():
+        await authorize.get_key_provider().get()
+    await anyio.to_thread.run_sync(key_cache.get)
+
+
+async def warm_up_signing_key(app: fastapi.FastAPI) -> None:
+    from fastapi_utils.dependencies import encrypt
+
+    await anyio.to_thread.run_sync(encrypt.get_token_signer().key_cache.get)
+
+
+async def warm_up_route_index(app: fastapi.FastAPI) -> None:
+    from fastapi_utils.prometheus_instrument import routing
+
+    routing.get_route_index(app)
+
+
+# Seconds a warm-up step may take before it is skipped, so that an unreachable
+# IAM does not hold the startup back. An interrupted key download goes on in
+# the background and is joined by the first request that needs the key.
+WARM_UP_TIMEOUT = 2.0
+
+WARM_UP_STEPS: dict[str, Callable[[fastapi.FastAPI], Awaitable[None]]] = {
+    "verification_key": warm_up_verification_key,
+    "signing_key": warm_up_signing_key,
+    "route_index": warm_up_route_index,
+}
+
+
+@contextlib.asynccontextmanager
+async def warm_up(
+    app: fastapi.FastAPI, registry: CollectorRegistry = REGISTRY
+) -> AsyncIterator[None]:
+    """Loads keys and lookup tables before the first request is served.
+
+    A failing step is logged and skipped, e.g. services that only verify tokens
+    have no signing key, and so is a step taking more than `WARM_UP_TIMEOUT`
+    seconds. The duration of each step is recorded in
+    `fastapi_utils_warm_up_duration_seconds` on `registry`.
+    """
+    duration = get_or_create(
+        Gauge,
+        WARM_UP_DURATION_NAME,
+        registry,
+        documentation="Time spent on each warm-up step during application startup.",
+        labelnames=("step",),
+    )
+    for step, func in WARM_UP_STEPS.items():
+        start_time = time.perf_counter()
+        try:
+            with anyio.fail_after(WARM_UP_TIMEOUT):
+                await func(app)
+        except TimeoutError:
+            logger.warning(
+                f"Skipped warm-up step {step}: timed out after {WARM_UP_TIMEOUT}s"
+            )
+        except Exception as exc:
+            logger.warning(f"Skipped warm-up step {step}: {exc!r}")
+        finally:
+            duration.labels(step).set(time.perf_counter() - start_time)
+    yield
 
 
-def create_app(**kwargs) -> fastapi.FastAPI:
+def create_app(
+    *,
+    warm_up_on_startup: bool = True,
+    registry: CollectorRegistry = REGISTRY,
+    **kwargs,
+) -> fastapi.FastAPI:
     app = fastapi.FastAPI(**kwargs)
     app.add_exception_handler(
         ResourceNotFoundException,
@@ -18,4 +105,6 @@ def create_app(**kwargs) -> fastapi.FastAPI:
         pdt.ValidationError,
         handle_validation_error,
     )
+    if warm_up_on_startup:
+        add_lifespan(app, functools.partial(warm_up, registry=registry))
     return app
@@ -1,3 +1,10 @@
 from fastapi_utils.dependencies.authorize import *
+from fastapi_utils.dependencies.caches import ExistenceCache as ExistenceCache
+from fastapi_utils.dependencies.caches import KeyCache as KeyCache
+from fastapi_utils.dependencies.caches import TokenCache as TokenCache
 from fastapi_utils.dependencies.encrypt import *
+from fastapi_utils.dependencies.executors import (
+    InstrumentedExecutor as InstrumentedExecutor,
+)
+from fastapi_utils.dependencies.keys import AsyncKeyProvider as AsyncKeyProvider
 from fastapi_utils.dependencies.resources import *
@@ -1,19 +1,38 @@
-import pathlib
 from typing import Any
 
+import anyio
 import fastapi
 import jwt
-import requests
 import utils
 from icecream import ic
 
 from fastapi_utils import schemas
+from fastapi_utils.dependencies.caches import KeyCache, TokenCache
+from fastapi_utils.dependencies.executors import InstrumentedExecutor
+from fastapi_utils.dependencies.keys import AsyncKeyProvider
 
-__all__ = ["tracing_headers", "get_authorization_context"]
+__all__ = [
+    "tracing_headers",
+    "get_authorization_context",
+    "get_authorization_context_async",
+    "get_verification_key_cache",
+    "set_verification_key_cache",
+    "get_token_cache",
+    "set_token_cache",
+    "get_key_provider",
+    "set_key_provider",
+    "get_verification_executor",
+    "set_verification_executor",
+]
 
 config = utils.get_config()
 encryption_config = config["application"]["encryption"]
 
+VERIFICATION_KEY_CACHE = None
+TOKEN_CACHE = None
+KEY_PROVIDER = None
+VERIFICATION_EXECUTOR = None
+
 
 def tracing_headers(
     session_id: str = fastapi.Header(None),
@@ -27,39 +46,121 @@ def tracing_headers(
     )
 
 
-# TODO: Move to common lib tex-corver encryption
-def get_decryption_key() -> bytes:
-    path = pathlib.Path(encryption_config["jwt"]["public_key"])
-    if not pathlib.Path(path).exists():
-        key = download_decryption_key()
-    return open(path, "rb").read()
-
-
-def download_decryption_key() -> bytes:
-    iam_host = config["iam"]["host"]
-    url = config["iam"]["actions"]["get_public_key"]["url"]
-    method = config["iam"]["actions"]["get_public_key"]["method"]
-    response = requests.request(
-        method=method,
-        url=f"{iam_host}{url}",
-    )
-    # TODO: Try except block
-    # TODO: Auto retry
-    path = pathlib.Path(encryption_config["jwt"]["public_key"])
-    key = response.content
-    open(path, "wb").write(key)
+def get_key_provider() -> AsyncKeyProvider:
+    global KEY_PROVIDER
+    if KEY_PROVIDER is None:
+        KEY_PROVIDER = AsyncKeyProvider.from_config(config)
+    return KEY_PROVIDER
+
+
+def set_key_provider(key_provider: AsyncKeyProvider):
+    global KEY_PROVIDER
+    KEY_PROVIDER = key_provider
+
+
+def fetch_verification_key() -> bytes:
+    """Fetch of the verification key cache: downloads the public key to its path
+    through the key provider, when it is missing or due for a refresh."""
+    return get_key_provider().fetch()
+
+
+def get_verification_key_cache() -> KeyCache:
+    global VERIFICATION_KEY_CACHE
+    if VERIFICATION_KEY_CACHE is None:
+        VERIFICATION_KEY_CACHE = KeyCache(
+            encryption_config["jwt"]["public_key"],
+            encryption_config["jwt"]["algorithm"],
+            fetch=fetch_verification_key,
+        )
+    return VERIFICATION_KEY_CACHE
+
+
+def set_verification_key_cache(key_cache: KeyCache):
+    global VERIFICATION_KEY_CACHE
+    VERIFICATION_KEY_CACHE = key_cache
+
+
+def get_verification_executor() -> InstrumentedExecutor:
+    global VERIFICATION_EXECUTOR
+    if VERIFICATION_EXECUTOR is None:
+        VERIFICATION_EXECUTOR = InstrumentedExecutor(
+            "token-verification",
+            max_workers=encryption_config["jwt"].get("verification_workers"),
+        )
+    return VERIFICATION_EXECUTOR
+
+
+def set_verification_executor(executor: InstrumentedExecutor):
+    global VERIFICATION_EXECUTOR
+    VERIFICATION_EXECUTOR = executor
+
+
+async def get_verification_key() -> Any:
+    """Non-blocking counterpart of `get_verification_key_cache().get()`."""
+    key_cache = get_verification_key_cache()
+    key = key_cache.peek()
+    if key is None:
+        if not await anyio.Path(key_cache.path).exists():
+            await get_key_provider().get()
+        key = await get_verification_executor().run(key_cache.get)
     return key
 
 
+def get_token_cache() -> TokenCache[schemas.AuthorizationContext] | None:
+    global TOKEN_CACHE
+    return TOKEN_CACHE
+
+
+def set_token_cache(token_cache: TokenCache[schemas.AuthorizationContext] | None):
+    global TOKEN_CACHE
+    TOKEN_CACHE = token_cache
+
+
 def get_authorization_context(
     authorization: str = fastapi.Header(...),
 ) -> schemas.AuthorizationContext:
-    return decrypt_authorize_token(authorization)
+    token_cache = get_token_cache()
+    if token_cache is None:
+        return decrypt_authorize_token(authorization)
+
+    context = token_cache.get(authorization)
+    if context is None:
+        context = decrypt_authorize_token(authorization)
+        token_cache.set(authorization, context, exp=getattr(context, "exp", None))
+    return context.model_copy()
+
+
+async def get_authorization_context_async(
+    authorization: str = fastapi.Header(...),
+) -> schemas.AuthorizationContext:
+    """Async variant of `get_authorization_context`.
+
+    The signature check runs on the dedicated verification executor instead of
+    the anyio thread pool shared by all sync dependencies.
+    """
+    token_cache = get_token_cache()
+    if token_cache is not None:
+        context = token_cache.get(authorization)
+        if context is not None:
+            return context.model_copy()
+
+    key = await get_verification_key()
+    context = await get_verification_executor().run(
+        decrypt_authorize_token, authorization, key
+    )
+    if token_cache is None:
+        return context
+    token_cache.set(authorization, context, exp=getattr(context, "exp", None))
+    return context.model_copy()
 
 
 # TODO: Move to common lib tex-corver encryption
-def decrypt_authorize_token(token: str) -> schemas.AuthorizationContext:
-    key = get_decryption_key()
+def decrypt_authorize_token(
+    token: str,
+    key: Any = None,
+) -> schemas.AuthorizationContext:
+    if key is None:
+        key = get_verification_key_cache().get()
     payload = jwt.decode(
         token,
         key=key,
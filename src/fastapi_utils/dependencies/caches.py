@@ -0,0 +1,386 @@
+import collections
+import hashlib
+import os
+import pathlib
+import threading
+import time
+from typing import Any, Callable, Generic, Hashable, Iterable, Optional, TypeVar
+
+import jwt
+import utils
+
+__all__ = ["KeyCache", "TokenCache", "ExistenceCache"]
+
+logger = utils.get_logger()
+
+T = TypeVar("T")
+
+
+class KeyCache:
+    """Process-wide cache of a parsed PEM key.
+
+    The key file is parsed once into the key object expected by PyJWT and kept
+    in memory. It is only re-read when its mtime changes or when `ttl` expires.
+    The file is stat-ed at most once every `check_interval` seconds, so the
+    common path costs no syscall at all.
+
+    `hits` and `misses` count the lookups, a miss being a (re)load of the file.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike,
+        algorithm: str,
+        *,
+        ttl: float = 3600.0,
+        check_interval: float = 1.0,
+        fetch: Optional[Callable[[], bytes]] = None,
+    ):
+        """
+        Args:
+            path: Location of the PEM file.
+            algorithm: JWT algorithm the key is used with, e.g. `RS256`.
+            ttl: Seconds after which the key is reloaded even if the file did not
+                change.
+            check_interval: Minimum seconds between two mtime checks.
+            fetch: Called when the file does not exist, or before reloading a
+                key older than `ttl`. It is expected to store the key at
+                `path`, like `AsyncKeyProvider.fetch`. When the key is only
+                older than `ttl`, a failing fetch is logged and the file is
+                reloaded as is.
+        """
+        self.path = pathlib.Path(path)
+        self.algorithm = algorithm
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self.fetch = fetch
+
+        self._lock = threading.Lock()
+        self._key: Any = None
+        self._mtime: Optional[float] = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self) -> Any:
+        """Returns the parsed key, reloading it if needed."""
+        now = time.monotonic()
+        if self._key is not None and now - self._checked_at < self.check_interval:
+            self.hits += 1
+            return self._key
+
+        with self._lock:
+            if self._key is not None and now - self._checked_at < self.check_interval:
+                self.hits += 1
+                return self._key
+            if self._is_stale(now):
+                self.misses += 1
+                self._load(now)
+            else:
+                self.hits += 1
+            self._checked_at = now
+            return self._key
+
+    def peek(self) -> Any:
+        """Returns the cached key if no check is due, otherwise `None`.
+
+        Never touches the filesystem, so it is safe to call on the event loop.
+        """
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return self._key
+        return None
+
+    def invalidate(self) -> None:
+        """Drops the cached key. The next `get()` reloads it from disk."""
+        with self._lock:
+            self._key = None
+            self._mtime = None
+            self._checked_at = 0.0
+
+    def _is_stale(self, now: float) -> bool:
+        if self._key is None or now - self._loaded_at >= self.ttl:
+            return True
+        try:
+            return self.path.stat().st_mtime != self._mtime
+        except FileNotFoundError:
+            return True
+
+    def _load(self, now: float) -> None:
+        if self.fetch is not None:
+            if not self.path.exists():
+                self.fetch()
+            elif self._key is not None and now - self._loaded_at >= self.ttl:
+                try:
+                    self.fetch()
+                except Exception as exc:
+                    logger.warning(
+                        f"Key refresh failed, reloading {self.path}: {exc!r}"
+                    )
+        pem = self.path.read_bytes()
+        self._mtime = self.path.stat().st_mtime
+        self._key = parse_key(pem, self.algorithm)
+        self._loaded_at = now
+
+
+def parse_key(pem: bytes, algorithm: str) -> Any:
+    """Parses PEM bytes into the key object PyJWT uses for `algorithm`."""
+    return jwt.get_algorithm_by_name(algorithm).prepare_key(pem)
+
+
+class TokenCache(Generic[T]):
+    """Bounded LRU cache of already verified tokens.
+
+    Entries are keyed by the SHA-256 digest of the token, so raw credentials are
+    never kept in memory, and expire at the token's `exp` claim (or after `ttl`
+    seconds, whichever comes first).
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._entries: collections.OrderedDict[bytes, tuple[float, T]] = (
+            collections.OrderedDict()
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, token: str) -> Optional[T]:
+        digest = self._digest(token)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[digest]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return value
+
+    def set(self, token: str, value: T, exp: Optional[float] = None) -> None:
+        expires_at = time.time() + self.ttl
+        if exp is not None:
+            expires_at = min(expires_at, float(exp))
+        digest = self._digest(token)
+        with self._lock:
+            self._entries[digest] = (expires_at, value)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+
+class _ExistencePartition:
+    __slots__ = ("entries", "generation", "hits", "misses", "evictions")
+
+    def __init__(self):
+        self.entries: collections.OrderedDict[Hashable, tuple[float, bool]] = (
+            collections.OrderedDict()
+        )
+        # Bumped on invalidations, so that results queried before one are not
+        # written after it.
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+class ExistenceCache:
+    """Bounded LRU cache of whether resources exist, per resource type.
+
+    Each resource type has its own LRU partition of `maxsize` entries, so that
+    a busy type does not evict the others. Both results are cached: a resource
+    that exists for `ttl` seconds, one that does not for `negative_ttl`
+    seconds. Writes made through the message bus invalidate the entries, see
+    `add_invalidation_handler`.
+
+    A result is only written if the resource type was not invalidated since the
+    `generation` read before querying it.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 4096,
+        ttl: float = 60.0,
+        negative_ttl: float = 5.0,
+        ttls: Optional[dict[str, float]] = None,
+    ):
+        """
+        Args:
+            maxsize: Entries kept per resource type.
+            ttl: Seconds a resource is known to exist.
+            negative_ttl: Seconds a resource is known not to exist.
+            ttls: `ttl` of some resource types, overriding the default one.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.ttls = ttls or {}
+
+        self._lock = threading.Lock()
+        self._partitions: dict[str, _ExistencePartition] = {}
+
+    @property
+    def hits(self) -> int:
+        return sum(partition.hits for partition in self._partitions.values())
+
+    @property
+    def misses(self) -> int:
+        return sum(partition.misses for partition in self._partitions.values())
+
+    @property
+    def evictions(self) -> int:
+        return sum(partition.evictions for partition in self._partitions.values())
+
+    def stats(self) -> dict[str, tuple[int, int, int]]:
+        """Returns the hits, misses and evictions of each resource type."""
+        return {
+            resource_type: (partition.hits, partition.misses, partition.evictions)
+            for resource_type, partition in list(self._partitions.items())
+        }
+
+    def get(self, resource_type: str, key: Hashable) -> Optional[bool]:
+        """Returns whether the resource exists, `None` if it is not cached."""
+        with self._lock:
+            partition = self._partition(resource_type)
+            entry = partition.entries.get(key)
+            if entry is None:
+                partition.misses += 1
+                return None
+            expires_at, exists = entry
+            if expires_at <= time.monotonic():
+                del partition.entries[key]
+                partition.misses += 1
+                return None
+            partition.entries.move_to_end(key)
+            partition.hits += 1
+            return exists
+
+    def generation(self, resource_type: str) -> int:
+        """Returns the invalidation count of `resource_type`, see `set_many`."""
+        with self._lock:
+            return self._partition(resource_type).generation
+
+    def set(
+        self,
+        resource_type: str,
+        key: Hashable,
+        exists: bool,
+        generation: Optional[int] = None,
+    ) -> None:
+        self.set_many(resource_type, {key: exists}, generation)
+
+    def set_many(
+        self,
+        resource_type: str,
+        results: dict[Hashable, bool],
+        generation: Optional[int] = None,
+    ) -> None:
+        """Caches the `results`, unless they are stale.
+
+        Args:
+            resource_type: Resource type of the results.
+            results: Whether each resource exists.
+            generation: `generation(resource_type)` read before querying the
+                results. They are dropped if `resource_type` was invalidated
+                since.
+        """
+        now = time.monotonic()
+        positive_expires_at = now + self.ttls.get(resource_type, self.ttl)
+        negative_expires_at = now + self.negative_ttl
+        with self._lock:
+            partition = self._partition(resource_type)
+            if generation is not None and generation != partition.generation:
+                return
+            entries = partition.entries
+            for key, exists in results.items():
+                expires_at = positive_expires_at if exists else negative_expires_at
+                entries[key] = (expires_at, exists)
+                entries.move_to_end(key)
+            while len(entries) > self.maxsize:
+                entries.popitem(last=False)
+                partition.evictions += 1
+
+    def invalidate(
+        self, resource_type: str, keys: Optional[Iterable[Hashable]] = None
+    ) -> None:
+        """Drops the entries of `keys`, or all of `resource_type` if `None`."""
+        with self._lock:
+            partition = self._partition(resource_type)
+            partition.generation += 1
+            if keys is None:
+                partition.entries.clear()
+                return
+            for key in keys:
+                partition.entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            for partition in self._partitions.values():
+                partition.generation += 1
+                partition.entries.clear()
+
+    def add_invalidation_handler(
+        self,
+        event_router: dict[type, list[Callable[..., Any]]],
+        event_cls: type,
+        resource_type: str,
+        get_id: Optional[Callable[[Any], Any]] = None,
+        exists: Optional[bool] = None,
+    ) -> Callable[[Any], None]:
+        """Updates the cache when the message bus handles `event_cls`.
+
+        Args:
+            event_router: Event router of the bootstrapper, the handler is
+                appended to the ones of `event_cls`.
+            event_cls: Event published on writes of `resource_type`, e.g. a
+                created or a deleted event.
+            resource_type: Resource type whose entries are updated.
+            get_id: Returns the id of the written resource from the event. The
+                whole resource type is invalidated when it is `None`.
+            exists: Result written through for the id, e.g. `True` on created
+                events and `False` on deleted events. The entry is dropped
+                when it is `None`. Either way, the results of the queries
+                running meanwhile are not cached.
+
+        Returns:
+            The added handler.
+        """
+
+        def handler(event: Any) -> None:
+            if get_id is None:
+                self.invalidate(resource_type)
+            elif exists is None:
+                self.invalidate(resource_type, (get_id(event),))
+            else:
+                id = get_id(event)
+                self.invalidate(resource_type, (id,))
+                self.set(resource_type, id, exists)
+
+        event_router.setdefault(event_cls, []).append(handler)
+        return handler
+
+    def _partition(self, resource_type: str) -> _ExistencePartition:
+        partition = self._partitions.get(resource_type)
+        if partition is None:
+            partition = self._partitions[resource_type] = _ExistencePartition()
+        return partition
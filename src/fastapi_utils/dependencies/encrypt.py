@@ -1,24 +1,121 @@
+import concurrent.futures
 from datetime import datetime, timedelta, timezone
-from typing import Any
+from typing import Any, Iterable, Optional
 
 import jwt
 import utils
 
-__all__ = ["create_access_token"]
+from fastapi_utils.dependencies.caches import KeyCache
+
+__all__ = [
+    "create_access_token",
+    "get_signing_key_cache",
+    "set_signing_key_cache",
+    "get_token_signer",
+    "set_token_signer",
+    "TokenSigner",
+]
+
+SIGNING_KEY_CACHE = None
+TOKEN_SIGNER = None
+
+
+class TokenSigner:
+    """Signs access tokens with an already parsed private key.
+
+    Batches can be signed on a thread pool: the cryptography backend releases
+    the GIL while signing, so RSA/EC signatures scale with the number of cores.
+    """
+
+    def __init__(self, key_cache: KeyCache, *, max_workers: Optional[int] = None):
+        """
+        Args:
+            key_cache: Cache holding the private key and its algorithm.
+            max_workers: Size of the thread pool used by `create_access_tokens`.
+                `None` lets the executor choose.
+        """
+        self.key_cache = key_cache
+        self.max_workers = max_workers
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+
+    def create_access_token(
+        self,
+        data: dict[str, Any],
+        expires_delta: int = None,
+    ) -> str:
+        expire = datetime.now(timezone.utc) + timedelta(minutes=expires_delta)
+        return self._encode(data, expire)
+
+    def create_access_tokens(
+        self,
+        batch: Iterable[dict[str, Any]],
+        expires_delta: int = None,
+        *,
+        parallel: bool = False,
+    ) -> list[str]:
+        """Signs every payload of `batch`, all sharing the same expiration.
+
+        Args:
+            batch: Payloads to sign.
+            expires_delta: Minutes until the tokens expire.
+            parallel: Sign on the thread pool instead of the calling thread.
+
+        Returns:
+            Tokens in the order of `batch`.
+        """
+        expire = datetime.now(timezone.utc) + timedelta(minutes=expires_delta)
+        if not parallel:
+            return [self._encode(data, expire) for data in batch]
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="token-signer",
+            )
+        return list(self._executor.map(lambda data: self._encode(data, expire), batch))
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _encode(self, data: dict[str, Any], expire: datetime) -> str:
+        return jwt.encode(
+            data | {"exp": expire},
+            self.key_cache.get(),
+            algorithm=self.key_cache.algorithm,
+        )
+
+
+def get_signing_key_cache() -> KeyCache:
+    global SIGNING_KEY_CACHE
+    if SIGNING_KEY_CACHE is None:
+        encryption_config = utils.get_config()["application"]["encryption"]
+        SIGNING_KEY_CACHE = KeyCache(
+            encryption_config["jwt"]["private_key"],
+            encryption_config["jwt"]["algorithm"],
+        )
+    return SIGNING_KEY_CACHE
+
+
+def set_signing_key_cache(key_cache: KeyCache):
+    global SIGNING_KEY_CACHE
+    SIGNING_KEY_CACHE = key_cache
+
+
+def get_token_signer() -> TokenSigner:
+    global TOKEN_SIGNER
+    if TOKEN_SIGNER is None:
+        TOKEN_SIGNER = TokenSigner(get_signing_key_cache())
+    return TOKEN_SIGNER
+
+
+def set_token_signer(token_signer: TokenSigner):
+    global TOKEN_SIGNER
+    TOKEN_SIGNER = token_signer
 
 
 def create_access_token(
     data: dict[str, Any],
     expires_delta: int = None,
 ) -> str:
-    config = utils.get_config()
-    encryption_config = config["application"]["encryption"]
-    expire = datetime.now(timezone.utc) + timedelta(minutes=expires_delta)
-    payload = data.copy() | {"exp": expire}
-    SECRET_KEY = open(encryption_config["jwt"]["private_key"], "rb").read()
-    encoded_jwt = jwt.encode(
-        payload,
-        SECRET_KEY,
-        algorithm=encryption_config["jwt"]["algorithm"],
-    )
-    return encoded_jwt
+    return get_token_signer().create_access_token(data, expires_delta)
@@ -0,0 +1,77 @@
+import asyncio
+import concurrent.futures
+from timeit import default_timer
+from typing import Callable, Optional, TypeVar
+
+from prometheus_client import REGISTRY, CollectorRegistry, Gauge, Histogram
+
+from fastapi_utils.prometheus_instrument.metrics import get_or_create
+
+__all__ = ["InstrumentedExecutor"]
+
+T = TypeVar("T")
+
+QUEUE_DEPTH_NAME = "fastapi_utils_executor_queue_depth"
+WAIT_TIME_NAME = "fastapi_utils_executor_wait_seconds"
+
+WAIT_TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+
+class InstrumentedExecutor:
+    """Dedicated thread pool for CPU bound work awaited from the event loop.
+
+    Keeps that work off anyio's shared thread limiter, so it cannot starve the
+    sync dependencies and endpoints of unrelated routes. Queue depth and wait
+    time are exported per executor `name` to help sizing `max_workers`, on
+    `registry`. Executors sharing a registry share the metrics.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_workers: Optional[int] = None,
+        registry: CollectorRegistry = REGISTRY,
+    ):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix=name,
+        )
+        queue_depth = get_or_create(
+            Gauge,
+            QUEUE_DEPTH_NAME,
+            registry,
+            documentation="Number of calls waiting for a worker thread by executor.",
+            labelnames=("executor",),
+            multiprocess_mode="livesum",
+        )
+        wait_time = get_or_create(
+            Histogram,
+            WAIT_TIME_NAME,
+            registry,
+            documentation="Time calls spent waiting for a worker thread by executor.",
+            labelnames=("executor",),
+            buckets=WAIT_TIME_BUCKETS,
+        )
+        self._queue_depth = queue_depth.labels(name)
+        self._wait_time = wait_time.labels(name)
+
+    async def run(self, func: Callable[..., T], *args) -> T:
+        submitted_at = default_timer()
+
+        def call() -> T:
+            self._queue_depth.dec()
+            self._wait_time.observe(default_timer() - submitted_at)
+            return func(*args)
+
+        self._queue_depth.inc()
+        future = self._executor.submit(call)
+        try:
+            return await asyncio.wrap_future(future)
+        finally:
+            if future.cancelled():
+                self._queue_depth.dec()
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
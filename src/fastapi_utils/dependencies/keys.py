@@ -0,0 +1,168 @@
+import asyncio
+import os
+import pathlib
+import tempfile
+import time
+from typing import Any, Optional
+
+import anyio
+import httpx
+import utils
+
+__all__ = ["AsyncKeyProvider"]
+
+logger = utils.get_logger()
+
+
+class AsyncKeyProvider:
+    """Downloads a public key without blocking the event loop.
+
+    * Concurrent callers share a single in-flight download (single-flight).
+    * Failed downloads are retried with exponential backoff.
+    * Once a key is known it is served immediately; when it is older than
+      `refresh_interval` a background refresh is started and the stale key is
+      returned meanwhile (stale-while-revalidate).
+
+    If `path` is given, every downloaded key is atomically written there, so the
+    file based `KeyCache` picks up rotations by itself. `fetch` is the blocking
+    counterpart of `get` for worker threads, e.g. as the `fetch` of the
+    `KeyCache`, with the same timeout and retries.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        method: str = "GET",
+        *,
+        path: Optional[str | os.PathLike] = None,
+        timeout: float = 5.0,
+        retries: int = 3,
+        backoff: float = 0.5,
+        refresh_interval: float = 3600.0,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.url = url
+        self.method = method
+        self.path = pathlib.Path(path) if path is not None else None
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.refresh_interval = refresh_interval
+        self.client = client
+
+        self.downloads = 0
+        self._key: Optional[bytes] = None
+        self._refresh_at = 0.0
+        self._inflight: Optional[asyncio.Future[bytes]] = None
+
+    @classmethod
+    def from_config(
+        cls,
+        config: dict[str, Any],
+        **kwargs: Any,
+    ) -> "AsyncKeyProvider":
+        """Builds a provider for the `get_public_key` action of the IAM config."""
+        action = config["iam"]["actions"]["get_public_key"]
+        kwargs.setdefault(
+            "path", config["application"]["encryption"]["jwt"]["public_key"]
+        )
+        for option in ("timeout", "retries", "backoff", "refresh_interval"):
+            if option in action:
+                kwargs.setdefault(option, action[option])
+        return cls(
+            f"{config['iam']['host']}{action['url']}",
+            action["method"],
+            **kwargs,
+        )
+
+    async def get(self) -> bytes:
+        """Returns the key, downloading it on first use."""
+        if self._key is None:
+            return await self.refresh()
+        if time.monotonic() >= self._refresh_at:
+            self._start_refresh()
+        return self._key
+
+    def fetch(self) -> bytes:
+        """Blocking `get`, downloads the key if it is unknown, due for a
+        refresh, or missing from `path`."""
+        missing = self.path is not None and not self.path.exists()
+        if self._key is not None and not missing:
+            if time.monotonic() < self._refresh_at:
+                return self._key
+        attempt = 0
+        while True:
+            try:
+                key = self._request_sync()
+                break
+            except httpx.HTTPError:
+                if attempt >= self.retries:
+                    raise
+                time.sleep(self.backoff * 2**attempt)
+                attempt += 1
+        self._downloaded(key)
+        return key
+
+    async def refresh(self) -> bytes:
+        """Downloads the key, joining an in-flight download if there is one."""
+        return await asyncio.shield(self._start_refresh())
+
+    def _start_refresh(self) -> "asyncio.Future[bytes]":
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._download())
+            self._inflight.add_done_callback(self._finish_refresh)
+        return self._inflight
+
+    def _finish_refresh(self, future: "asyncio.Future[bytes]") -> None:
+        self._inflight = None
+        if not future.cancelled() and future.exception() is not None:
+            # Keep serving the stale key, but do not retry on every request.
+            self._refresh_at = time.monotonic() + self.backoff * 2**self.retries
+            logger.warning(f"Public key refresh failed: {future.exception()!r}")
+
+    async def _download(self) -> bytes:
+        attempt = 0
+        while True:
+            try:
+                key = await self._request()
+                break
+            except httpx.HTTPError:
+                if attempt >= self.retries:
+                    raise
+                await asyncio.sleep(self.backoff * 2**attempt)
+                attempt += 1
+
+        await anyio.to_thread.run_sync(self._downloaded, key)
+        return key
+
+    def _downloaded(self, key: bytes) -> None:
+        if self.path is not None:
+            self._store(key)
+        self._key = key
+        self._refresh_at = time.monotonic() + self.refresh_interval
+
+    async def _request(self) -> bytes:
+        self.downloads += 1
+        if self.client is not None:
+            response = await self.client.request(
+                self.method, self.url, timeout=self.timeout
+            )
+        else:
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                response = await client.request(self.method, self.url)
+        response.raise_for_status()
+        return response.content
+
+    def _request_sync(self) -> bytes:
+        self.downloads += 1
+        with httpx.Client(timeout=self.timeout) as client:
+            response = client.request(self.method, self.url)
+        response.raise_for_status()
+        return response.content
+
+    def _store(self, key: bytes) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent)
+        with os.fdopen(fd, "wb") as file:
+            file.write(key)
+        os.replace(tmp_path, self.path)
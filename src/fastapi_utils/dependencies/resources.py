@@ -1,40 +1,449 @@
+import asyncio
 import fastapi
 import http
-from typing import NewType, TypeVar, Generic, Type
+import importlib.util
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Iterable,
+    Iterator,
+    NewType,
+    TypeVar,
+    Generic,
+    Hashable,
+    Type,
+)
 import core
+import sqlalchemy as sa
+from sqlalchemy.ext import asyncio as sa_asyncio
+from core import adapters
 import utils
-from fastapi_utils.exceptions import ResourceNotFoundException
+from fastapi_utils.dependencies.caches import ExistenceCache
+from fastapi_utils.exceptions import (
+    ResourceAlreadyExistsException,
+    ResourceNotFoundException,
+)
 
 __all__ = [
     # "verify_resource_existed",
     "get_resource_manager",
     "set_resource_manager",
+    "get_async_resource_manager",
+    "set_async_resource_manager",
+    "get_resource_engine",
+    "set_resource_engine",
+    "require_resource_existed",
+    "require_resource_inexisted",
     "ResourceManager",
+    "AsyncResourceManager",
 ]
 
 T = TypeVar("T", bound=core.BaseModel)
 ModelClsMapper = NewType("ModelClsMapper", dict[str, Type[core.BaseModel]])
 
 
-class ResourceManager:
-    def __init__(self, model_cls_map: ModelClsMapper):
+# Bound parameters per `IN (...)` query, below the SQLite limit of 999.
+MAX_IDS_PER_QUERY = 500
+
+# Async driver of the backends of the `database` config.
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+    "mysql": "aiomysql",
+}
+
+# Extra of this package installing each async driver, see `pyproject.toml`.
+ASYNC_DRIVER_EXTRAS = {
+    "asyncpg": "postgres",
+    "aiomysql": "mysql",
+}
+
+
+class BaseResourceManager:
+    """Queries and cache lookups shared by the sync and async managers."""
+
+    def __init__(
+        self,
+        model_cls_map: ModelClsMapper,
+        existence_cache: ExistenceCache | None = None,
+    ):
         self.model_cls_map = model_cls_map
-        self.views = core.View()
+        self.existence_cache = existence_cache
 
     def get_model_cls(self, resource_type: str) -> Type[T]:
         return self.model_cls_map[resource_type]
 
-    def verify_resource_inexisted(self, resource_type: str, **identifiers) -> None:
+    def get_column(self, resource_type: str, key: str) -> sa.Column:
+        mapper = sa.inspect(self.get_model_cls(resource_type))
+        return mapper.columns[key]
+
+    def parse_id(self, resource_type: str, value: str) -> Any:
+        """Converts an id read from a path to the Python type of the `id` column.
+
+        Raises:
+            ValueError: If `value` is not a valid id.
+        """
+        try:
+            python_type = self.get_column(resource_type, "id").type.python_type
+        except NotImplementedError:
+            return value
+        if isinstance(value, python_type):
+            return value
+        try:
+            return python_type(value)
+        except (TypeError, ArithmeticError) as e:
+            raise ValueError(f"Invalid id: {value!r}") from e
+
+    def _exists_statement(
+        self, resource_type: str, identifiers: dict[str, Any]
+    ) -> sa.Select:
+        condition = sa.and_(
+            *(
+                self.get_column(resource_type, key) == value
+                for key, value in identifiers.items()
+            )
+        )
+        return sa.select(sa.exists().where(condition))
+
+    def _existing_ids_statements(
+        self, resource_type: str, ids: list[Any], key: str
+    ) -> Iterator[sa.Select]:
+        column = self.get_column(resource_type, key)
+        for start in range(0, len(ids), MAX_IDS_PER_QUERY):
+            chunk = ids[start : start + MAX_IDS_PER_QUERY]
+            yield sa.select(column).where(column.in_(chunk))
+
+    def _cache_for(self, keys: Iterable[str]) -> ExistenceCache | None:
+        """The existence cache, if the lookup is by `id` only."""
+        if set(keys) == {"id"}:
+            return self.existence_cache
+        return None
+
+    def _split_cached(
+        self, resource_type: str, ids: list[Any]
+    ) -> tuple[set[Any], list[Any]]:
+        """Returns the cached existing ids and the uncached ones."""
+        existing = set()
+        uncached = []
+        for id in ids:
+            exists = self.existence_cache.get(resource_type, id)
+            if exists is None:
+                uncached.append(id)
+            elif exists:
+                existing.add(id)
+        return existing, uncached
+
+    def _raise_inexisted(self, resource_type: str, identifiers: dict[str, Any]):
         model_cls = self.get_model_cls(resource_type)
-        with self.views.fetch_model(model_cls, **identifiers) as model:
-            if model:
-                raise ValueError(f"{model_cls.__name__} already existed: {identifiers}")
+        raise ValueError(f"{model_cls.__name__} already existed: {identifiers}")
 
-    def verify_resource_existed(self, resource_type: str, **identifiers) -> None:
+    def _raise_existed(self, resource_type: str, identifiers: dict[str, Any]):
         model_cls = self.get_model_cls(resource_type)
-        with self.views.fetch_model(model_cls, **identifiers) as model:
-            if model is None:
-                raise ValueError(f"{model_cls.__name__} not found: {identifiers}")
+        raise ValueError(f"{model_cls.__name__} not found: {identifiers}")
+
+    def _raise_missing(self, resource_type: str, missing: list[Any]):
+        raise ResourceNotFoundException(missing, self.get_model_cls(resource_type))
+
+    def _raise_existing(self, resource_type: str, ids: list[Any], existing: set[Any]):
+        raise ResourceAlreadyExistsException(
+            [id for id in ids if id in existing],
+            self.get_model_cls(resource_type).__name__,
+        )
+
+
+class ResourceManager(BaseResourceManager):
+    """Checks that resources exist with queries that select no model.
+
+    Args:
+        model_cls_map: Mapped model class of each resource type.
+        engine: Engine the existence queries run on, `get_resource_engine()`
+            by default.
+        existence_cache: Caches the results of the lookups by `id`, see
+            `ExistenceCache.add_invalidation_handler` to keep it up to date.
+    """
+
+    def __init__(
+        self,
+        model_cls_map: ModelClsMapper,
+        engine: sa.Engine | None = None,
+        existence_cache: ExistenceCache | None = None,
+    ):
+        super().__init__(model_cls_map, existence_cache)
+        self._engine = engine
+
+    @property
+    def engine(self) -> sa.Engine:
+        if self._engine is None:
+            return get_resource_engine()
+        return self._engine
+
+    def resource_exists(self, resource_type: str, **identifiers) -> bool:
+        """Runs `SELECT EXISTS (...)`, without loading the model."""
+        cache = self._cache_for(identifiers)
+        if cache is not None:
+            exists = cache.get(resource_type, identifiers["id"])
+            if exists is not None:
+                return exists
+            generation = cache.generation(resource_type)
+        statement = self._exists_statement(resource_type, identifiers)
+        with self.engine.connect() as connection:
+            exists = bool(connection.scalar(statement))
+        if cache is not None:
+            cache.set(resource_type, identifiers["id"], exists, generation)
+        return exists
+
+    def find_existing_ids(
+        self, resource_type: str, ids: Iterable[Any], key: str = "id"
+    ) -> set[Any]:
+        """Returns the `ids` with a row, selecting only the `key` column.
+
+        One `IN (...)` query runs per `MAX_IDS_PER_QUERY` ids not found in the
+        existence cache.
+        """
+        ids = list(dict.fromkeys(ids))
+        cache = self._cache_for((key,))
+        if cache is None:
+            return self._query_existing_ids(resource_type, ids, key)
+
+        generation = cache.generation(resource_type)
+        existing, uncached = self._split_cached(resource_type, ids)
+        if uncached:
+            found = self._query_existing_ids(resource_type, uncached, key)
+            cache.set_many(
+                resource_type, {id: id in found for id in uncached}, generation
+            )
+            existing |= found
+        return existing
+
+    def _query_existing_ids(
+        self, resource_type: str, ids: list[Any], key: str
+    ) -> set[Any]:
+        existing = set()
+        with self.engine.connect() as connection:
+            for statement in self._existing_ids_statements(resource_type, ids, key):
+                existing.update(connection.scalars(statement))
+        return existing
+
+    def find_missing_ids(
+        self, resource_type: str, ids: Iterable[Any], key: str = "id"
+    ) -> list[Any]:
+        """Returns the `ids` without a row, in order and without duplicates."""
+        ids = list(dict.fromkeys(ids))
+        existing = self.find_existing_ids(resource_type, ids, key)
+        return [id for id in ids if id not in existing]
+
+    def verify_resource_inexisted(self, resource_type: str, **identifiers) -> None:
+        if self.resource_exists(resource_type, **identifiers):
+            self._raise_inexisted(resource_type, identifiers)
+
+    def verify_resource_existed(self, resource_type: str, **identifiers) -> None:
+        if not self.resource_exists(resource_type, **identifiers):
+            self._raise_existed(resource_type, identifiers)
+
+    def verify_resources_existed(
+        self, resource_type: str, ids: Iterable[Any], key: str = "id"
+    ) -> None:
+        """Checks that all `ids` exist, with a single query for most batches.
+
+        Raises:
+            ResourceNotFoundException: With the list of the missing ids as `id`.
+        """
+        missing = self.find_missing_ids(resource_type, ids, key)
+        if missing:
+            self._raise_missing(resource_type, missing)
+
+    def verify_resources_inexisted(
+        self, resource_type: str, ids: Iterable[Any], key: str = "id"
+    ) -> None:
+        """Checks that none of the `ids` exists.
+
+        Raises:
+            ResourceAlreadyExistsException: With the list of the existing ids as
+                `id`.
+        """
+        ids = list(dict.fromkeys(ids))
+        existing = self.find_existing_ids(resource_type, ids, key)
+        if existing:
+            self._raise_existing(resource_type, ids, existing)
+
+
+class AsyncResourceManager(BaseResourceManager):
+    """Non-blocking counterpart of `ResourceManager`, with the same methods.
+
+    Args:
+        model_cls_map: Mapped model class of each resource type.
+        engine: Async engine the existence queries run on, whose pool is
+            shared by all the checks. By default, the URL of the `database`
+            config with the async driver of its backend, see `ASYNC_DRIVERS`.
+        existence_cache: Caches the results of the lookups by `id`. Concurrent
+            lookups of an uncached id share a single query (single-flight).
+    """
+
+    def __init__(
+        self,
+        model_cls_map: ModelClsMapper,
+        engine: sa_asyncio.AsyncEngine | None = None,
+        existence_cache: ExistenceCache | None = None,
+    ):
+        super().__init__(model_cls_map, existence_cache)
+        self._engine = engine
+        self._inflight: dict[tuple[str, Hashable], asyncio.Future[bool]] = {}
+
+    @property
+    def engine(self) -> sa_asyncio.AsyncEngine:
+        if self._engine is None:
+            self._engine = create_async_engine_from_config()
+        return self._engine
+
+    async def dispose(self) -> None:
+        """Closes the connections of the pool."""
+        if self._engine is not None:
+            await self._engine.dispose()
+
+    async def resource_exists(self, resource_type: str, **identifiers) -> bool:
+        """Runs `SELECT EXISTS (...)`, without loading the model."""
+        cache = self._cache_for(identifiers)
+        if cache is None:
+            return await self._query_exists(resource_type, identifiers)
+        id = identifiers["id"]
+        exists = cache.get(resource_type, id)
+        if exists is not None:
+            return exists
+        key = (resource_type, id)
+        inflight = self._inflight.get(key)
+        if inflight is None:
+            inflight = asyncio.ensure_future(self._cache_exists(resource_type, id))
+            inflight.add_done_callback(lambda _: self._inflight.pop(key, None))
+            self._inflight[key] = inflight
+        return await asyncio.shield(inflight)
+
+    async def _cache_exists(self, resource_type: str, id: Any) -> bool:
+        generation = self.existence_cache.generation(resource_type)
+        exists = await self._query_exists(resource_type, {"id": id})
+        self.existence_cache.set(resource_type, id, exists, generation)
+        return exists
+
+    async def _query_exists(
+        self, resource_type: str, identifiers: dict[str, Any]
+    ) -> bool:
+        statement = self._exists_statement(resource_type, identifiers)
+        async with self.engine.connect() as connection:
+            return bool(await connection.scalar(statement))
+
+    async def find_existing_ids(
+        self, resource_type: str, ids: Iterable[Any], key: str = "id"
+    ) -> set[Any]:
+        """Returns the `ids` with a row, see `ResourceManager.find_existing_ids`."""
+        ids = list(dict.fromkeys(ids))
+        cache = self._cache_for((key,))
+        if cache is None:
+            return await self._query_existing_ids(resource_type, ids, key)
+
+        generation = cache.generation(resource_type)
+        existing, uncached = self._split_cached(resource_type, ids)
+        if uncached:
+            found = await self._query_existing_ids(resource_type, uncached, key)
+            cache.set_many(
+                resource_type, {id: id in found for id in uncached}, generation
+            )
+            existing |= found
+        return existing
+
+    async def _query_existing_ids(
+        self, resource_type: str, ids: list[Any], key: str
+    ) -> set[Any]:
+        existing = set()
+        async with self.engine.connect() as connection:
+            for statement in self._existing_ids_statements(resource_type, ids, key):
+                existing.update(await connection.scalars(statement))
+        return existing
+
+    async def find_missing_ids(
+        self, resource_type: str, ids: Iterable[Any], key: str = "id"
+    ) -> list[Any]:
+        """Returns the `ids` without a row, in order and without duplicates."""
+        ids = list(dict.fromkeys(ids))
+        existing = await self.find_existing_ids(resource_type, ids, key)
+        return [id for id in ids if id not in existing]
+
+    async def verify_resource_inexisted(
+        self, resource_type: str, **identifiers
+    ) -> None:
+        if await self.resource_exists(resource_type, **identifiers):
+            self._raise_inexisted(resource_type, identifiers)
+
+    async def verify_resource_existed(self, resource_type: str, **identifiers) -> None:
+        if not await self.resource_exists(resource_type, **identifiers):
+            self._raise_existed(resource_type, identifiers)
+
+    async def verify_resources_existed(
+        self, resource_type: str, ids: Iterable[Any], key: str = "id"
+    ) -> None:
+        """Raises `ResourceNotFoundException` listing the missing `ids`."""
+        missing = await self.find_missing_ids(resource_type, ids, key)
+        if missing:
+            self._raise_missing(resource_type, missing)
+
+    async def verify_resources_inexisted(
+        self, resource_type: str, ids: Iterable[Any], key: str = "id"
+    ) -> None:
+        """Raises `ResourceAlreadyExistsException` listing the existing `ids`."""
+        ids = list(dict.fromkeys(ids))
+        existing = await self.find_existing_ids(resource_type, ids, key)
+        if existing:
+            self._raise_existing(resource_type, ids, existing)
+
+
+def create_engine_from_config() -> sa.Engine:
+    config = utils.get_config()
+    return adapters.create_component_factory(config["database"]).engine
+
+
+RESOURCE_ENGINE = None
+
+
+def get_resource_engine() -> sa.Engine:
+    """Engine shared by the resource managers created without one.
+
+    It is created from the `database` config on first use, with its own pool.
+    Pass the engine of the app to `set_resource_engine` to reuse its pool.
+    """
+    global RESOURCE_ENGINE
+    if RESOURCE_ENGINE is None:
+        RESOURCE_ENGINE = create_engine_from_config()
+    return RESOURCE_ENGINE
+
+
+def set_resource_engine(engine: sa.Engine | None):
+    global RESOURCE_ENGINE
+    RESOURCE_ENGINE = engine
+
+
+def create_async_engine_from_config() -> sa_asyncio.AsyncEngine:
+    """Async engine on the database of the `database` config.
+
+    Raises:
+        ValueError: If the backend has no async driver.
+        ImportError: If the async driver of the backend is not installed.
+    """
+    engine = create_engine_from_config()
+    url = engine.url
+    # Only built for its URL, the pool of the async engine is used instead.
+    engine.dispose()
+    backend = url.get_backend_name()
+    driver = ASYNC_DRIVERS.get(backend)
+    if driver is None:
+        raise ValueError(f"No async driver for the {backend} backend")
+    if importlib.util.find_spec(driver) is None:
+        extra = ASYNC_DRIVER_EXTRAS.get(driver)
+        requirement = f"tex-corver-fastapi-utils[{extra}]" if extra else driver
+        raise ImportError(
+            f"The async driver of the {backend} backend, {driver}, is not"
+            f" installed, install {requirement}",
+            name=driver,
+        )
+    return sa_asyncio.create_async_engine(url.set(drivername=f"{backend}+{driver}"))
 
 
 RESOURCE_MANAGER = None
@@ -50,6 +459,74 @@ def set_resource_manager(resource_manager: ResourceManager):
     RESOURCE_MANAGER = resource_manager
 
 
+ASYNC_RESOURCE_MANAGER = None
+
+
+def get_async_resource_manager() -> AsyncResourceManager:
+    global ASYNC_RESOURCE_MANAGER
+    return ASYNC_RESOURCE_MANAGER
+
+
+def set_async_resource_manager(resource_manager: AsyncResourceManager):
+    global ASYNC_RESOURCE_MANAGER
+    ASYNC_RESOURCE_MANAGER = resource_manager
+
+
+def require_resource_existed(
+    resource_type: str, path_param: str = "id"
+) -> Callable[[fastapi.Request], Awaitable[None]]:
+    """FastAPI dependency checking that the resource of the `path_param` path
+    parameter exists, with the async resource manager.
+
+    The path parameter is converted to the type of the `id` column first, an
+    id that cannot be converted does not exist.
+
+    The `ResourceNotFoundException` it raises is turned into a 404 response by
+    `handle_resource_not_found`.
+    """
+
+    async def dependency(request: fastapi.Request) -> None:
+        value = request.path_params[path_param]
+        resource_manager = get_async_resource_manager()
+        try:
+            id = resource_manager.parse_id(resource_type, value)
+        except ValueError:
+            exists = False
+        else:
+            exists = await resource_manager.resource_exists(resource_type, id=id)
+        if not exists:
+            raise ResourceNotFoundException(
+                value, resource_manager.get_model_cls(resource_type)
+            )
+
+    return dependency
+
+
+def require_resource_inexisted(
+    resource_type: str, path_param: str = "id"
+) -> Callable[[fastapi.Request], Awaitable[None]]:
+    """FastAPI dependency checking that the resource of the `path_param` path
+    parameter does not exist yet, see `require_resource_existed`.
+
+    The `ResourceAlreadyExistsException` it raises is turned into a 409
+    response by `handle_resource_already_exists`.
+    """
+
+    async def dependency(request: fastapi.Request) -> None:
+        value = request.path_params[path_param]
+        resource_manager = get_async_resource_manager()
+        try:
+            id = resource_manager.parse_id(resource_type, value)
+        except ValueError:
+            return
+        if await resource_manager.resource_exists(resource_type, id=id):
+            raise ResourceAlreadyExistsException(
+                value, resource_manager.get_model_cls(resource_type).__name__
+            )
+
+    return dependency
+
+
 # async def verify_resource_inexisted(request: fastapi.Request):
 #     root_path = request.scope["root_path"]
 #     full_path = request.scope["path"]
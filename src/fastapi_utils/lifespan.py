@@ -0,0 +1,28 @@
+import contextlib
+from typing import Any, AsyncContextManager, AsyncIterator, Callable
+
+import fastapi
+
+__all__ = ["add_lifespan"]
+
+Lifespan = Callable[[fastapi.FastAPI], AsyncContextManager[Any]]
+
+
+def add_lifespan(app: fastapi.FastAPI, lifespan: Lifespan) -> None:
+    """Runs `lifespan` inside the lifespan the app already has.
+
+    Unlike passing `lifespan=` to `FastAPI()`, this can be called after the
+    app was created and composes with any lifespan (or startup/shutdown
+    handlers) registered before. States yielded by both are merged.
+    """
+    parent = app.router.lifespan_context
+
+    @contextlib.asynccontextmanager
+    async def lifespan_context(app: fastapi.FastAPI) -> AsyncIterator[Any]:
+        async with parent(app) as state:
+            async with lifespan(app) as child_state:
+                if child_state:
+                    state = {**(state or {}), **child_state}
+                yield state
+
+    app.router.lifespan_context = lifespan_context
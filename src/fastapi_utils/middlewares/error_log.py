@@ -0,0 +1,206 @@
+import contextlib
+import logging
+import queue
+import threading
+import time
+from logging import handlers
+from typing import Any, AsyncIterator
+
+import utils
+from prometheus_client import REGISTRY, CollectorRegistry, Counter
+
+from fastapi_utils.prometheus_instrument.metrics import get_or_create
+
+__all__ = ["ErrorLog"]
+
+DROP_POLICIES = ("newest", "oldest")
+
+# Wakes the thread up on `stop`. The thread stops on `ErrorLog._stopped`, not
+# on this sentinel, which the "oldest" policy may drop.
+_STOP = object()
+
+
+class _DroppingQueueHandler(handlers.QueueHandler):
+    """`QueueHandler` that drops records by policy instead of blocking."""
+
+    def __init__(self, log_queue: queue.Queue, policy: str, dropped: Counter):
+        super().__init__(log_queue)
+        self.policy = policy
+        self.dropped = dropped
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        if self.policy == "oldest":
+            with contextlib.suppress(queue.Empty):
+                self.queue.get_nowait()
+            with contextlib.suppress(queue.Full):
+                self.queue.put_nowait(record)
+        self.dropped.inc()
+
+
+class _Occurrences:
+    __slots__ = ("record", "start_time", "count")
+
+    def __init__(self, record: logging.LogRecord, start_time: float):
+        self.record = record
+        self.start_time = start_time
+        self.count = 0
+
+
+class ErrorLog:
+    """Hands error records to a background thread that writes them to `logger`.
+
+    The request only creates a record and puts it on a bounded queue. The
+    thread writes the first record of a signature, the level and the message,
+    and counts the identical ones that follow within `window` seconds, written
+    as one "N more occurrences" summary, quoting the last line of the message,
+    when the window ends.
+
+    Once stopped, the thread is not started again and records are written to
+    `logger` directly.
+
+    Args:
+        logger: Where records are written, `utils.get_logger()` by default.
+        window: Seconds during which identical records are deduplicated.
+        max_queue_size: Records waiting to be written, beyond which records are
+            dropped.
+        drop_policy: Record dropped when the queue is full, "newest" for the
+            incoming one or "oldest" for the one that waited the longest.
+        registry: Registry of the dropped and deduplicated records counters.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger | None = None,
+        *,
+        window: float = 10.0,
+        max_queue_size: int = 10000,
+        drop_policy: str = "newest",
+        registry: CollectorRegistry = REGISTRY,
+    ):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(
+                f"drop_policy must be one of {', '.join(DROP_POLICIES)}, "
+                f"got {drop_policy!r}"
+            )
+        self.target = logger if logger is not None else utils.get_logger()
+        self.window = window
+        self.queue: queue.Queue = queue.Queue(max_queue_size)
+        dropped = get_or_create(
+            Counter,
+            "fastapi_utils_error_log_dropped_total",
+            registry,
+            documentation="Error log records dropped because the log queue was full.",
+            labelnames=("policy",),
+        )
+        self.deduplicated = get_or_create(
+            Counter,
+            "fastapi_utils_error_log_deduplicated_total",
+            registry,
+            documentation="Error log records folded into an occurrence summary.",
+        )
+        self._logger = logging.Logger("fastapi_utils.error_log")
+        self._logger.addHandler(
+            _DroppingQueueHandler(self.queue, drop_policy, dropped.labels(drop_policy))
+        )
+        self._occurrences: dict[tuple[int, str], _Occurrences] = {}
+        self._thread: threading.Thread | None = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    def log(self, level: int, message: str) -> None:
+        if not self.target.isEnabledFor(level):
+            return
+        if self._thread is None:
+            self.start()
+        if self._stopped.is_set():
+            self.target.log(level, message)
+            return
+        self._logger.log(level, message)
+
+    def error(self, message: str) -> None:
+        self.log(logging.ERROR, message)
+
+    def info(self, message: str) -> None:
+        self.log(logging.INFO, message)
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None and not self._stopped.is_set():
+                self._thread = threading.Thread(
+                    target=self._run, name="error-log", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self) -> None:
+        """Writes the queued records and the pending summaries."""
+        with self._lock:
+            self._stopped.set()
+            thread = self._thread
+        if thread is None:
+            return
+        # A full queue wakes the thread up on its own.
+        with contextlib.suppress(queue.Full):
+            self.queue.put_nowait(_STOP)
+        thread.join()
+
+    @contextlib.asynccontextmanager
+    async def lifespan(self, app: Any) -> AsyncIterator[None]:
+        """Flushes the log on shutdown, see `add_lifespan`."""
+        self.start()
+        try:
+            yield
+        finally:
+            self.stop()
+
+    def _run(self) -> None:
+        while not (self._stopped.is_set() and self.queue.empty()):
+            try:
+                record = self.queue.get(timeout=self._timeout())
+            except queue.Empty:
+                record = None
+            now = time.monotonic()
+            self._flush(now)
+            if record is not None and record is not _STOP:
+                self._handle(record, now)
+        self._flush(float("inf"))
+
+    def _timeout(self) -> float | None:
+        if not self._occurrences:
+            return None
+        start_time = min(item.start_time for item in self._occurrences.values())
+        return max(start_time + self.window - time.monotonic(), 0.0)
+
+    def _handle(self, record: logging.LogRecord, now: float) -> None:
+        signature = (record.levelno, record.getMessage())
+        occurrences = self._occurrences.get(signature)
+        if occurrences is not None:
+            occurrences.count += 1
+            self.deduplicated.inc()
+            return
+        self._occurrences[signature] = _Occurrences(record, now)
+        self.target.handle(record)
+
+    def _flush(self, now: float) -> None:
+        """Ends the windows started `window` seconds before `now`."""
+        for signature, occurrences in list(self._occurrences.items()):
+            if now - occurrences.start_time < self.window:
+                continue
+            del self._occurrences[signature]
+            if occurrences.count:
+                self.target.handle(self._summary(occurrences))
+
+    def _summary(self, occurrences: _Occurrences) -> logging.LogRecord:
+        record = occurrences.record
+        last_line = record.getMessage().strip().splitlines()[-1:] or [""]
+        message = (
+            f"{occurrences.count} more occurrences in "
+            f"{time.monotonic() - occurrences.start_time:.1f}s: {last_line[0]}"
+        )
+        return logging.makeLogRecord(
+            {**record.__dict__, "msg": message, "args": None, "created": time.time()}
+        )
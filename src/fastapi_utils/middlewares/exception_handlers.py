@@ -1,82 +1,176 @@
-import fastapi
+import http
+import json
+import logging
+import random
 import traceback
+
+import fastapi
 import pydantic as pdt
-import http
-from fastapi import responses
 import utils
-from fastapi_utils.exceptions import *
+from fastapi import responses
+from prometheus_client import REGISTRY, CollectorRegistry, Counter
 
+from fastapi_utils.exceptions import *
+from fastapi_utils.middlewares.error_log import ErrorLog
+from fastapi_utils.prometheus_instrument.metrics import get_or_create
 
 logger = utils.get_logger()
 
+TRACEBACK_MODES = ("always", "off", "sampled", "debug")
+
+ERROR_RENDERER = None
+
+
+class ErrorTemplate:
+    """Error body of one status code, serialized up to the message.
+
+    Only the message, and the traceback when there is one, are serialized per
+    error: the rest of the body and the headers are built once.
+    """
+
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+        self.prefix = b'{"message":'
+        self.no_traceback = b',"traceback":null}'
+
+    def render(self, message: str, formatted_traceback: str | None) -> bytes:
+        body = self.prefix + json.dumps(message).encode()
+        if formatted_traceback is None:
+            return body + self.no_traceback
+        return body + b',"traceback":' + json.dumps(formatted_traceback).encode() + b"}"
+
+    def response(
+        self, message: str, formatted_traceback: str | None = None
+    ) -> responses.Response:
+        return responses.Response(
+            content=self.render(message, formatted_traceback),
+            status_code=self.status_code,
+            media_type="application/json",
+        )
+
+
+class ErrorRenderer:
+    """Turns handled exceptions into JSON error responses.
+
+    Args:
+        traceback_mode: When to format the traceback of an error, at most once,
+            to log it and return it in the body:
+
+            - "always": for every error.
+            - "off": never, the error is logged on one line at info level.
+            - "sampled": for a `sample_rate` fraction of the errors.
+            - "debug": when the logger is enabled for debug messages.
+        sample_rate: Fraction of the errors with a traceback in "sampled" mode.
+        error_log: Writes the errors off the request, deduplicated, instead of
+            logging them inline.
+        registry: Registry of the handled exceptions counter.
+    """
+
+    def __init__(
+        self,
+        traceback_mode: str = "always",
+        sample_rate: float = 0.01,
+        error_log: ErrorLog | None = None,
+        registry: CollectorRegistry = REGISTRY,
+    ):
+        if traceback_mode not in TRACEBACK_MODES:
+            raise ValueError(
+                f"traceback_mode must be one of {', '.join(TRACEBACK_MODES)}, "
+                f"got {traceback_mode!r}"
+            )
+        self.traceback_mode = traceback_mode
+        self.sample_rate = sample_rate
+        self.error_log = error_log
+        self._templates: dict[int, ErrorTemplate] = {}
+        self._counters: dict[tuple[type[Exception], int], Counter] = {}
+        self.handled_exceptions = get_or_create(
+            Counter,
+            "fastapi_utils_handled_exceptions_total",
+            registry,
+            documentation="Exceptions turned into error responses, by exception type.",
+            labelnames=("exception", "status_code"),
+        )
+
+    def template(self, status_code: int) -> ErrorTemplate:
+        template = self._templates.get(status_code)
+        if template is None:
+            template = self._templates[status_code] = ErrorTemplate(status_code)
+        return template
+
+    def capture_traceback(self) -> bool:
+        mode = self.traceback_mode
+        if mode == "always":
+            return True
+        if mode == "sampled":
+            return random.random() < self.sample_rate
+        if mode == "debug":
+            return logger.isEnabledFor(logging.DEBUG)
+        return False
+
+    def count(self, exc: Exception, status_code: int) -> None:
+        key = (type(exc), status_code)
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = self._counters[key] = self.handled_exceptions.labels(
+                type(exc).__name__, str(int(status_code))
+            )
+        counter.inc()
+
+    def render(self, exc: Exception, status_code: int) -> responses.Response:
+        self.count(exc, status_code)
+        message = str(exc)
+        formatted_traceback = None
+        log = logger if self.error_log is None else self.error_log
+        if self.capture_traceback():
+            formatted_traceback = "".join(traceback.format_exception(exc))
+            log.error(formatted_traceback)
+        else:
+            log.info(f"{type(exc).__name__} ({status_code}): {message}")
+        return self.template(status_code).response(message, formatted_traceback)
+
+
+def get_error_renderer() -> ErrorRenderer:
+    global ERROR_RENDERER
+    if ERROR_RENDERER is None:
+        ERROR_RENDERER = ErrorRenderer()
+    return ERROR_RENDERER
+
+
+def set_error_renderer(error_renderer: ErrorRenderer):
+    global ERROR_RENDERER
+    ERROR_RENDERER = error_renderer
+
 
 async def handle_resource_not_found(
     request: fastapi.Request,
     exc: ResourceNotFoundException,
 ):
-    logger.error(traceback.format_exc())
-    return responses.JSONResponse(
-        status_code=http.HTTPStatus.NOT_FOUND,
-        content={
-            "message": str(exc),
-            "traceback": traceback.format_exc(),
-        },
-    )
+    return get_error_renderer().render(exc, http.HTTPStatus.NOT_FOUND)
 
 
 async def handle_resource_already_exists(
     request: fastapi.Request,
     exc: ResourceAlreadyExistsException,
 ):
-    logger.error(traceback.format_exc())
-    return responses.JSONResponse(
-        status_code=http.HTTPStatus.CONFLICT,
-        content={
-            "message": str(exc),
-            "traceback": traceback.format_exc(),
-        },
-    )
+    return get_error_renderer().render(exc, http.HTTPStatus.CONFLICT)
 
 
 async def handle_validation_error(
     request: fastapi.Request,
     exc: pdt.ValidationError,
 ):
-    logger.error(traceback.format_exc())
-    return responses.JSONResponse(
-        status_code=http.HTTPStatus.UNPROCESSABLE_ENTITY,
-        content={
-            "message": str(exc),
-            "traceback": traceback.format_exc(),
-        },
-    )
-
-
+    return get_error_renderer().render(exc, http.HTTPStatus.UNPROCESSABLE_ENTITY)
 
 
 async def handle_unauthorized(
     request: fastapi.Request,
     exc: fastapi.HTTPException,
 ):
-    logger.error(traceback.format_exc())
-    return responses.JSONResponse(
-        status_code=http.HTTPStatus.UNAUTHORIZED,
-        content={
-            "message": str(exc),
-            "traceback": traceback.format_exc(),
-        },
-    )
+    return get_error_renderer().render(exc, http.HTTPStatus.UNAUTHORIZED)
 
 
 async def handle_pydantic_error(
     request: fastapi.Request,
     exc: pdt.ValidationError,
 ):
-    logger.error(traceback.format_exc())
-    return responses.JSONResponse(
-        status_code=http.HTTPStatus.BAD_REQUEST,
-        content={
-            "message": str(exc),
-            "traceback": traceback.format_exc(),
-        },
-    )
+    return get_error_renderer().render(exc, http.HTTPStatus.BAD_REQUEST)
@@ -0,0 +1,406 @@
+"""
+Lock-free alternative to `metrics.default`.
+
+`metrics.default` updates five `prometheus_client` metrics per request, each
+update taking the metric lock. `AggregatedMetrics` exports the same metrics,
+but requests only increment plain Python integers and floats in a per-thread
+record. The records are folded into metric families when the registry is
+collected, i.e. on scrape.
+
+With `buffer_size`, requests do not even look up their latency buckets: the
+raw durations are appended to a per-thread buffer and bucketed in batches,
+with NumPy's `searchsorted` if NumPy is installed, or by sorting the batch and
+bisecting it once per bound otherwise. The buffer is bucketed when it is full,
+and the pending durations are included in every scrape. The cost per request
+then no longer depends on the number of buckets, so the latency histograms
+can use fine layouts (see `buckets`), and with `sparse_buckets` only the
+observed buckets are exported.
+
+When a thread exits, its record is folded into a shared total, so the number
+of records stays bounded by the number of live threads, e.g. when anyio's
+thread pool replaces its idle workers.
+
+The records live in the memory of the process, so in multiprocess mode (see
+`multiprocess`) the metrics of other workers are not exported.
+
+Usage:
+
+```python
+aggregated = AggregatedMetrics(registry=registry)
+PrometheusInstrumentator(registry=registry).add(aggregated.instrumentation)
+```
+"""
+
+import bisect
+import threading
+import weakref
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from prometheus_client import REGISTRY, CollectorRegistry
+from prometheus_client.metrics_core import (
+    CounterMetricFamily,
+    HistogramMetricFamily,
+    Metric,
+    SummaryMetricFamily,
+)
+from prometheus_client.registry import Collector
+from prometheus_client.utils import floatToGoString
+
+from .cardinality import OVERFLOW_LABEL_VALUE, dropped_label_sets
+from .metrics import Info
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - NumPy is optional
+    numpy = None
+
+DEFAULT_LATENCY_HIGHR_BUCKETS = (
+    0.01,
+    0.025,
+    0.05,
+    0.075,
+    0.1,
+    0.25,
+    0.5,
+    0.75,
+    1,
+    1.5,
+    2,
+    2.5,
+    3,
+    3.5,
+    4,
+    4.5,
+    5,
+    7.5,
+    10,
+    30,
+    60,
+)
+
+# Layout of a record, one per (method, status, handler) and thread.
+_COUNT, _IN_SIZE, _OUT_SIZE, _LOWR_SUM, _HIGHR_SUM, _BUCKETS = range(6)
+
+_Key = Tuple[str, str, str]
+
+# Durations of a record not bucketed yet: (record, durations, 2xx durations).
+_Pending = Tuple[list, List[float], List[float]]
+
+
+class _Shard:
+    """Records of one thread."""
+
+    def __init__(self):
+        self.records: dict[_Key, list] = {}
+        self.pending: dict[int, _Pending] = {}
+        self.buffered = 0
+        # Only taken to bucket the buffer and to read it on scrape.
+        self.lock = threading.Lock()
+
+
+class _ShardOwner:
+    """Only referenced by the thread-local storage of the shard's thread,
+    hence released when the thread exits."""
+
+    __slots__ = ("__weakref__",)
+
+
+class AggregatedMetrics(Collector):
+    def __init__(
+        self,
+        metric_namespace: str = "",
+        metric_subsystem: str = "",
+        latency_highr_buckets: Sequence[float] = DEFAULT_LATENCY_HIGHR_BUCKETS,
+        latency_lowr_buckets: Sequence[float] = (0.1, 0.5, 1),
+        registry: Optional[CollectorRegistry] = REGISTRY,
+        max_label_sets: Optional[int] = 10_000,
+        buffer_size: Optional[int] = None,
+        sparse_buckets: bool = False,
+    ):
+        """Creates the collector and registers it in `registry`.
+
+        Exports the same metrics as `metrics.default` with the same arguments.
+
+        Args:
+            max_label_sets (int, optional): Maximum number of
+                (method, status, handler) label sets per thread. Further label
+                sets are recorded as `__overflow__`.
+
+            buffer_size (int, optional): Number of durations buffered per
+                thread before they are bucketed. `None` buckets every duration
+                on arrival.
+
+            sparse_buckets (bool, optional): Only export the buckets that were
+                observed, and the bucket below each of them, which keeps
+                `histogram_quantile` exact. Meant for fine layouts such as
+                `buckets.native_buckets`, where most buckets stay empty.
+        """
+        self.namespace = metric_namespace
+        self.subsystem = metric_subsystem
+        self.highr_bounds = [
+            float(b) for b in latency_highr_buckets if b != float("inf")
+        ]
+        self.lowr_bounds = [float(b) for b in latency_lowr_buckets if b != float("inf")]
+        self.max_label_sets = max_label_sets
+        self.buffer_size = buffer_size
+        self.sparse_buckets = sparse_buckets
+
+        self._highr_offset = _BUCKETS + len(self.lowr_bounds) + 1
+        self._record_size = self._highr_offset + len(self.highr_bounds) + 1
+        self._lowr_search = _search_bounds(self.lowr_bounds)
+        self._highr_search = _search_bounds(self.highr_bounds)
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._shards_lock = threading.Lock()
+        # Records of the threads that exited.
+        self._retired: dict[_Key, list] = {}
+        self._dropped = None
+
+        if registry is not None:
+            self._dropped = dropped_label_sets(
+                metric_namespace, metric_subsystem, registry
+            ).labels(self._name("http_requests"))
+            registry.register(self)
+
+    def instrumentation(self, info: Info) -> None:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._new_shard()
+
+        key = (info.method, info.modified_status, info.modified_handler)
+        record = shard.records.get(key)
+        if record is None:
+            record = self._new_record(shard, key)
+
+        duration = info.modified_duration
+        record[_COUNT] += 1
+        record[_IN_SIZE] += info.request_body_size
+        record[_OUT_SIZE] += info.response_body_size
+
+        if self.buffer_size is not None:
+            pending = shard.pending.get(id(record))
+            if pending is None:
+                pending = shard.pending[id(record)] = (record, [], [])
+            pending[1].append(duration)
+            if info.modified_status.startswith("2"):
+                pending[2].append(duration)
+            shard.buffered += 1
+            if shard.buffered >= self.buffer_size:
+                self._flush(shard)
+            return
+
+        record[_LOWR_SUM] += duration
+        record[_BUCKETS + bisect.bisect_left(self.lowr_bounds, duration)] += 1
+        if info.modified_status.startswith("2"):
+            record[_HIGHR_SUM] += duration
+            bucket = bisect.bisect_left(self.highr_bounds, duration)
+            record[self._highr_offset + bucket] += 1
+
+    def collect(self) -> Iterator[Metric]:
+        total = CounterMetricFamily(
+            self._name("http_requests"),
+            "Total number of requests by method, status and handler.",
+            labels=("method", "status", "handler"),
+        )
+        in_size = SummaryMetricFamily(
+            self._name("http_request_size_bytes"),
+            "Body size of incoming requests by handler. "
+            "Counted as the body is received, chunked requests included. "
+            "No percentile calculated. ",
+            labels=("handler",),
+        )
+        out_size = SummaryMetricFamily(
+            self._name("http_response_size_bytes"),
+            "Body size of outgoing responses by handler. "
+            "Counted as the body is sent, streaming responses included. "
+            "No percentile calculated. ",
+            labels=("handler",),
+        )
+        latency_highr = HistogramMetricFamily(
+            self._name("http_request_duration_highr_seconds"),
+            "Latency with many buckets but no API specific labels. "
+            "Made for more accurate percentile calculations. ",
+        )
+        latency_lowr = HistogramMetricFamily(
+            self._name("http_request_duration_seconds"),
+            "Latency with only few buckets by handler. "
+            "Made to be only used if aggregation by handler is important. ",
+            labels=("method", "handler"),
+        )
+
+        records = self._merge_shards()
+        sizes: dict[str, list] = {}
+        lowr: dict[Tuple[str, str], list] = {}
+        highr = [0.0] * self._record_size
+        for (method, status, handler), record in records.items():
+            total.add_metric((method, status, handler), record[_COUNT])
+            _add(
+                sizes.setdefault(handler, [0] * 3),
+                record,
+                (_COUNT, _IN_SIZE, _OUT_SIZE),
+            )
+            _add(
+                lowr.setdefault((method, handler), [0.0] * self._record_size),
+                record,
+            )
+            if status.startswith("2"):
+                _add(highr, record)
+
+        for handler, (count, in_sum, out_sum) in sizes.items():
+            in_size.add_metric((handler,), count_value=count, sum_value=in_sum)
+            out_size.add_metric((handler,), count_value=count, sum_value=out_sum)
+        for labels, record in lowr.items():
+            latency_lowr.add_metric(
+                labels,
+                self._buckets(record, _BUCKETS, self.lowr_bounds),
+                record[_LOWR_SUM],
+            )
+        latency_highr.add_metric(
+            (),
+            self._buckets(highr, self._highr_offset, self.highr_bounds),
+            highr[_HIGHR_SUM],
+        )
+
+        yield total
+        yield in_size
+        yield out_size
+        yield latency_highr
+        yield latency_lowr
+
+    def _name(self, name: str) -> str:
+        return "_".join(part for part in (self.namespace, self.subsystem, name) if part)
+
+    def _new_shard(self) -> _Shard:
+        shard = _Shard()
+        owner = _ShardOwner()
+        weakref.finalize(owner, self._retire, shard)
+        self._local.shard = shard
+        self._local.owner = owner
+        with self._shards_lock:
+            self._shards.append(shard)
+        return shard
+
+    def _retire(self, shard: _Shard) -> None:
+        """Folds the shard of a thread that exited into the retired records."""
+        with self._shards_lock, shard.lock:
+            for record, durations, highr_durations in shard.pending.values():
+                self._bucket(record, durations, highr_durations)
+            for key, record in shard.records.items():
+                _add(self._retired.setdefault(key, [0] * self._record_size), record)
+            self._shards.remove(shard)
+
+    def _new_record(self, shard: _Shard, key: _Key) -> list:
+        records = shard.records
+        if self.max_label_sets is not None and len(records) >= self.max_label_sets:
+            if self._dropped is not None:
+                self._dropped.inc()
+            key = (OVERFLOW_LABEL_VALUE,) * 3
+            record = records.get(key)
+            if record is not None:
+                return record
+        record = records[key] = [0] * self._record_size
+        return record
+
+    def _flush(self, shard: _Shard) -> None:
+        """Buckets the buffer of `shard`, only called by its thread."""
+        with shard.lock:
+            for record, durations, highr_durations in shard.pending.values():
+                self._bucket(record, durations, highr_durations)
+            shard.pending.clear()
+            shard.buffered = 0
+
+    def _bucket(
+        self, record: list, durations: List[float], highr_durations: List[float]
+    ) -> None:
+        if not durations:
+            return
+        record[_LOWR_SUM] += sum(durations)
+        _add_at(record, _BUCKETS, _bucket_counts(durations, self._lowr_search))
+        if highr_durations:
+            record[_HIGHR_SUM] += sum(highr_durations)
+            _add_at(
+                record,
+                self._highr_offset,
+                _bucket_counts(highr_durations, self._highr_search),
+            )
+
+    def _merge_shards(self) -> dict[_Key, list]:
+        # A shard is retired under the lock, so it is either in the list or
+        # in the retired records, never in both.
+        with self._shards_lock:
+            shards = list(self._shards)
+            records = {key: list(record) for key, record in self._retired.items()}
+        for shard in shards:
+            # The lock keeps the thread from moving its buffer into the
+            # records while both are read, which would count durations twice.
+            with shard.lock:
+                # The pending durations are copied first, so their records
+                # are copied too. Copying is atomic, the records may be
+                # updated while they are merged, which at worst splits a
+                # request across scrapes.
+                pending = [
+                    (record, list(durations), list(highr_durations))
+                    for record, durations, highr_durations in list(
+                        shard.pending.values()
+                    )
+                ]
+                keys = {}
+                for key, record in list(shard.records.items()):
+                    keys[id(record)] = key
+                    _add(records.setdefault(key, [0] * self._record_size), record)
+            for record, durations, highr_durations in pending:
+                self._bucket(records[keys[id(record)]], durations, highr_durations)
+        return records
+
+    def _buckets(
+        self, record: list, offset: int, bounds: List[float]
+    ) -> List[Tuple[str, float]]:
+        buckets = []
+        cumulative = 0
+        last = len(bounds)
+        for i, bound in enumerate([*bounds, float("inf")]):
+            cumulative += record[offset + i]
+            if (
+                self.sparse_buckets
+                and i < last
+                and not record[offset + i]
+                and not record[offset + i + 1]
+            ):
+                continue
+            buckets.append((floatToGoString(bound), cumulative))
+        return buckets
+
+
+def _add(target: list, record: list, indexes: Optional[Sequence[int]] = None) -> None:
+    if indexes is None:
+        for i, value in enumerate(record):
+            target[i] += value
+    else:
+        for i, index in enumerate(indexes):
+            target[i] += record[index]
+
+
+def _add_at(target: list, offset: int, values: Sequence[int]) -> None:
+    for i, value in enumerate(values):
+        target[offset + i] += value
+
+
+def _search_bounds(bounds: List[float]):
+    return numpy.asarray(bounds, dtype=float) if numpy is not None else bounds
+
+
+def _bucket_counts(durations: List[float], bounds) -> List[int]:
+    """Returns the number of durations per bucket, `+Inf` bucket last."""
+    if numpy is not None:
+        indexes = numpy.searchsorted(bounds, durations, side="left")
+        return numpy.bincount(indexes, minlength=len(bounds) + 1).tolist()
+
+    durations = sorted(durations)
+    counts = []
+    below = 0
+    for bound in bounds:
+        cumulative = bisect.bisect_right(durations, bound)
+        counts.append(cumulative - below)
+        below = cumulative
+    counts.append(len(durations) - below)
+    return counts
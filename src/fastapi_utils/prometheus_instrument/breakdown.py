@@ -0,0 +1,174 @@
+"""
+Breakdown of the request latency into segments:
+
+* `queue`: time between the proxy receiving the request and the app, from the
+  `X-Request-Start` or `X-Queue-Start` header set by the proxy (nginx:
+  `proxy_set_header X-Request-Start "t=${msec}";`).
+* `dependencies`: time spent resolving the dependencies of the route
+  (authorization, resource checks, body validation).
+* `handler`: time spent in the endpoint function.
+* `serialization`: time between the endpoint returning and the response
+  starting, mostly response model validation and JSON rendering.
+* `send`: time between the response starting and its last byte being sent,
+  the streaming time of large or streaming responses.
+
+`instrument_routing` wraps the routes of one app in place: the ASGI app of
+each route, which marks when routing handed the request over, and the
+endpoint in the route's `Dependant`, which marks when the handler starts and
+ends. `dependencies` is the time between both marks, so it includes reading
+the body and, for sync endpoints, waiting for a worker thread. Other apps and
+FastAPI itself are not modified. The wrappers cost two timer reads per call
+and do nothing if the request is not being broken down. The timings of a
+request are kept in a context variable set by the middleware.
+"""
+
+import functools
+import time
+from contextvars import ContextVar
+from timeit import default_timer
+from typing import Any, Callable, Iterable, Iterator, Optional, Tuple
+
+from fastapi import FastAPI
+from fastapi.dependencies.utils import is_coroutine_callable
+from fastapi.routing import APIRoute
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+__all__ = ["SEGMENTS", "RequestTimings", "instrument_routing", "queue_duration"]
+
+SEGMENTS = ("queue", "dependencies", "handler", "serialization", "send")
+
+_QUEUE_HEADERS = (b"x-request-start", b"x-queue-start")
+
+TIMINGS: ContextVar[Optional["RequestTimings"]] = ContextVar(
+    "fastapi_utils_request_timings", default=None
+)
+
+
+class RequestTimings:
+    """Segments of one request, in seconds, `None` if they did not happen."""
+
+    __slots__ = (*SEGMENTS, "route_start", "handler_start", "handler_end")
+
+    def __init__(self, queue: Optional[float] = None):
+        self.queue = queue
+        self.dependencies: Optional[float] = None
+        self.handler: Optional[float] = None
+        self.serialization: Optional[float] = None
+        self.send: Optional[float] = None
+        self.route_start: Optional[float] = None
+        self.handler_start: Optional[float] = None
+        self.handler_end: Optional[float] = None
+
+    def finish(
+        self,
+        response_start_time: Optional[float],
+        response_end_time: Optional[float],
+    ) -> None:
+        """Derives the segments after the handler from the response timers."""
+        if response_start_time is None:
+            return
+        if self.handler_end is not None:
+            self.serialization = max(response_start_time - self.handler_end, 0.0)
+        if response_end_time is not None:
+            self.send = response_end_time - response_start_time
+
+
+def queue_duration(
+    headers: Iterable[Tuple[bytes, bytes]], now: Optional[float] = None
+) -> Optional[float]:
+    """Seconds since the proxy received the request, `None` if unknown.
+
+    The header holds a Unix timestamp, optionally prefixed by `t=`, in seconds,
+    milliseconds or microseconds. Timestamps in the future (clock skew between
+    proxy and app) are ignored.
+    """
+    value = next(
+        (value for key, value in headers if key.lower() in _QUEUE_HEADERS), None
+    )
+    if value is None:
+        return None
+
+    try:
+        timestamp = float(value.decode("latin-1").strip().removeprefix("t="))
+    except ValueError:
+        return None
+    if timestamp > 1e14:
+        timestamp /= 1e6
+    elif timestamp > 1e11:
+        timestamp /= 1e3
+
+    duration = (time.time() if now is None else now) - timestamp
+    return duration if duration >= 0 else None
+
+
+def instrument_routing(app: FastAPI) -> None:
+    """Times the dependencies and the endpoint of the routes of `app`.
+
+    Only the routes that exist when it is called are instrumented. Can be
+    called several times, the routes are only wrapped once.
+    """
+    for route in _api_routes(app.router.routes):
+        if getattr(route.app, "__timed__", False):
+            continue
+        route.app = _timed_route(route.app)
+        route.dependant.call = _timed_endpoint(route.dependant.call)
+
+
+def _api_routes(routes: Iterable[Any]) -> Iterator[APIRoute]:
+    for route in routes:
+        if isinstance(route, APIRoute):
+            yield route
+        elif getattr(route, "routes", None):
+            yield from _api_routes(route.routes)
+
+
+def _timed_route(app: ASGIApp) -> ASGIApp:
+    async def wrapper(scope: Scope, receive: Receive, send: Send) -> None:
+        timings = TIMINGS.get()
+        if timings is not None:
+            timings.route_start = default_timer()
+        await app(scope, receive, send)
+
+    wrapper.__timed__ = True
+    return wrapper
+
+
+def _timed_endpoint(call: Callable[..., Any]) -> Callable[..., Any]:
+    # FastAPI decides once, when the route is created, whether to await the
+    # endpoint or to run it in a thread, so the wrapper keeps its kind.
+    if is_coroutine_callable(call):
+
+        @functools.wraps(call)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            timings = _handler_started()
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                _handler_ended(timings)
+
+    else:
+
+        @functools.wraps(call)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            timings = _handler_started()
+            try:
+                return call(*args, **kwargs)
+            finally:
+                _handler_ended(timings)
+
+    return wrapper
+
+
+def _handler_started() -> Optional[RequestTimings]:
+    timings = TIMINGS.get()
+    if timings is not None:
+        timings.handler_start = default_timer()
+        if timings.route_start is not None:
+            timings.dependencies = timings.handler_start - timings.route_start
+    return timings
+
+
+def _handler_ended(timings: Optional[RequestTimings]) -> None:
+    if timings is not None and timings.handler_start is not None:
+        timings.handler_end = default_timer()
+        timings.handler = timings.handler_end - timings.handler_start
@@ -0,0 +1,56 @@
+"""
+Bucket layouts for the latency histograms.
+
+The layouts can be passed as `latency_highr_buckets` or `latency_lowr_buckets`
+to `metrics.default` and `aggregation.AggregatedMetrics`. Layouts with many
+buckets are best combined with the buffered, sparse mode of
+`AggregatedMetrics`, which makes the number of buckets nearly free per request
+and only exports the buckets that were observed.
+"""
+
+import math
+from typing import List
+
+__all__ = ["linear_buckets", "exponential_buckets", "native_buckets"]
+
+
+def linear_buckets(start: float, width: float, count: int) -> List[float]:
+    """Returns `count` bounds, `width` apart, the first one being `start`."""
+    if width <= 0 or count < 1:
+        raise ValueError("width must be positive and count at least 1")
+    return [start + i * width for i in range(count)]
+
+
+def exponential_buckets(start: float, factor: float, count: int) -> List[float]:
+    """Returns `count` bounds, each `factor` times the previous one."""
+    if start <= 0 or factor <= 1 or count < 1:
+        raise ValueError("start must be positive, factor above 1, count at least 1")
+    return [start * factor**i for i in range(count)]
+
+
+def native_buckets(schema: int, low: float, high: float) -> List[float]:
+    """Returns the bounds of a Prometheus native histogram between `low` and `high`.
+
+    Native histograms use the bounds `2 ** (i * 2 ** -schema)` for every
+    integer `i`, so each power of two is split into `2 ** schema` buckets with
+    a constant relative error. `prometheus_client` cannot expose native
+    histograms yet, so the bounds are exported as classic buckets, which keeps
+    the same resolution and lines up with native histograms recorded by other
+    services.
+
+    Args:
+        schema: Resolution, from -4 (factor 65536 between bounds) to 8
+            (factor 1.0027).
+        low: Smallest duration that needs its own bucket. The first bound is
+            the largest bound not above `low`.
+        high: Largest duration that needs its own bucket. The last bound is the
+            smallest bound not below `high`.
+    """
+    if not -4 <= schema <= 8:
+        raise ValueError("schema must be between -4 and 8")
+    if low <= 0 or high <= low:
+        raise ValueError("low must be positive and below high")
+    scale = 2.0**schema
+    first = math.floor(math.log2(low) * scale)
+    last = math.ceil(math.log2(high) * scale)
+    return [2.0 ** (i / scale) for i in range(first, last + 1)]
@@ -0,0 +1,85 @@
+"""
+Guards against label cardinality explosions.
+
+Every distinct label set of a metric is a child kept forever by
+`prometheus_client` and a series rendered on every scrape. Label values taken
+from requests (method, handler, status) can be chosen by clients, so each
+metric gets a cap on the number of label sets. Observations for label sets
+beyond the cap go to a single overflow child and are counted in
+`http_label_sets_dropped_total`.
+"""
+
+from typing import Optional, Tuple
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter
+from prometheus_client.metrics import MetricWrapperBase
+
+OVERFLOW_LABEL_VALUE = "__overflow__"
+
+DROPPED_NAME = "http_label_sets_dropped"
+
+
+def dropped_label_sets(
+    metric_namespace: str = "",
+    metric_subsystem: str = "",
+    registry: CollectorRegistry = REGISTRY,
+) -> Counter:
+    """Returns the counter of dropped label sets, creating it once per registry."""
+    from .metrics import get_or_create  # metrics imports this module.
+
+    return get_or_create(
+        Counter,
+        DROPPED_NAME,
+        registry,
+        documentation=(
+            "Observations recorded in the overflow label set because the "
+            "metric reached its label set limit, by metric."
+        ),
+        labelnames=("metric",),
+        namespace=metric_namespace,
+        subsystem=metric_subsystem,
+    )
+
+
+class LabelLimiter:
+    """Memoized `metric.labels` with a cap on distinct label sets.
+
+    Known label sets cost one dict lookup, with no lock and no label
+    validation. Once `max_label_sets` label sets exist, unknown ones map to
+    the overflow child, whose values are all `OVERFLOW_LABEL_VALUE`.
+    """
+
+    def __init__(
+        self,
+        metric: MetricWrapperBase,
+        max_label_sets: Optional[int] = None,
+        dropped: Optional[Counter] = None,
+    ):
+        """
+        Args:
+            metric: Labelled metric to limit.
+            max_label_sets: Maximum number of label sets, `None` for no limit.
+            dropped: Counter of dropped label sets, see `dropped_label_sets`.
+        """
+        self.metric = metric
+        self.max_label_sets = max_label_sets
+        self._children: dict[Tuple[str, ...], MetricWrapperBase] = {}
+        self._overflow: Optional[MetricWrapperBase] = None
+        self._dropped = dropped.labels(metric._name) if dropped is not None else None
+
+    def __len__(self) -> int:
+        return len(self._children)
+
+    def labels(self, *values: str) -> MetricWrapperBase:
+        child = self._children.get(values)
+        if child is not None:
+            return child
+        if self.max_label_sets is None or len(self._children) < self.max_label_sets:
+            child = self._children[values] = self.metric.labels(*values)
+            return child
+
+        if self._dropped is not None:
+            self._dropped.inc()
+        if self._overflow is None:
+            self._overflow = self.metric.labels(*(OVERFLOW_LABEL_VALUE for _ in values))
+        return self._overflow
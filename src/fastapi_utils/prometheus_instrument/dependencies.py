@@ -0,0 +1,285 @@
+"""
+Timing of FastAPI dependencies.
+
+`instrument_dependencies` wraps the dependencies of the app's routes that are
+declared in `fastapi_utils.dependencies`, plus the ones passed to it, and
+records:
+
+* `fastapi_utils_dependency_duration_seconds` (`dependency`): Time spent in
+    each call of the dependency. The count is the number of calls, calls
+    answered by FastAPI's per-request dependency cache are not counted.
+* `fastapi_utils_dependency_exceptions_total` (`dependency`): Calls that
+    raised, e.g. rejected authorizations.
+* `fastapi_utils_cache_requests_total` (`cache`, `result`) and
+    `fastapi_utils_cache_evictions_total` (`cache`): Hits and misses of the
+    token and key caches used by the authorization dependencies, read on
+    scrape.
+
+The `dependency` label is the qualified name of the wrapped function, so the
+number of label sets is bounded by the number of instrumented dependencies.
+
+Dependencies are wrapped in place, in the dependency tree FastAPI built for
+each route, by replacing the `call` of their `Dependant`. This relies on the
+layout of `fastapi.dependencies.models.Dependant`, hence the upper bound of
+FastAPI in `pyproject.toml`. The wrappers compare equal to the original
+functions, so overrides registered in `app.dependency_overrides`, before or
+after the instrumentation, keep working. Generator dependencies are not timed.
+"""
+
+import functools
+import sys
+from timeit import default_timer
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from fastapi import FastAPI
+from fastapi.dependencies.models import Dependant
+from fastapi.dependencies.utils import (
+    is_async_gen_callable,
+    is_coroutine_callable,
+    is_gen_callable,
+)
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram
+from prometheus_client.metrics_core import CounterMetricFamily, Metric
+from prometheus_client.registry import Collector
+
+from .metrics import _is_duplicated_time_series, get_or_create
+
+__all__ = ["instrument_dependencies", "CacheCollector"]
+
+DURATION_NAME = "fastapi_utils_dependency_duration_seconds"
+EXCEPTIONS_NAME = "fastapi_utils_dependency_exceptions"
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+
+def _library_dependencies() -> list[Callable[..., Any]]:
+    from fastapi_utils.dependencies import authorize
+
+    return [
+        authorize.tracing_headers,
+        authorize.get_authorization_context,
+        authorize.get_authorization_context_async,
+    ]
+
+
+class _TimedCall:
+    """Times the calls of a sync dependency.
+
+    Compares and hashes equal to the dependency, so that the entries of
+    `app.dependency_overrides`, which FastAPI looks up by the `call` of the
+    dependency, still match once it is wrapped, even in a dict assigned after
+    the instrumentation.
+    """
+
+    def __init__(self, call: Callable[..., Any], duration: Any, exceptions: Any):
+        functools.update_wrapper(self, call)
+        self._call = call
+        self._duration = duration
+        self._exceptions = exceptions
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        start_time = default_timer()
+        try:
+            return self._call(*args, **kwargs)
+        except Exception:
+            self._exceptions.inc()
+            raise
+        finally:
+            self._duration.observe(default_timer() - start_time)
+
+    def __eq__(self, other: Any) -> bool:
+        return other is self or other == self._call
+
+    def __hash__(self) -> int:
+        return hash(self._call)
+
+
+class _AsyncTimedCall(_TimedCall):
+    """Times the calls of an async dependency, see `_TimedCall`."""
+
+    async def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        start_time = default_timer()
+        try:
+            return await self._call(*args, **kwargs)
+        except Exception:
+            self._exceptions.inc()
+            raise
+        finally:
+            self._duration.observe(default_timer() - start_time)
+
+
+class _DependencyMetrics:
+    def __init__(self, registry: CollectorRegistry, buckets: Iterable[float]):
+        self.duration = get_or_create(
+            Histogram,
+            DURATION_NAME,
+            registry,
+            documentation="Time spent in FastAPI dependencies by dependency.",
+            labelnames=("dependency",),
+            buckets=buckets,
+        )
+        self.exceptions = get_or_create(
+            Counter,
+            EXCEPTIONS_NAME,
+            registry,
+            documentation="FastAPI dependency calls that raised by dependency.",
+            labelnames=("dependency",),
+        )
+
+    def wrap(self, call: Callable[..., Any]) -> _TimedCall:
+        name = getattr(call, "__qualname__", None) or type(call).__qualname__
+        # Sync dependencies keep a sync wrapper, so they still run in the
+        # thread pool.
+        timed_call_cls = _AsyncTimedCall if is_coroutine_callable(call) else _TimedCall
+        return timed_call_cls(
+            call, self.duration.labels(name), self.exceptions.labels(name)
+        )
+
+
+def instrument_dependencies(
+    app: FastAPI,
+    *dependencies: Callable[..., Any],
+    registry: CollectorRegistry = REGISTRY,
+    buckets: Iterable[float] = DEFAULT_BUCKETS,
+    include_library_dependencies: bool = True,
+) -> None:
+    """Times the dependencies of the routes of `app`.
+
+    Only the routes that exist when it is called are instrumented, call it once
+    all routers are included. Calling it again instruments the new routes.
+
+    Args:
+        app: App whose routes are instrumented.
+        dependencies: Dependencies to time, in addition to the ones of
+            `fastapi_utils.dependencies`.
+        registry: Registry of the metrics.
+        buckets: Buckets of the duration histogram.
+        include_library_dependencies: Also time the dependencies of
+            `fastapi_utils.dependencies`.
+    """
+    calls = list(dependencies)
+    if include_library_dependencies:
+        calls.extend(_library_dependencies())
+    calls = [
+        call
+        for call in calls
+        if not (is_gen_callable(call) or is_async_gen_callable(call))
+    ]
+
+    metrics = _DependencyMetrics(registry, buckets)
+    tracked = {id(call): call for call in calls}
+    wrappers: dict[int, Callable[..., Any]] = {}
+    for dependant in _dependants(app.router.routes):
+        _wrap_tree(dependant, tracked, wrappers, metrics)
+
+    CacheCollector.register(registry)
+
+
+def _dependants(routes: Iterable[Any]) -> Iterator[Dependant]:
+    for route in routes:
+        dependant = getattr(route, "dependant", None)
+        if dependant is not None:
+            yield dependant
+        elif getattr(route, "routes", None):
+            yield from _dependants(route.routes)
+
+
+def _wrap_tree(
+    dependant: Dependant,
+    tracked: dict[int, Callable[..., Any]],
+    wrappers: dict[int, Callable[..., Any]],
+    metrics: _DependencyMetrics,
+) -> None:
+    for sub_dependant in dependant.dependencies:
+        call = sub_dependant.call
+        if id(call) in tracked:
+            # One wrapper per dependency. `cache_key` still holds the original
+            # function, so FastAPI's per-request cache is not affected.
+            wrapper = wrappers.get(id(call))
+            if wrapper is None:
+                wrapper = wrappers[id(call)] = metrics.wrap(call)
+            sub_dependant.call = wrapper
+        _wrap_tree(sub_dependant, tracked, wrappers, metrics)
+
+
+class CacheCollector(Collector):
+    """Exports the hits and misses of the caches of the authorization
+    dependencies, and of the existence caches of the sync and async resource
+    managers per resource type, as `existence:<resource type>`. The caches are
+    looked up on every scrape, so caches set later with `set_token_cache` and
+    the like are exported as well.
+
+    Only the modules of `fastapi_utils.dependencies` the app already imported
+    are read: importing them, e.g. `authorize` which reads the encryption
+    config, could fail in an app that does not use them."""
+
+    def collect(self) -> Iterator[Metric]:
+        authorize = sys.modules.get("fastapi_utils.dependencies.authorize")
+        encrypt = sys.modules.get("fastapi_utils.dependencies.encrypt")
+        resources = sys.modules.get("fastapi_utils.dependencies.resources")
+
+        requests = CounterMetricFamily(
+            "fastapi_utils_cache_requests",
+            "Lookups of the authorization and existence caches by cache and result.",
+            labels=("cache", "result"),
+        )
+        evictions = CounterMetricFamily(
+            "fastapi_utils_cache_evictions",
+            "Entries evicted from the authorization and existence caches by cache.",
+            labels=("cache",),
+        )
+        caches = {}
+        if authorize is not None:
+            caches["token"] = authorize.get_token_cache()
+            caches["verification_key"] = authorize.VERIFICATION_KEY_CACHE
+        if encrypt is not None:
+            caches["signing_key"] = encrypt.SIGNING_KEY_CACHE
+        for name, cache in caches.items():
+            if cache is None:
+                continue
+            requests.add_metric((name, "hit"), cache.hits)
+            requests.add_metric((name, "miss"), cache.misses)
+            if hasattr(cache, "evictions"):
+                evictions.add_metric((name,), cache.evictions)
+        # The managers may share their cache, which is then only counted once,
+        # or have their own, whose stats are summed per resource type.
+        existence_caches = {}
+        resource_managers = ()
+        if resources is not None:
+            resource_managers = (
+                resources.get_resource_manager(),
+                resources.get_async_resource_manager(),
+            )
+        for resource_manager in resource_managers:
+            existence_cache = getattr(resource_manager, "existence_cache", None)
+            if existence_cache is not None:
+                existence_caches[id(existence_cache)] = existence_cache
+        existence_stats: dict[str, list[int]] = {}
+        for existence_cache in existence_caches.values():
+            for resource_type, stats in existence_cache.stats().items():
+                totals = existence_stats.setdefault(resource_type, [0, 0, 0])
+                for index, value in enumerate(stats):
+                    totals[index] += value
+        for resource_type, (hits, misses, evicted) in existence_stats.items():
+            name = f"existence:{resource_type}"
+            requests.add_metric((name, "hit"), hits)
+            requests.add_metric((name, "miss"), misses)
+            evictions.add_metric((name,), evicted)
+        yield requests
+        yield evictions
+
+    def describe(self) -> Iterator[Metric]:
+        yield CounterMetricFamily("fastapi_utils_cache_requests", "")
+        yield CounterMetricFamily("fastapi_utils_cache_evictions", "")
+
+    @classmethod
+    def register(cls, registry: CollectorRegistry) -> Optional["CacheCollector"]:
+        """Registers a collector in `registry`, unless one already is."""
+        collector = cls()
+        try:
+            registry.register(collector)
+        except ValueError as e:
+            if not _is_duplicated_time_series(e):
+                raise e
+            return None
+        return collector
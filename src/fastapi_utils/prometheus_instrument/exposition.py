@@ -0,0 +1,138 @@
+import asyncio
+import gzip
+import time
+from timeit import default_timer
+from typing import Callable, Optional, Tuple
+
+import anyio
+from prometheus_client import REGISTRY, CollectorRegistry, Histogram
+from prometheus_client.exposition import choose_encoder
+
+from .metrics import get_or_create
+
+RENDER_DURATION_NAME = "metrics_render_duration_seconds"
+
+
+def _render_duration(registry: CollectorRegistry) -> Histogram:
+    return get_or_create(
+        Histogram,
+        RENDER_DURATION_NAME,
+        registry,
+        documentation="Time spent rendering the metrics endpoint by format.",
+        labelnames=("format",),
+        buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+    )
+
+
+def gzip_accepted(accept_encoding: Optional[str]) -> bool:
+    """Whether an `Accept-Encoding` header accepts gzip.
+
+    Like `prometheus_client.exposition.gzip_accepted`, but honours q-values:
+    `gzip;q=0` refuses gzip, and `*` accepts it unless gzip is listed.
+    """
+    qvalues: dict[str, float] = {}
+    for coding in (accept_encoding or "").split(","):
+        name, *params = coding.split(";")
+        qvalue = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    qvalue = float(value)
+                except ValueError:
+                    qvalue = 0.0
+        qvalues[name.strip().lower()] = qvalue
+    return qvalues.get("gzip", qvalues.get("*", 0.0)) > 0
+
+
+class _Rendering:
+    def __init__(self, body: bytes, content_type: str):
+        self.body = body
+        self.content_type = content_type
+        self.rendered_at = time.monotonic()
+        self.gzipped: Optional[bytes] = None
+
+
+class MetricsRenderer:
+    """Renders a registry for the metrics endpoint.
+
+    * Rendering and compression run in a worker thread, not on the event loop.
+    * Concurrent scrapes share one rendering, and a rendering is reused for
+      `min_interval` seconds, so several Prometheus replicas scraping the same
+      pod cost one serialization.
+    * The format is negotiated from the `Accept` header (Prometheus text or
+      OpenMetrics) and the body is gzipped if the client accepts it.
+    """
+
+    def __init__(
+        self,
+        registry: CollectorRegistry = REGISTRY,
+        *,
+        min_interval: float = 0.0,
+        metrics_registry: Optional[CollectorRegistry] = None,
+    ):
+        """
+        Args:
+            registry: Registry to render.
+            min_interval: Seconds a rendering is served before the registry is
+                rendered again. 0 only shares renderings between concurrent
+                scrapes.
+            metrics_registry: Registry of the render duration histogram.
+                Defaults to `registry`.
+        """
+        self.registry = registry
+        self.min_interval = min_interval
+        self.render_duration = _render_duration(metrics_registry or registry)
+
+        self._renderings: dict[str, _Rendering] = {}
+        self._inflight: dict[str, asyncio.Future[_Rendering]] = {}
+
+    async def render(
+        self,
+        accept: Optional[str] = None,
+        accept_encoding: Optional[str] = None,
+    ) -> Tuple[bytes, dict[str, str]]:
+        """Returns the body and headers of the metrics response."""
+        encoder, content_type = choose_encoder(accept)
+        rendering = self._renderings.get(content_type)
+        if (
+            rendering is None
+            or time.monotonic() - rendering.rendered_at >= self.min_interval
+        ):
+            rendering = await self._render_once(encoder, content_type)
+
+        headers = {"Content-Type": content_type, "Vary": "Accept-Encoding"}
+        if not gzip_accepted(accept_encoding):
+            return rendering.body, headers
+
+        if rendering.gzipped is None:
+            rendering.gzipped = await anyio.to_thread.run_sync(
+                gzip.compress, rendering.body
+            )
+        headers["Content-Encoding"] = "gzip"
+        return rendering.gzipped, headers
+
+    async def _render_once(
+        self,
+        encoder: Callable[[CollectorRegistry], bytes],
+        content_type: str,
+    ) -> _Rendering:
+        future = self._inflight.get(content_type)
+        if future is None:
+            future = asyncio.ensure_future(self._render(encoder, content_type))
+            self._inflight[content_type] = future
+            future.add_done_callback(lambda _: self._inflight.pop(content_type, None))
+        return await asyncio.shield(future)
+
+    async def _render(
+        self,
+        encoder: Callable[[CollectorRegistry], bytes],
+        content_type: str,
+    ) -> _Rendering:
+        start_time = default_timer()
+        body = await anyio.to_thread.run_sync(encoder, self.registry)
+        fmt = "openmetrics" if "openmetrics" in content_type else "prometheus"
+        self.render_duration.labels(fmt).observe(default_timer() - start_time)
+
+        rendering = self._renderings[content_type] = _Rendering(body, content_type)
+        return rendering
@@ -1,18 +1,20 @@
+import contextlib
 from enum import Enum
-from typing import Any, Callable, List, Optional, cast
-
-from prometheus_client import (
-    CONTENT_TYPE_LATEST,
-    REGISTRY,
-    CollectorRegistry,
-    generate_latest,
-)
+from typing import Any, AsyncIterator, Callable, List, Optional, cast
+
+from prometheus_client import REGISTRY, CollectorRegistry
 from fastapi.applications import FastAPI
 from fastapi.requests import Request
-from fastapi.responses import Response
+from fastapi.responses import PlainTextResponse, Response
+
+from fastapi_utils.lifespan import add_lifespan
 
+from .exposition import MetricsRenderer
+from .loop import LoopMonitor
+from .profiler import SlowRequestProfiler
 from .middleware import PrometheusMiddleware
-from . import metrics
+from . import breakdown, metrics, multiprocess
+from . import dependencies as dependencies_module
 
 
 class PrometheusInstrumentator:
@@ -33,19 +35,63 @@ class PrometheusInstrumentator:
         if registry:
             self.registry = registry
 
+        # Set by `instrument` if slow requests are profiled.
+        self.profiler: Optional[SlowRequestProfiler] = None
+
+        # Registry served on the metrics endpoint. Differs from `registry` in
+        # multiprocess mode, where it aggregates the files of all processes.
+        self.exposition_registry = self.registry
+
     def instrument(
         self,
         app: FastAPI,
         metric_namespace: str = "",
         metric_subsystem: str = "",
+        resolve_handler_after_routing: bool = False,
+        max_label_sets: Optional[int] = 10_000,
+        latency_breakdown: bool = False,
+        monitor_event_loop: bool = False,
+        slow_request_threshold: Optional[float] = None,
+        slow_request_handler_thresholds: Optional[dict[str, float]] = None,
     ) -> "PrometheusInstrumentator":
         """Performs the instrumentation by adding middleware.
 
         The middleware iterates through all `instrumentations` and executes them.
 
+        If `PROMETHEUS_MULTIPROC_DIR` is set, multiprocess mode is set up as
+        well: the metrics endpoint serves the metrics of all processes, files
+        left by crashed processes are removed, and the live gauges of this
+        process are removed when the app shuts down. See `multiprocess`.
+
         Args:
             app: FastAPI app instance.
 
+            resolve_handler_after_routing: Reuse the route matched by the router
+                instead of matching the routes a second time. See
+                `PrometheusMiddleware`.
+
+            max_label_sets: Maximum number of label sets of each metric. Further
+                label sets are recorded as `__overflow__` and counted in
+                `http_label_sets_dropped_total`. `None` disables the limit.
+
+            latency_breakdown: Record the time spent queueing, resolving
+                dependencies, in the handler, serializing and sending in
+                `http_request_segment_duration_seconds`. Wraps the routes
+                of `app`, including the ones added until it starts, see
+                `breakdown`.
+
+            monitor_event_loop: Export the event loop lag, the coroutines that
+                block the loop and the usage of anyio's thread pool, sampled
+                by a `LoopMonitor` running in the app lifespan.
+
+            slow_request_threshold: Sample the stacks of requests running for
+                longer than this many seconds, see `profiler`. The samples are
+                served by `expose` next to the metrics. `None` disables the
+                profiler.
+
+            slow_request_handler_thresholds: Thresholds of specific handlers,
+                by route path template.
+
         Raises:
             e: Only raised if app itself throws an exception.
 
@@ -54,13 +100,56 @@ class PrometheusInstrumentator:
 
         """
 
+        if slow_request_threshold is not None:
+            self.profiler = SlowRequestProfiler(
+                slow_request_threshold,
+                handler_thresholds=slow_request_handler_thresholds,
+            )
+            add_lifespan(app, self.profiler.lifespan)
+
         app.add_middleware(
             PrometheusMiddleware,
             metric_namespace=metric_namespace,
             metric_subsystem=metric_subsystem,
             instrumentations=self.instrumentations,
             registry=self.registry,
+            resolve_handler_after_routing=resolve_handler_after_routing,
+            max_label_sets=max_label_sets,
+            latency_breakdown=latency_breakdown,
+            profiler=self.profiler,
         )
+        if latency_breakdown:
+            breakdown.instrument_routing(app)
+
+            # Routes included after `instrument` are wrapped on startup.
+            @contextlib.asynccontextmanager
+            async def instrument_routes(app: FastAPI) -> AsyncIterator[None]:
+                breakdown.instrument_routing(app)
+                yield
+
+            add_lifespan(app, instrument_routes)
+
+        if monitor_event_loop:
+            monitor = LoopMonitor(
+                metric_namespace=metric_namespace,
+                metric_subsystem=metric_subsystem,
+                registry=self.registry,
+            )
+            add_lifespan(app, monitor.lifespan)
+
+        multiprocess_dir = multiprocess.get_multiprocess_dir()
+        if multiprocess_dir:
+            self.exposition_registry = multiprocess.create_registry(multiprocess_dir)
+            multiprocess.remove_dead_process_files(multiprocess_dir)
+
+            @contextlib.asynccontextmanager
+            async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+                try:
+                    yield
+                finally:
+                    multiprocess.mark_process_dead(path=multiprocess_dir)
+
+            add_lifespan(app, lifespan)
 
         return self
 
@@ -70,10 +159,19 @@ class PrometheusInstrumentator:
         *,
         endpoint: str = "/metrics",
         tags: Optional[List[str | Enum]] = None,
+        min_refresh_interval: float = 0.0,
         **kwargs: Any,
     ) -> "PrometheusInstrumentator":
         """Exposes endpoint for metrics.
 
+        The endpoint is served by a `MetricsRenderer`: rendering happens off the
+        event loop, concurrent scrapes share one rendering, responses are
+        gzipped when accepted and OpenMetrics is served when requested.
+
+        If slow requests are profiled (see `instrument`), their collapsed
+        stacks are served on `{endpoint}/profile`. `?reset=true` clears them
+        once served.
+
         Args:
             app: App instance. Endpoint will be added to this app. This can be
             a FastAPI app.
@@ -85,22 +183,79 @@ class PrometheusInstrumentator:
             tags (List[str], optional): If you manage your routes with tags.
                 Defaults to None. Will passed to FastAPI app.
 
+            min_refresh_interval (float, optional): Seconds a rendering is
+                reused by later scrapes. Defaults to 0, which only shares a
+                rendering between concurrent scrapes.
+
             kwargs: Will passed to FastAPI app.
 
         Returns:
             self: PrometheusInstrumentator. Builder Pattern.
         """
 
-        def metrics(request: Request) -> Response:
-            """Endpoint that serves Prometheus metrics."""
+        renderer = MetricsRenderer(
+            self.exposition_registry,
+            min_interval=min_refresh_interval,
+            metrics_registry=self.registry,
+        )
 
-            resp = Response(content=generate_latest(self.registry))
-            resp.headers["Content-Type"] = CONTENT_TYPE_LATEST
+        async def metrics(request: Request) -> Response:
+            """Endpoint that serves Prometheus metrics."""
 
-            return resp
+            content, headers = await renderer.render(
+                request.headers.get("Accept"),
+                request.headers.get("Accept-Encoding"),
+            )
+            return Response(content=content, headers=headers)
 
         app.get(endpoint, include_in_schema=True, tags=tags, **kwargs)(metrics)
 
+        profiler = self.profiler
+        if profiler is not None:
+
+            def profile(reset: bool = False) -> PlainTextResponse:
+                """Endpoint that serves the stacks sampled from slow requests."""
+
+                content = profiler.render()
+                if reset:
+                    profiler.clear()
+                return PlainTextResponse(content)
+
+            app.get(f"{endpoint}/profile", include_in_schema=True, tags=tags, **kwargs)(
+                profile
+            )
+
+        return self
+
+    def instrument_dependencies(
+        self,
+        app: FastAPI,
+        *dependencies: Callable[..., Any],
+        include_library_dependencies: bool = True,
+    ) -> "PrometheusInstrumentator":
+        """Times the dependencies of the routes of `app`, see `dependencies`.
+
+        Call it once all routers are included, routes added later are not
+        instrumented.
+
+        Args:
+            app: App whose routes are instrumented.
+
+            dependencies: Dependencies to time, in addition to the ones of
+                `fastapi_utils.dependencies`.
+
+            include_library_dependencies (bool, optional): Also time the
+                dependencies of `fastapi_utils.dependencies`. Defaults to True.
+
+        Returns:
+            self: PrometheusInstrumentator. Builder Pattern.
+        """
+        dependencies_module.instrument_dependencies(
+            app,
+            *dependencies,
+            registry=self.registry,
+            include_library_dependencies=include_library_dependencies,
+        )
         return self
 
     def add(
@@ -0,0 +1,180 @@
+"""
+Health of the event loop.
+
+`LoopMonitor` runs next to the app, started and stopped by its lifespan:
+
+* A task on the event loop sleeps for `interval` seconds in a loop. The time
+  it oversleeps is the loop lag, the time callbacks waited for the loop.
+* A watchdog thread checks that the task wakes up in time. If it is late by
+  more than `slow_callback_threshold`, something blocks the loop: the stack
+  of the loop thread is sampled and the coroutine running on it is counted as
+  the slow callback.
+* On every wake up the task also reads anyio's default thread limiter, which
+  runs sync endpoints and dependencies, to export how many threads are in
+  use.
+
+You get the following:
+
+* `event_loop_lag_seconds`: Histogram of the loop lag.
+* `event_loop_slow_callbacks_total` (`callback`): Times the loop was blocked
+  by the coroutine (or callback), named by its qualified name.
+* `threadpool_borrowed_tokens` and `threadpool_total_tokens`: Threads in use
+  and maximum number of threads of anyio's default thread limiter.
+"""
+
+import asyncio
+import contextlib
+import sys
+import threading
+import time
+from types import FrameType
+from typing import Any, AsyncIterator, Optional
+
+import anyio.to_thread
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram
+
+from .cardinality import LabelLimiter, dropped_label_sets
+from .metrics import _is_duplicated_time_series
+
+__all__ = ["LoopMonitor"]
+
+_CO_COROUTINE = 0x80
+
+
+def _blocking_callback(frame: Optional[FrameType]) -> str:
+    """Name of the code blocking the loop, given the loop thread's frame.
+
+    The innermost coroutine of the stack is the one that blocks, if the stack
+    has none the callback run by the loop is returned.
+    """
+    callback = "unknown"
+    coroutine = None
+    while frame is not None:
+        code = frame.f_code
+        if code.co_name == "_run" and code.co_filename.endswith(
+            ("asyncio/events.py", "asyncio\\events.py")
+        ):
+            break
+        if coroutine is None and code.co_flags & _CO_COROUTINE:
+            coroutine = code.co_qualname
+        callback = code.co_qualname
+        frame = frame.f_back
+    return coroutine or callback
+
+
+class LoopMonitor:
+    def __init__(
+        self,
+        metric_namespace: str = "",
+        metric_subsystem: str = "",
+        registry: CollectorRegistry = REGISTRY,
+        *,
+        interval: float = 0.5,
+        slow_callback_threshold: float = 0.1,
+        max_label_sets: Optional[int] = 100,
+    ):
+        """
+        Args:
+            interval: Seconds between two samples of the loop lag and the
+                thread limiter.
+            slow_callback_threshold: Seconds the loop has to be blocked for the
+                blocking code to be counted as a slow callback.
+            max_label_sets: Maximum number of distinct slow callbacks, see
+                `metrics.default`.
+        """
+        self.interval = interval
+        self.slow_callback_threshold = slow_callback_threshold
+
+        try:
+            self.lag = Histogram(
+                name="event_loop_lag_seconds",
+                documentation="Time the event loop was late to run a callback.",
+                buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+                namespace=metric_namespace,
+                subsystem=metric_subsystem,
+                registry=registry,
+            )
+            self.slow_callbacks = Counter(
+                name="event_loop_slow_callbacks",
+                documentation="Times the event loop was blocked by callback.",
+                labelnames=("callback",),
+                namespace=metric_namespace,
+                subsystem=metric_subsystem,
+                registry=registry,
+            )
+            self.borrowed_tokens = Gauge(
+                name="threadpool_borrowed_tokens",
+                documentation="Threads in use by sync endpoints and dependencies.",
+                namespace=metric_namespace,
+                subsystem=metric_subsystem,
+                registry=registry,
+                multiprocess_mode="livesum",
+            )
+            self.total_tokens = Gauge(
+                name="threadpool_total_tokens",
+                documentation="Threads available to sync endpoints and dependencies.",
+                namespace=metric_namespace,
+                subsystem=metric_subsystem,
+                registry=registry,
+                multiprocess_mode="livesum",
+            )
+        except ValueError as e:
+            if not _is_duplicated_time_series(e):
+                raise e
+            raise ValueError(
+                "A LoopMonitor already exports its metrics to this registry."
+            ) from e
+
+        self._slow_callbacks = LabelLimiter(
+            self.slow_callbacks,
+            max_label_sets,
+            dropped_label_sets(metric_namespace, metric_subsystem, registry),
+        ).labels
+
+        # Written by the sampler task, read by the watchdog thread.
+        self._expected_at = 0.0
+        self._reported_at = 0.0
+        self._loop_thread_id: Optional[int] = None
+        self._stopped = threading.Event()
+
+    @contextlib.asynccontextmanager
+    async def lifespan(self, app: Any) -> AsyncIterator[None]:
+        """Runs the monitor while the app is running, see `add_lifespan`."""
+        self._loop_thread_id = threading.get_ident()
+        self._expected_at = time.monotonic() + self.interval
+        self._stopped.clear()
+        task = asyncio.ensure_future(self._sample())
+        watchdog = threading.Thread(
+            target=self._watch, name="event-loop-watchdog", daemon=True
+        )
+        watchdog.start()
+        try:
+            yield
+        finally:
+            self._stopped.set()
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+            watchdog.join()
+
+    async def _sample(self) -> None:
+        limiter = anyio.to_thread.current_default_thread_limiter()
+        while True:
+            self._expected_at = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lag.observe(max(time.monotonic() - self._expected_at, 0.0))
+            self.borrowed_tokens.set(limiter.borrowed_tokens)
+            self.total_tokens.set(limiter.total_tokens)
+
+    def _watch(self) -> None:
+        while not self._stopped.wait(self.slow_callback_threshold / 2):
+            expected_at = self._expected_at
+            if expected_at == self._reported_at:
+                continue
+            if time.monotonic() - expected_at < self.slow_callback_threshold:
+                continue
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            self._slow_callbacks(_blocking_callback(frame)).inc()
+            # Count a blocked period once, until the sampler wakes up again.
+            self._reported_at = expected_at
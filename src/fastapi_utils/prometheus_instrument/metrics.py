@@ -10,7 +10,7 @@ create your own instrumentation function instead of combining several functions
 from this module.
 """
 
-from typing import Callable, Optional, Sequence
+from typing import Callable, List, Optional, Sequence, Tuple, TypeVar
 
 from prometheus_client import (
     REGISTRY,
@@ -20,26 +20,50 @@ from prometheus_client import (
     Histogram,
     Summary,
 )
+from prometheus_client.metrics import MetricWrapperBase
+from fastapi.datastructures import Headers
 from fastapi.requests import Request
 from fastapi.responses import Response
+from starlette.types import Scope
+
+from .breakdown import SEGMENTS, RequestTimings
+from .cardinality import LabelLimiter, dropped_label_sets
+
+M = TypeVar("M", bound=MetricWrapperBase)
 
 
 class Info:
     def __init__(
         self,
-        request: Request,
+        request: Optional[Request],
         response: Optional[Response],
         method: str,
         modified_handler: str,
         modified_status: str,
         modified_duration: float,
+        *,
+        scope: Optional[Scope] = None,
+        status_code: int = 500,
+        response_headers: Optional[List[Tuple[bytes, bytes]]] = None,
+        request_content_length: int = 0,
+        response_content_length: int = 0,
+        request_body_size: int = 0,
+        response_body_size: int = 0,
+        time_to_first_byte: Optional[float] = None,
+        time_to_last_byte: Optional[float] = None,
+        timings: Optional[RequestTimings] = None,
     ):
         """Creates Info object that is used for instrumentation functions.
 
         This is the only argument that is passed to the instrumentation functions.
 
+        The middleware does not build `request` and `response` itself. They are
+        created from `scope` and `response_headers` the first time an
+        instrumentation accesses them, so only instrumentations that need them
+        pay for them.
+
         Args:
-            request (Request): Python Requests request object.
+            request (Request or None): Python Requests request object.
             response (Response or None): Python Requests response object.
             method (str): Unmodified method of the request.
             modified_handler (str): Handler representation after processing by
@@ -47,16 +71,62 @@ class Info:
             modified_status (str): Status code representation after processing
                 by instrumentator. For example grouping into `2xx`, `3xx` and so on.
             modified_duration (float): Latency representation after processing
-                by instrumentator. For example rounding of decimals. Seconds.
-
+                by instrumentator. Seconds.
+            scope (Scope, optional): ASGI scope used to build `request` lazily.
+            status_code (int, optional): Status used to build `response` lazily.
+            response_headers (list, optional): Raw ASGI response headers used to
+                build `response` lazily.
+            request_content_length (int, optional): Value of the request
+                `Content-Length` header, 0 if missing.
+            response_content_length (int, optional): Value of the response
+                `Content-Length` header, 0 if missing.
+            request_body_size (int, optional): Bytes of request body read by
+                the app, counted as they were received. Also set for chunked
+                uploads, smaller than the header if the app did not read the
+                whole body.
+            response_body_size (int, optional): Bytes of response body sent,
+                counted as they were sent. Also set for streaming responses.
+            time_to_first_byte (float, optional): Seconds until the response
+                was started. `None` if no response was sent.
+            time_to_last_byte (float, optional): Seconds until the response
+                was completely sent. `None` if it was not. Unlike
+                `modified_duration`, it does not include background tasks.
+            timings (RequestTimings, optional): Latency breakdown, only set if
+                the middleware breaks down latencies.
         """
 
-        self.request = request
-        self.response = response
+        self._request = request
+        self._response = response
         self.method = method
         self.modified_handler = modified_handler
         self.modified_status = modified_status
         self.modified_duration = modified_duration
+        self.scope = scope
+        self.status_code = status_code
+        self.response_headers = response_headers
+        self.request_content_length = request_content_length
+        self.response_content_length = response_content_length
+        self.request_body_size = request_body_size
+        self.response_body_size = response_body_size
+        self.time_to_first_byte = time_to_first_byte
+        self.time_to_last_byte = time_to_last_byte
+        self.timings = timings
+
+    @property
+    def request(self) -> Optional[Request]:
+        if self._request is None and self.scope is not None:
+            self._request = Request(self.scope)
+        return self._request
+
+    @property
+    def response(self) -> Optional[Response]:
+        if self._response is None and self.response_headers is not None:
+            self._response = Response(
+                content=b"",
+                headers=Headers(raw=self.response_headers),
+                status_code=self.status_code,
+            )
+        return self._response
 
 
 def _is_duplicated_time_series(error: ValueError) -> bool:
@@ -71,6 +141,30 @@ def _is_duplicated_time_series(error: ValueError) -> bool:
     )
 
 
+def get_or_create(
+    metric_cls: type[M], name: str, registry: CollectorRegistry, **kwargs
+) -> M:
+    """Creates a metric, or returns the one `registry` already has by that name.
+
+    Lets several instrumented apps, or several instrumentators, share a
+    registry.
+    """
+    try:
+        return metric_cls(name=name, registry=registry, **kwargs)
+    except ValueError as e:
+        if not _is_duplicated_time_series(e):
+            raise e
+        full_name = "_".join(
+            part
+            for part in (kwargs.get("namespace"), kwargs.get("subsystem"), name)
+            if part
+        )
+        metric = registry._names_to_collectors.get(full_name)
+        if not isinstance(metric, metric_cls):
+            raise e
+        return metric
+
+
 def default(
     metric_namespace: str = "",
     metric_subsystem: str = "",
@@ -99,6 +193,7 @@ def default(
     ),
     latency_lowr_buckets: Sequence[float | str] = (0.1, 0.5, 1),
     registry: CollectorRegistry = REGISTRY,
+    max_label_sets: Optional[int] = 10_000,
 ) -> Optional[Callable[[Info], None]]:
     """Contains multiple metrics to cover multiple things.
 
@@ -110,9 +205,9 @@ def default(
     * `http_requests_total` (`handler`, `status`, `method`): Total number of
         requests by handler, status and method.
     * `http_request_size_bytes` (`handler`): Total number of incoming
-        content length bytes by handler.
+        body bytes by handler.
     * `http_response_size_bytes` (`handler`): Total number of outgoing
-        content length bytes by handler.
+        body bytes by handler.
     * `http_request_duration_highr_seconds` (no labels): High number of buckets
         leading to more accurate calculation of percentiles.
     * `http_request_duration_seconds` (`handler`, `method`):
@@ -134,6 +229,10 @@ def default(
             res histogram. Should be very small as all possible labels are
             included. Defaults to `(0.1, 0.5, 1)`.
 
+        max_label_sets (int, optional): Maximum number of label sets per metric.
+            Further label sets are recorded with all labels set to
+            `__overflow__`. `None` disables the limit. Defaults to 10000.
+
     Returns:
         Function that takes a single parameter `Info`.
     """
@@ -163,8 +262,8 @@ def default(
         IN_SIZE = Summary(
             name="http_request_size_bytes",
             documentation=(
-                "Content length of incoming requests by handler. "
-                "Only value of header is respected. Otherwise ignored. "
+                "Body size of incoming requests by handler. "
+                "Counted as the body is received, chunked requests included. "
                 "No percentile calculated. "
             ),
             labelnames=("handler",),
@@ -176,8 +275,8 @@ def default(
         OUT_SIZE = Summary(
             name="http_response_size_bytes",
             documentation=(
-                "Content length of outgoing responses by handler. "
-                "Only value of header is respected. Otherwise ignored. "
+                "Body size of outgoing responses by handler. "
+                "Counted as the body is sent, streaming responses included. "
                 "No percentile calculated. "
             ),
             labelnames=("handler",),
@@ -211,28 +310,185 @@ def default(
             registry=registry,
         )
 
+        dropped = dropped_label_sets(metric_namespace, metric_subsystem, registry)
+        total = LabelLimiter(TOTAL, max_label_sets, dropped).labels
+        in_size = LabelLimiter(IN_SIZE, max_label_sets, dropped).labels
+        out_size = LabelLimiter(OUT_SIZE, max_label_sets, dropped).labels
+        latency_lowr = LabelLimiter(LATENCY_LOWR, max_label_sets, dropped).labels
+
         def instrumentation(info: Info) -> None:
             duration = info.modified_duration
+            handler = info.modified_handler
 
-            TOTAL.labels(info.method, info.modified_status, info.modified_handler).inc()
-
-            IN_SIZE.labels(info.modified_handler).observe(
-                int(info.request.headers.get("Content-Length", 0))
-            )
-
-            if info.response and hasattr(info.response, "headers"):
-                OUT_SIZE.labels(info.modified_handler).observe(
-                    int(info.response.headers.get("Content-Length", 0))
-                )
-            else:
-                OUT_SIZE.labels(info.modified_handler).observe(0)
+            total(info.method, info.modified_status, handler).inc()
+            in_size(handler).observe(info.request_body_size)
+            out_size(handler).observe(info.response_body_size)
 
             if info.modified_status.startswith("2"):
                 LATENCY_HIGHR.observe(duration)
 
-            LATENCY_LOWR.labels(
-                handler=info.modified_handler, method=info.method
-            ).observe(duration)
+            latency_lowr(info.method, handler).observe(duration)
+
+        return instrumentation
+
+    except ValueError as e:
+        if not _is_duplicated_time_series(e):
+            raise e
+
+    return None
+
+
+def response_timing(
+    metric_namespace: str = "",
+    metric_subsystem: str = "",
+    buckets: Sequence[float | str] = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    registry: CollectorRegistry = REGISTRY,
+    max_label_sets: Optional[int] = 10_000,
+) -> Optional[Callable[[Info], None]]:
+    """Time to first and last byte of responses.
+
+    You get the following:
+
+    * `http_response_first_byte_seconds` (`handler`): Time until the response
+        was started, i.e. until the status and headers were sent.
+    * `http_response_last_byte_seconds` (`handler`): Time until the last byte
+        of the response body was sent. The difference to the first byte is the
+        streaming time of large or streaming responses.
+
+    Requests that never sent a response are not observed.
+
+    Args:
+        metric_namespace (str, optional): Namespace of all  metrics in this
+            metric function. Defaults to "".
+
+        metric_subsystem (str, optional): Subsystem of all  metrics in this
+            metric function. Defaults to "".
+
+        buckets (tuple[float], optional): Buckets of both histograms.
+
+        max_label_sets (int, optional): Maximum number of label sets per metric,
+            see `default`.
+
+    Returns:
+        Function that takes a single parameter `Info`.
+    """
+    if buckets[-1] != float("inf"):
+        buckets = [*buckets, float("inf")]
+
+    try:
+        FIRST_BYTE = Histogram(
+            name="http_response_first_byte_seconds",
+            documentation="Time until the response was started by handler.",
+            buckets=buckets,
+            labelnames=("handler",),
+            namespace=metric_namespace,
+            subsystem=metric_subsystem,
+            registry=registry,
+        )
+
+        LAST_BYTE = Histogram(
+            name="http_response_last_byte_seconds",
+            documentation="Time until the response was completely sent by handler.",
+            buckets=buckets,
+            labelnames=("handler",),
+            namespace=metric_namespace,
+            subsystem=metric_subsystem,
+            registry=registry,
+        )
+
+        dropped = dropped_label_sets(metric_namespace, metric_subsystem, registry)
+        first_byte = LabelLimiter(FIRST_BYTE, max_label_sets, dropped).labels
+        last_byte = LabelLimiter(LAST_BYTE, max_label_sets, dropped).labels
+
+        def instrumentation(info: Info) -> None:
+            if info.time_to_first_byte is not None:
+                first_byte(info.modified_handler).observe(info.time_to_first_byte)
+            if info.time_to_last_byte is not None:
+                last_byte(info.modified_handler).observe(info.time_to_last_byte)
+
+        return instrumentation
+
+    except ValueError as e:
+        if not _is_duplicated_time_series(e):
+            raise e
+
+    return None
+
+
+def latency_breakdown(
+    metric_namespace: str = "",
+    metric_subsystem: str = "",
+    buckets: Sequence[float | str] = (
+        0.001,
+        0.005,
+        0.01,
+        0.025,
+        0.05,
+        0.1,
+        0.25,
+        0.5,
+        1,
+        2.5,
+        5,
+        10,
+    ),
+    registry: CollectorRegistry = REGISTRY,
+    max_label_sets: Optional[int] = 10_000,
+) -> Optional[Callable[[Info], None]]:
+    """Latency of each segment of the requests, see `breakdown`.
+
+    You get the following:
+
+    * `http_request_segment_duration_seconds` (`handler`, `segment`): Time
+        spent in each segment (`queue`, `dependencies`, `handler`,
+        `serialization`, `send`). Segments that did not happen, such as the
+        handler of a request rejected by a dependency, are not observed.
+
+    Only requests broken down by the middleware are observed, see
+    `PrometheusInstrumentator.instrument(latency_breakdown=True)`.
+
+    Args:
+        metric_namespace (str, optional): Namespace of all  metrics in this
+            metric function. Defaults to "".
+
+        metric_subsystem (str, optional): Subsystem of all  metrics in this
+            metric function. Defaults to "".
+
+        buckets (tuple[float], optional): Buckets of the histogram.
+
+        max_label_sets (int, optional): Maximum number of label sets per metric,
+            see `default`.
+
+    Returns:
+        Function that takes a single parameter `Info`.
+    """
+    if buckets[-1] != float("inf"):
+        buckets = [*buckets, float("inf")]
+
+    try:
+        SEGMENT_DURATION = Histogram(
+            name="http_request_segment_duration_seconds",
+            documentation="Time spent in each segment of the requests by handler.",
+            buckets=buckets,
+            labelnames=("handler", "segment"),
+            namespace=metric_namespace,
+            subsystem=metric_subsystem,
+            registry=registry,
+        )
+
+        dropped = dropped_label_sets(metric_namespace, metric_subsystem, registry)
+        segment_duration = LabelLimiter(
+            SEGMENT_DURATION, max_label_sets, dropped
+        ).labels
+
+        def instrumentation(info: Info) -> None:
+            timings = info.timings
+            if timings is None:
+                return
+            for segment in SEGMENTS:
+                duration = getattr(timings, segment)
+                if duration is not None:
+                    segment_duration(info.modified_handler, segment).observe(duration)
 
         return instrumentation
 
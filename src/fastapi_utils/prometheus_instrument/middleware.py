@@ -1,17 +1,39 @@
 from __future__ import annotations
 
+import functools
 from http import HTTPStatus
 from timeit import default_timer
-from typing import Callable, Sequence, Tuple
+from typing import Callable, Iterable, Optional, Sequence, Tuple
 
 from prometheus_client import REGISTRY, CollectorRegistry, Gauge
 from fastapi.applications import FastAPI
-from fastapi.datastructures import Headers
-from fastapi.requests import Request
-from fastapi.responses import Response
 from starlette.types import Message, Receive, Scope, Send
 
-from . import metrics, routing
+from . import breakdown, metrics, routing
+from .cardinality import LabelLimiter, dropped_label_sets
+from .profiler import SlowRequestProfiler
+
+# ASGI extensions where the server sends a file itself.
+_FILE_RESPONSE_MESSAGES = ("http.response.pathsend", "http.response.zerocopysend")
+
+
+def _content_length(headers: Iterable[Tuple[bytes, bytes]]) -> int:
+    for key, value in headers:
+        if key.lower() == b"content-length":
+            return int(value)
+    return 0
+
+
+def _inprogress_gauge(registry: CollectorRegistry) -> Gauge:
+    """Returns the in-progress gauge, creating it once per registry."""
+    return metrics.get_or_create(
+        Gauge,
+        "http_requests_inprogress",
+        registry,
+        documentation="Number of HTTP requests in progress.",
+        labelnames=("method", "handler"),
+        multiprocess_mode="livesum",
+    )
 
 
 class PrometheusMiddleware:
@@ -23,9 +45,36 @@ class PrometheusMiddleware:
         metric_namespace: str = "",
         metric_subsystem: str = "",
         registry: CollectorRegistry = REGISTRY,
+        resolve_handler_after_routing: bool = False,
+        max_label_sets: Optional[int] = 10_000,
+        latency_breakdown: bool = False,
+        profiler: Optional[SlowRequestProfiler] = None,
     ):
+        """
+        Args:
+            max_label_sets: Maximum number of label sets of each metric, see
+                `metrics.default`.
+
+            resolve_handler_after_routing: Take the handler from the route the
+                router stored in the scope once the request is handled, instead
+                of matching the routes before calling the app. Route matching
+                then happens once per request, the route index is only used
+                for requests the router did not resolve (404s, redirects,
+                mounts). As the handler is unknown while the request is in
+                progress, `http_requests_inprogress` is labelled with
+                `handler="all"` in this mode.
+
+            latency_breakdown: Break the latency of every request down into
+                segments and record them with `metrics.latency_breakdown`.
+                Requires `breakdown.instrument_routing(app)` for the dependency
+                and handler segments.
+
+            profiler: Profiler sampling the stacks of slow requests, see
+                `profiler`.
+        """
         self.app = app
         self.registry = registry
+        self.resolve_handler_after_routing = resolve_handler_after_routing
 
         if instrumentations:
             self.instrumentations = instrumentations
@@ -34,89 +83,188 @@ class PrometheusMiddleware:
                 metric_namespace=metric_namespace,
                 metric_subsystem=metric_subsystem,
                 registry=self.registry,
+                max_label_sets=max_label_sets,
             )
             if default_instrumentation:
                 self.instrumentations = [default_instrumentation]
             else:
                 self.instrumentations = []
 
-        self.inprogress = Gauge(
-            name="http_requests_inprogress",
-            documentation="Number of HTTP requests in progress.",
-            labelnames=("method", "handler"),
-            multiprocess_mode="livesum",
-        )
+        self.profiler = profiler
+        self.latency_breakdown = latency_breakdown
+        if latency_breakdown:
+            breakdown_instrumentation = metrics.latency_breakdown(
+                metric_namespace=metric_namespace,
+                metric_subsystem=metric_subsystem,
+                registry=self.registry,
+                max_label_sets=max_label_sets,
+            )
+            if breakdown_instrumentation:
+                self.instrumentations = [
+                    *self.instrumentations,
+                    breakdown_instrumentation,
+                ]
+
+        self.inprogress = _inprogress_gauge(self.registry)
+        self._inprogress = LabelLimiter(
+            self.inprogress,
+            max_label_sets,
+            dropped_label_sets(metric_namespace, metric_subsystem, self.registry),
+        ).labels
 
     async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         if scope["type"] != "http":
             return await self.app(scope, receive, send)
 
-        request = Request(scope)
         start_time = default_timer()
+        method = scope["method"]
 
-        handler, is_templated = self._get_handler(request)
-        handler = handler if is_templated else "none"
-
-        inprogress = self.inprogress.labels(request.method, handler)
+        if self.resolve_handler_after_routing:
+            handler = None
+            # Routing mutates the scope, keep what the route index needs.
+            routing_scope = {
+                "app": scope["app"],
+                "path": scope["path"],
+                "root_path": scope.get("root_path", ""),
+            }
+            inprogress = self._inprogress(method, "all")
+        else:
+            handler = self._get_handler_label(scope)
+            inprogress = self._inprogress(method, handler)
         inprogress.inc()
 
+        profiler_token = None
+        if self.profiler is not None:
+            resolve_handler = None
+            if handler is None:
+                # Labels the slow requests like the metrics, mounts included.
+                resolve_handler = functools.partial(
+                    self._get_routed_handler_label, scope, routing_scope
+                )
+            profiler_token = self.profiler.begin(handler, scope, resolve_handler)
+
+        timings = token = None
+        if self.latency_breakdown:
+            timings = breakdown.RequestTimings(
+                breakdown.queue_duration(scope["headers"])
+            )
+            token = breakdown.TIMINGS.set(timings)
+
         status_code = 500
         headers = []
-        body = b""
+        request_body_size = 0
+        response_body_size = 0
         response_start_time = None
+        response_end_time = None
+
+        # Bodies are only measured, never copied or buffered.
+        async def receive_wrapper() -> Message:
+            nonlocal request_body_size
+            message = await receive()
+            if message["type"] == "http.request":
+                request_body_size += len(message.get("body", b""))
+            return message
 
         async def send_wrapper(message: Message) -> None:
-            if message["type"] == "http.response.start":
-                nonlocal status_code, headers, response_start_time
+            nonlocal status_code, headers, response_body_size
+            nonlocal response_start_time, response_end_time
+            message_type = message["type"]
+            if message_type == "http.response.start":
+                response_start_time = default_timer()
                 headers = message["headers"]
                 status_code = message["status"]
-                response_start_time = default_timer()
             await send(message)
 
+            if message_type == "http.response.body":
+                response_body_size += len(message.get("body", b""))
+                if not message.get("more_body", False):
+                    response_end_time = default_timer()
+            elif message_type in _FILE_RESPONSE_MESSAGES:
+                # The server sends the file, only its header tells the size.
+                response_body_size += _content_length(headers)
+                response_end_time = default_timer()
+
         try:
-            await self.app(scope, receive, send_wrapper)
-        except Exception as exc:
-            raise exc
+            await self.app(scope, receive_wrapper, send_wrapper)
         finally:
             status = (
                 str(status_code.value)
                 if isinstance(status_code, HTTPStatus)
                 else str(status_code)
             )
-
             duration = max(default_timer() - start_time, 0.0)
-            duration = round(duration, 4)
 
             inprogress.dec()
 
-            response = Response(
-                content=body,
-                headers=Headers(raw=headers),
-                status_code=status_code,
-            )
+            if profiler_token is not None:
+                self.profiler.end(profiler_token)
+
+            if timings is not None:
+                breakdown.TIMINGS.reset(token)
+                timings.finish(response_start_time, response_end_time)
+
+            if handler is None:
+                handler = self._get_routed_handler_label(scope, routing_scope)
 
             info = metrics.Info(
-                request=request,
-                response=response,
-                method=request.method,
+                request=None,
+                response=None,
+                method=method,
                 modified_handler=handler,
                 modified_status=status,
                 modified_duration=duration,
+                scope=scope,
+                status_code=status_code,
+                response_headers=headers,
+                request_content_length=_content_length(scope["headers"]),
+                response_content_length=_content_length(headers),
+                request_body_size=request_body_size,
+                response_body_size=response_body_size,
+                time_to_first_byte=(
+                    response_start_time - start_time
+                    if response_start_time is not None
+                    else None
+                ),
+                time_to_last_byte=(
+                    response_end_time - start_time
+                    if response_end_time is not None
+                    else None
+                ),
+                timings=timings,
             )
 
             for instrumentation in self.instrumentations:
                 instrumentation(info)
 
-    def _get_handler(self, request: Request) -> Tuple[str, bool]:
+    def _get_handler_label(self, scope: Scope) -> str:
+        handler, is_templated = self._get_handler(scope)
+        return handler if is_templated else "none"
+
+    def _get_routed_handler_label(self, scope: Scope, routing_scope: Scope) -> str:
+        """Handler label from the route the router matched, if usable.
+
+        Falls back to the route index if no route was stored, if it was matched
+        inside a mount (its path is relative to the mount) or if it only
+        matched partially (method not allowed).
+        """
+        route = scope.get("route")
+        mounted = scope.get("root_path", "") != routing_scope["root_path"]
+        if route is not None and not mounted:
+            methods = getattr(route, "methods", None)
+            if not methods or scope["method"] in methods:
+                return route.path
+        return self._get_handler_label({**scope, **routing_scope})
+
+    def _get_handler(self, scope: Scope) -> Tuple[str, bool]:
         """Extracts either template or (if no template) path.
 
         Args:
-            request (Request): Python Requests request object.
+            scope (Scope): ASGI scope of the request.
 
         Returns:
             Tuple[str, bool]: Tuple with two elements. First element is either
                 template or if no template the path. Second element tells you
                 if the path is templated or not.
         """
-        route_name = routing.get_route_name(request)
-        return route_name or request.url.path, True if route_name else False
+        route_name = routing.get_scope_route_name(scope)
+        return route_name or scope["path"], True if route_name else False
@@ -0,0 +1,96 @@
+"""
+Support for apps served by several worker processes (gunicorn, uvicorn
+`--workers`).
+
+In multiprocess mode `prometheus_client` writes every metric value to mmap
+files in `PROMETHEUS_MULTIPROC_DIR`, one file per metric type and process, and
+`/metrics` aggregates the files of all workers. The variable must be set
+before `prometheus_client` is imported, usually in the environment of the
+server process.
+
+Each file grows with the number of label sets of the metrics written to it,
+so the label set limit of the instrumentation (`max_label_sets`) also caps the
+size of the files and the cost of reading them on every scrape.
+"""
+
+import contextlib
+import glob
+import os
+import re
+from typing import Any, Optional
+
+import utils
+from prometheus_client import CollectorRegistry, multiprocess, values
+
+__all__ = [
+    "get_multiprocess_dir",
+    "create_registry",
+    "mark_process_dead",
+    "remove_dead_process_files",
+    "child_exit",
+]
+
+logger = utils.get_logger()
+
+_LIVE_GAUGE_FILE = re.compile(r"gauge_live[a-z]*_(\d+)\.db$")
+
+
+def get_multiprocess_dir() -> Optional[str]:
+    """Returns the multiprocess directory, `None` if not in multiprocess mode."""
+    path = os.environ.get(
+        "PROMETHEUS_MULTIPROC_DIR", os.environ.get("prometheus_multiproc_dir")
+    )
+    if path and values.ValueClass.__name__ != "MmapedValue":
+        logger.warning(
+            "PROMETHEUS_MULTIPROC_DIR was set after prometheus_client was imported, "
+            "metrics are not shared between processes."
+        )
+        return None
+    return path
+
+
+def create_registry(path: str) -> CollectorRegistry:
+    """Creates a registry that aggregates the metrics of all processes."""
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=path)
+    return registry
+
+
+def mark_process_dead(pid: Optional[int] = None, path: Optional[str] = None) -> None:
+    """Removes the live gauge files of a stopped process (default: this one)."""
+    multiprocess.mark_process_dead(pid if pid is not None else os.getpid(), path)
+
+
+def remove_dead_process_files(path: str) -> None:
+    """Removes the live gauge files left by processes that no longer exist.
+
+    Workers killed without a clean shutdown never call `mark_process_dead`, so
+    their in-progress requests would be reported forever. Workers starting
+    together race to remove the same files, so a file already removed by
+    another worker is skipped.
+    """
+    for file_path in glob.glob(os.path.join(path, "gauge_live*.db")):
+        match = _LIVE_GAUGE_FILE.search(file_path)
+        if match and not _is_alive(int(match.group(1))):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(file_path)
+
+
+def child_exit(server: Any, worker: Any) -> None:
+    """Gunicorn `child_exit` hook, use it in `gunicorn.conf.py`:
+
+    ```python
+    from fastapi_utils.prometheus_instrument.multiprocess import child_exit
+    ```
+    """
+    mark_process_dead(worker.pid)
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,228 @@
+"""
+Sampling profiler of slow requests.
+
+`SlowRequestProfiler` keeps the requests in progress, registered by
+`PrometheusMiddleware`. A sampler thread wakes up every `interval` seconds and
+only looks at the oldest request in progress, so it costs nearly nothing while
+no request is slow. Once requests exceed their latency threshold, it samples
+the stacks of the threads working for them:
+
+* the event loop thread, if the task it runs is one of the slow requests,
+  which covers async endpoints and dependencies,
+* the busy anyio worker threads, which run sync endpoints and dependencies.
+  Worker threads cannot be told apart, their stacks are attributed to the
+  slow handler if only one handler is slow, to `[threadpool]` otherwise.
+
+The samples are aggregated in a bounded table of collapsed stacks
+(`handler;outer frame;...;inner frame count`), the input format of
+flamegraph tools, served next to the metrics endpoint by
+`PrometheusInstrumentator.expose`.
+"""
+
+import asyncio
+import contextlib
+import itertools
+import sys
+import threading
+import time
+from types import FrameType
+from typing import Any, AsyncIterator, Callable, Iterable, Optional, Tuple
+
+from starlette.types import Scope
+
+__all__ = ["SlowRequestProfiler"]
+
+OTHER_STACKS = "[other]"
+THREADPOOL = "[threadpool]"
+
+_WORKER_THREAD_NAME = "AnyIO worker thread"
+
+
+def _is_loop_internal(frame: FrameType) -> bool:
+    return frame.f_code.co_name == "_run" and frame.f_code.co_filename.endswith(
+        ("asyncio/events.py", "asyncio\\events.py")
+    )
+
+
+def _collapse(frame: Optional[FrameType], max_depth: int) -> Optional[str]:
+    """Collapsed stack of `frame`, outermost frame first.
+
+    Frames of the event loop itself are left out. `None` if the thread only
+    waits for work, i.e. its innermost frame is in the `threading` or `queue`
+    module.
+    """
+    if frame is None or frame.f_globals.get("__name__") in ("threading", "queue"):
+        return None
+    frames = []
+    while frame is not None and len(frames) < max_depth:
+        if _is_loop_internal(frame):
+            break
+        code = frame.f_code
+        frames.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_qualname}")
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+
+class _InFlight:
+    __slots__ = ("start_time", "handler", "scope", "task", "resolve_handler")
+
+    def __init__(
+        self,
+        start_time: float,
+        handler: Optional[str],
+        scope: Scope,
+        task: Optional[asyncio.Task],
+        resolve_handler: Optional[Callable[[], str]],
+    ):
+        self.start_time = start_time
+        self.handler = handler
+        self.scope = scope
+        self.task = task
+        self.resolve_handler = resolve_handler
+
+    def get_handler(self) -> str:
+        if self.handler is not None:
+            return self.handler
+        if self.resolve_handler is not None:
+            return self.resolve_handler()
+        return getattr(self.scope.get("route"), "path", "none")
+
+
+class SlowRequestProfiler:
+    def __init__(
+        self,
+        threshold: float = 1.0,
+        *,
+        handler_thresholds: Optional[dict[str, float]] = None,
+        interval: float = 0.01,
+        max_stacks: int = 1_000,
+        max_depth: int = 64,
+    ):
+        """
+        Args:
+            threshold: Seconds after which requests are sampled.
+            handler_thresholds: Thresholds of specific handlers, by handler
+                label (route path template).
+            interval: Seconds between two samples.
+            max_stacks: Maximum number of distinct stacks kept. Further stacks
+                are counted in `handler;[other]`.
+            max_depth: Maximum number of frames per stack, the innermost ones
+                are kept.
+        """
+        self.threshold = threshold
+        self.handler_thresholds = handler_thresholds or {}
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.max_depth = max_depth
+
+        self._min_threshold = min([threshold, *self.handler_thresholds.values()])
+        self._inflight: dict[int, _InFlight] = {}
+        self._tokens = itertools.count()
+        self._stacks: dict[str, int] = {}
+        self._stacks_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._stopped = threading.Event()
+
+    def begin(
+        self,
+        handler: Optional[str],
+        scope: Scope,
+        resolve_handler: Optional[Callable[[], str]] = None,
+    ) -> int:
+        """Registers a request in progress, returns the token for `end`.
+
+        Args:
+            handler: Handler label, `None` if only known after routing.
+            resolve_handler: Returns the handler label of a request whose
+                `handler` is `None`, called by the sampler thread. Defaults to
+                the path of the route stored in `scope`, which is relative to
+                the mount of mounted routes.
+        """
+        token = next(self._tokens)
+        self._inflight[token] = _InFlight(
+            time.monotonic(), handler, scope, asyncio.current_task(), resolve_handler
+        )
+        return token
+
+    def end(self, token: int) -> None:
+        self._inflight.pop(token, None)
+
+    def render(self) -> str:
+        """Returns the collapsed stacks, one `stack count` per line."""
+        with self._stacks_lock:
+            stacks = sorted(self._stacks.items(), key=lambda item: -item[1])
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+    def clear(self) -> None:
+        with self._stacks_lock:
+            self._stacks.clear()
+
+    @contextlib.asynccontextmanager
+    async def lifespan(self, app: Any) -> AsyncIterator[None]:
+        """Runs the sampler thread while the app is running, see `add_lifespan`."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stopped.clear()
+        sampler = threading.Thread(
+            target=self._run, name="slow-request-profiler", daemon=True
+        )
+        sampler.start()
+        try:
+            yield
+        finally:
+            self._stopped.set()
+            sampler.join()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            slow = self._slow_requests()
+            if slow:
+                self._sample(slow)
+
+    def _slow_requests(self) -> list[Tuple[_InFlight, str]]:
+        now = time.monotonic()
+        try:
+            # Requests are registered in order, the first one is the oldest.
+            oldest = self._inflight[next(iter(self._inflight))]
+        except (StopIteration, KeyError, RuntimeError):
+            return []
+        if now - oldest.start_time < self._min_threshold:
+            return []
+
+        slow = []
+        for request in list(self._inflight.values()):
+            handler = request.get_handler()
+            threshold = self.handler_thresholds.get(handler, self.threshold)
+            if now - request.start_time >= threshold:
+                slow.append((request, handler))
+        return slow
+
+    def _sample(self, slow: list[Tuple[_InFlight, str]]) -> None:
+        frames = sys._current_frames()
+        samples = []
+
+        task = asyncio.current_task(self._loop) if self._loop is not None else None
+        for request, handler in slow:
+            if task is not None and request.task is task:
+                stack = _collapse(frames.get(self._loop_thread_id), self.max_depth)
+                if stack:
+                    samples.append(f"{handler};{stack}")
+                break
+
+        handlers = {handler for _, handler in slow}
+        worker_root = handlers.pop() if len(handlers) == 1 else THREADPOOL
+        for thread in threading.enumerate():
+            if thread.name.startswith(_WORKER_THREAD_NAME):
+                stack = _collapse(frames.get(thread.ident), self.max_depth)
+                if stack:
+                    samples.append(f"{worker_root};{stack}")
+
+        self._record(samples)
+
+    def _record(self, samples: Iterable[str]) -> None:
+        with self._stacks_lock:
+            for stack in samples:
+                if stack not in self._stacks and len(self._stacks) >= self.max_stacks:
+                    stack = f"{stack.split(';', 1)[0]};{OTHER_STACKS}"
+                self._stacks[stack] = self._stacks.get(stack, 0) + 1
@@ -1,9 +1,10 @@
-from typing import List, Optional
+from typing import Iterator, List, Optional, Tuple
 
+from fastapi.applications import FastAPI
 from fastapi.requests import Request
 from fastapi.routing import Match, Mount
 from starlette.types import Scope
-from starlette.routing import Route
+from starlette.routing import BaseRoute, Host, Route, WebSocketRoute
 
 
 def _get_route_name(
@@ -30,13 +31,176 @@ def _get_route_name(
     return None
 
 
+class RouteIndex:
+    """Route lookup table equivalent to `_get_route_name`.
+
+    * Requests to static paths (`/health`, `/users/me`, ...) are resolved with
+      a single dict lookup. Each entry is computed with `_get_route_name`
+      itself.
+    * Other requests are only matched against the routes that can fully match
+      them: routes accepting the request method whose first path segment is
+      the same as the request's, plus routes with a dynamic first segment. The
+      candidates keep the order of the app routes, so the first full match is
+      the same as with a linear scan.
+    * Routes of mounts get their own index, built on first use and rebuilt
+      when the mounted routes change.
+    """
+
+    def __init__(self, routes: List[Route], static: bool = True):
+        self.routes = routes
+        self.size = len(routes)
+        self.static: dict[Tuple[str, str], Optional[str]] = {}
+
+        self._entries = [
+            (route, _first_segment(route), getattr(route, "methods", None))
+            for route in routes
+            if not isinstance(route, WebSocketRoute)
+        ]
+        self._methods = set().union(*(methods or () for _, _, methods in self._entries))
+        self._segments = {
+            segment for _, segment, _ in self._entries if segment is not None
+        }
+        self._buckets: dict[str, dict[Optional[str], Tuple[Route, ...]]] = {}
+        self._mounts: dict[int, RouteIndex] = {}
+
+        if static and not any(isinstance(route, Host) for route in routes):
+            self._build_static()
+
+    def get_route_name(self, scope: Scope) -> Optional[str]:
+        if not scope.get("root_path"):
+            key = (scope["method"], scope["path"])
+            if key in self.static:
+                return self.static[key]
+        return self._get_route_name(scope)
+
+    def _get_route_name(self, scope: Scope) -> Optional[str]:
+        for route in self._get_candidates(scope):
+            match, child_scope = route.matches(scope)
+            if match == Match.FULL:
+                route_name = route.path
+                if isinstance(route, Mount) and route.routes:
+                    child_scope = {**scope, **child_scope}
+                    child_route_name = self._get_mount_index(route)._get_route_name(
+                        child_scope
+                    )
+                    if child_route_name is None:
+                        return None
+                    route_name += child_route_name
+                return route_name
+        return None
+
+    def _get_candidates(self, scope: Scope) -> Tuple[Route, ...]:
+        method = scope["method"]
+        if method not in self._methods:
+            method = "*"
+        buckets = self._buckets.get(method)
+        if buckets is None:
+            buckets = self._buckets[method] = self._build_buckets(method)
+
+        path = _get_route_path(scope)
+        segment = path[1:].split("/", 1)[0]
+        return buckets.get(segment, buckets[None])
+
+    def _build_buckets(self, method: str) -> dict[Optional[str], Tuple[Route, ...]]:
+        # Routes not accepting the method can only match partially, which
+        # never names a route.
+        entries = [
+            (route, segment)
+            for route, segment, methods in self._entries
+            if methods is None or method in methods
+        ]
+        buckets: dict[Optional[str], Tuple[Route, ...]] = {
+            key: tuple(
+                route for route, segment in entries if segment is None or segment == key
+            )
+            for key in self._segments
+        }
+        buckets[None] = tuple(route for route, segment in entries if segment is None)
+        return buckets
+
+    def _get_mount_index(self, mount: Mount) -> "RouteIndex":
+        routes = mount.routes
+        index = self._mounts.get(id(mount))
+        if index is None or index.routes is not routes or index.size != len(routes):
+            index = self._mounts[id(mount)] = RouteIndex(routes, static=False)
+        return index
+
+    def _build_static(self) -> None:
+        static_paths = list(_iter_static_paths(self.routes))
+        methods = set().union(*(route_methods for _, route_methods in static_paths))
+        for path, _ in static_paths:
+            for method in methods:
+                scope = {
+                    "type": "http",
+                    "path": path,
+                    "root_path": "",
+                    "method": method,
+                    "headers": [],
+                }
+                self.static[(method, path)] = _get_route_name(scope, self.routes)
+
+
+def _first_segment(route: BaseRoute) -> Optional[str]:
+    """First path segment if it is static, `None` if it can be anything."""
+
+    path = getattr(route, "path", None)
+    if not isinstance(route, (Route, Mount)) or path is None:
+        return None
+    if not path:
+        return None
+    segment = path[1:].split("/", 1)[0]
+    if "{" in segment:
+        return None
+    return segment
+
+
+def _get_route_path(scope: Scope) -> str:
+    """Path relative to the `root_path`, like Starlette matches routes."""
+
+    path: str = scope["path"]
+    root_path = scope.get("root_path", "")
+    if not root_path or not path.startswith(root_path):
+        return path
+    if path == root_path:
+        return ""
+    if path[len(root_path)] == "/":
+        return path[len(root_path) :]
+    return path
+
+
+def _iter_static_paths(
+    routes: List[Route], prefix: str = ""
+) -> Iterator[Tuple[str, set[str]]]:
+    for route in routes:
+        if isinstance(route, Mount):
+            if set(route.param_convertors) == {"path"} and route.routes:
+                yield from _iter_static_paths(route.routes, prefix + route.path)
+        elif isinstance(route, Route) and not route.param_convertors:
+            yield prefix + route.path, route.methods or set()
+
+
+def get_route_index(app: FastAPI) -> RouteIndex:
+    """Returns the route index of the app, rebuilding it if routes were added."""
+
+    routes = app.router.routes
+    index = getattr(app.state, "prometheus_route_index", None)
+    if index is None or index.routes is not routes or index.size != len(routes):
+        index = app.state.prometheus_route_index = RouteIndex(routes)
+    return index
+
+
 def get_route_name(request: Request) -> Optional[str]:
     """Gets route name for given request taking mounts into account."""
 
-    app = request.app
-    scope = request.scope
-    routes = app.routes
-    route_name = _get_route_name(scope, routes)
+    return get_scope_route_name(request.scope)
+
+
+def get_scope_route_name(scope: Scope) -> Optional[str]:
+    """Gets route name for given ASGI scope taking mounts into account."""
+
+    app = scope["app"]
+    index = get_route_index(app)
+    route_name = index.get_route_name(scope)
 
     # Starlette magically redirects requests if the path matches a route name
     # with a trailing slash appended or removed. To not spam the transaction
@@ -51,7 +215,7 @@ def get_route_name(request: Request) -> Optional[str]:
             redirect_scope["path"] = scope["path"] + "/"
             trim = False
 
-        route_name = _get_route_name(redirect_scope, routes)
+        route_name = index.get_route_name(redirect_scope)
         if route_name is not None:
             route_name = route_name + "/" if trim else route_name[:-1]
     return route_name
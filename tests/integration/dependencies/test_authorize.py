@@ -40,3 +40,94 @@
 #         assert isinstance(ctx, schemas.AuthorizationContext)
 #         for key, value in payload.items():
 #             assert getattr(ctx, key, None) == value
+
+
+import asyncio
+import pathlib
+import threading
+from typing import Iterator
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from prometheus_client import CollectorRegistry
+
+from fastapi_utils.dependencies import authorize
+from fastapi_utils.dependencies.caches import KeyCache, TokenCache
+from fastapi_utils.dependencies.executors import InstrumentedExecutor
+
+
+@pytest.fixture
+def private_key(tmp_path: pathlib.Path) -> Iterator[rsa.RSAPrivateKey]:
+    key_path = tmp_path / "public.pem"
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    key_path.write_bytes(
+        private_key.public_key().public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+    )
+    authorize.set_verification_key_cache(KeyCache(key_path, "RS256"))
+    yield private_key
+    authorize.set_verification_key_cache(None)
+
+
+@pytest.fixture
+def registry() -> Iterator[CollectorRegistry]:
+    registry = CollectorRegistry()
+    executor = InstrumentedExecutor("test-verification", registry=registry)
+    authorize.set_verification_executor(executor)
+    yield registry
+    authorize.set_verification_executor(None)
+    executor.shutdown()
+
+
+class TestGetAuthorizationContextAsync:
+    def _runs(self, registry: CollectorRegistry) -> float:
+        return registry.get_sample_value(
+            "fastapi_utils_executor_wait_seconds_count",
+            {"executor": "test-verification"},
+        )
+
+    def test_verified_on_executor(
+        self,
+        private_key: rsa.RSAPrivateKey,
+        registry: CollectorRegistry,
+        monkeypatch: pytest.MonkeyPatch,
+    ):
+        token = jwt.encode({"user_id": "1"}, private_key, algorithm="RS256")
+        thread_ids = []
+        decrypt = authorize.decrypt_authorize_token
+
+        def decrypt_authorize_token(*args):
+            thread_ids.append(threading.get_ident())
+            return decrypt(*args)
+
+        monkeypatch.setattr(
+            authorize, "decrypt_authorize_token", decrypt_authorize_token
+        )
+
+        context = asyncio.run(authorize.get_authorization_context_async(token))
+
+        assert context.user_id == "1"
+        assert thread_ids and threading.get_ident() not in thread_ids
+        # Loading the key, then checking the signature.
+        assert self._runs(registry) == 2
+
+    def test_token_cache_hit(
+        self, private_key: rsa.RSAPrivateKey, registry: CollectorRegistry
+    ):
+        token = jwt.encode({"user_id": "1"}, private_key, algorithm="RS256")
+        token_cache = TokenCache()
+        authorize.set_token_cache(token_cache)
+        try:
+            first = asyncio.run(authorize.get_authorization_context_async(token))
+            runs = self._runs(registry)
+            second = asyncio.run(authorize.get_authorization_context_async(token))
+        finally:
+            authorize.set_token_cache(None)
+
+        assert second == first and second is not first
+        assert self._runs(registry) == runs
+        assert (token_cache.hits, token_cache.misses) == (1, 1)
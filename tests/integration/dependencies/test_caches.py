@@ -0,0 +1,167 @@
+import os
+import pathlib
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from fastapi_utils.dependencies.caches import ExistenceCache, KeyCache, TokenCache
+
+
+def write_public_key(path: pathlib.Path) -> rsa.RSAPrivateKey:
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    path.write_bytes(
+        private_key.public_key().public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+    )
+    return private_key
+
+
+@pytest.fixture
+def key_path(tmp_path: pathlib.Path) -> pathlib.Path:
+    return tmp_path / "public.pem"
+
+
+class TestKeyCache:
+    def test_get_returns_parsed_key(self, key_path: pathlib.Path):
+        private_key = write_public_key(key_path)
+        key_cache = KeyCache(key_path, "RS256")
+
+        key = key_cache.get()
+
+        token = jwt.encode({"user_id": "1"}, private_key, algorithm="RS256")
+        assert jwt.decode(token, key=key, algorithms=["RS256"]) == {"user_id": "1"}
+        assert key_cache.get() is key
+        assert (key_cache.hits, key_cache.misses) == (1, 1)
+
+    def test_reload_on_mtime_change(self, key_path: pathlib.Path):
+        write_public_key(key_path)
+        key_cache = KeyCache(key_path, "RS256", check_interval=0)
+        key = key_cache.get()
+
+        private_key = write_public_key(key_path)
+        stat = key_path.stat()
+        os.utime(key_path, (stat.st_atime, stat.st_mtime + 10))
+
+        token = jwt.encode({"user_id": "1"}, private_key, algorithm="RS256")
+        assert key_cache.get() is not key
+        assert jwt.decode(token, key=key_cache.get(), algorithms=["RS256"])
+
+    def test_reload_on_ttl(self, key_path: pathlib.Path):
+        write_public_key(key_path)
+        key_cache = KeyCache(key_path, "RS256", ttl=0, check_interval=0)
+
+        assert key_cache.get() is not key_cache.get()
+
+    def test_invalidate(self, key_path: pathlib.Path):
+        write_public_key(key_path)
+        key_cache = KeyCache(key_path, "RS256")
+        key = key_cache.get()
+
+        key_cache.invalidate()
+
+        assert key_cache.get() is not key
+
+    def test_fetch_missing_key(self, key_path: pathlib.Path):
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            write_public_key(key_path)
+
+        key_cache = KeyCache(key_path, "RS256", fetch=fetch)
+
+        assert key_cache.get() is not None
+        assert len(calls) == 1
+
+    def test_fetch_expired_key(self, key_path: pathlib.Path):
+        write_public_key(key_path)
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            raise OSError("IAM unreachable")
+
+        key_cache = KeyCache(key_path, "RS256", ttl=0, check_interval=0, fetch=fetch)
+        key_cache.get()
+
+        # A failing refresh keeps the key of the file.
+        assert key_cache.get() is not None
+        assert len(calls) == 1
+
+
+class TestTokenCache:
+    def test_hit_and_miss(self):
+        token_cache = TokenCache()
+
+        assert token_cache.get("token") is None
+        token_cache.set("token", "context")
+
+        assert token_cache.get("token") == "context"
+        assert (token_cache.hits, token_cache.misses) == (1, 1)
+
+    def test_expire_at_exp_claim(self):
+        token_cache = TokenCache()
+
+        token_cache.set("token", "context", exp=time.time() - 1)
+
+        assert token_cache.get("token") is None
+        assert len(token_cache) == 0
+
+    def test_evict_least_recently_used(self):
+        token_cache = TokenCache(maxsize=2)
+        token_cache.set("a", 1)
+        token_cache.set("b", 2)
+        token_cache.get("a")
+
+        token_cache.set("c", 3)
+
+        assert token_cache.get("b") is None
+        assert token_cache.get("a") == 1
+        assert token_cache.evictions == 1
+
+
+class TestExistenceCache:
+    def test_positive_and_negative_entries(self):
+        existence_cache = ExistenceCache(ttl=60, negative_ttl=0)
+
+        existence_cache.set_many("models", {"1": True, "2": False})
+
+        assert existence_cache.get("models", "1") is True
+        assert existence_cache.get("models", "2") is None
+        assert existence_cache.get("others", "1") is None
+        assert existence_cache.stats() == {"models": (1, 1, 0), "others": (0, 1, 0)}
+
+    def test_ttl_per_resource_type(self):
+        existence_cache = ExistenceCache(ttl=60, ttls={"sessions": 0})
+
+        existence_cache.set("models", "1", True)
+        existence_cache.set("sessions", "1", True)
+
+        assert existence_cache.get("models", "1") is True
+        assert existence_cache.get("sessions", "1") is None
+
+    def test_evict_per_resource_type(self):
+        existence_cache = ExistenceCache(maxsize=2)
+        existence_cache.set_many("models", {"1": True, "2": True, "3": True})
+        existence_cache.set("others", "1", True)
+
+        assert existence_cache.get("models", "1") is None
+        assert existence_cache.get("models", "3") is True
+        assert existence_cache.get("others", "1") is True
+        assert existence_cache.evictions == 1
+
+    def test_invalidate(self):
+        existence_cache = ExistenceCache()
+        existence_cache.set_many("models", {"1": True, "2": False})
+
+        existence_cache.invalidate("models", ["1"])
+        assert existence_cache.get("models", "1") is None
+        assert existence_cache.get("models", "2") is False
+
+        existence_cache.invalidate("models")
+        assert existence_cache.get("models", "2") is None
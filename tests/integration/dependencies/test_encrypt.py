@@ -0,0 +1,59 @@
+import pathlib
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from fastapi_utils.dependencies.caches import KeyCache
+from fastapi_utils.dependencies.encrypt import TokenSigner
+
+
+@pytest.fixture
+def private_key(tmp_path: pathlib.Path) -> rsa.RSAPrivateKey:
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    (tmp_path / "private.pem").write_bytes(
+        private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+    )
+    return private_key
+
+
+@pytest.fixture
+def token_signer(tmp_path: pathlib.Path, private_key: rsa.RSAPrivateKey):
+    token_signer = TokenSigner(KeyCache(tmp_path / "private.pem", "RS256"))
+    yield token_signer
+    token_signer.close()
+
+
+class TestTokenSigner:
+    def test_create_access_token(
+        self, token_signer: TokenSigner, private_key: rsa.RSAPrivateKey
+    ):
+        token = token_signer.create_access_token({"user_id": "1"}, expires_delta=5)
+
+        payload = jwt.decode(token, private_key.public_key(), algorithms=["RS256"])
+        assert payload["user_id"] == "1"
+        assert "exp" in payload
+
+    @pytest.mark.parametrize("parallel", [False, True])
+    def test_create_access_tokens(
+        self,
+        token_signer: TokenSigner,
+        private_key: rsa.RSAPrivateKey,
+        parallel: bool,
+    ):
+        batch = [{"user_id": str(i)} for i in range(10)]
+
+        tokens = token_signer.create_access_tokens(batch, 5, parallel=parallel)
+
+        payloads = [
+            jwt.decode(token, private_key.public_key(), algorithms=["RS256"])
+            for token in tokens
+        ]
+        assert [payload["user_id"] for payload in payloads] == [
+            str(i) for i in range(10)
+        ]
@@ -0,0 +1,47 @@
+import asyncio
+import threading
+
+from prometheus_client import CollectorRegistry
+
+from fastapi_utils.dependencies.executors import InstrumentedExecutor
+
+
+class TestInstrumentedExecutor:
+    def test_run_off_loop(self):
+        registry = CollectorRegistry()
+        executor = InstrumentedExecutor("test-run", max_workers=2, registry=registry)
+
+        async def run():
+            return await asyncio.gather(
+                *(executor.run(threading.get_ident) for _ in range(4))
+            )
+
+        thread_ids = asyncio.run(run())
+        executor.shutdown()
+
+        assert threading.get_ident() not in thread_ids
+        wait_count = registry.get_sample_value(
+            "fastapi_utils_executor_wait_seconds_count", {"executor": "test-run"}
+        )
+        queue_depth = registry.get_sample_value(
+            "fastapi_utils_executor_queue_depth", {"executor": "test-run"}
+        )
+        assert wait_count == 4
+        assert queue_depth == 0
+
+    def test_executors_share_registry(self):
+        registry = CollectorRegistry()
+        executors = [
+            InstrumentedExecutor(name, registry=registry) for name in ("a", "b", "a")
+        ]
+
+        asyncio.run(executors[0].run(int))
+        for executor in executors:
+            executor.shutdown()
+
+        assert (
+            registry.get_sample_value(
+                "fastapi_utils_executor_wait_seconds_count", {"executor": "a"}
+            )
+            == 1
+        )
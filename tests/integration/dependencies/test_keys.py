@@ -0,0 +1,112 @@
+import asyncio
+import http.server
+import pathlib
+import threading
+from typing import Any, Generator
+
+import pytest
+
+from fastapi_utils.dependencies.keys import AsyncKeyProvider
+
+
+class StubKeyServer(http.server.ThreadingHTTPServer):
+    key = b"-----BEGIN PUBLIC KEY-----"
+
+    def __init__(self, failures: int = 0):
+        super().__init__(("127.0.0.1", 0), StubKeyHandler)
+        self.failures = failures
+        self.requests = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/public-key"
+
+
+class StubKeyHandler(http.server.BaseHTTPRequestHandler):
+    server: StubKeyServer
+
+    def do_GET(self):
+        self.server.requests += 1
+        if self.server.requests <= self.server.failures:
+            self.send_response(503)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(self.server.key)))
+        self.end_headers()
+        self.wfile.write(self.server.key)
+
+    def log_message(self, *args: Any):
+        pass
+
+
+@pytest.fixture
+def key_server(request) -> Generator[StubKeyServer, Any, None]:
+    server = StubKeyServer(failures=getattr(request, "param", 0))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TestAsyncKeyProvider:
+    def test_single_flight(self, key_server: StubKeyServer, tmp_path: pathlib.Path):
+        path = tmp_path / "public.pem"
+        provider = AsyncKeyProvider(key_server.url, path=path)
+
+        async def get_concurrently():
+            return await asyncio.gather(*(provider.get() for _ in range(20)))
+
+        keys = asyncio.run(get_concurrently())
+
+        assert keys == [StubKeyServer.key] * 20
+        assert key_server.requests == 1
+        assert path.read_bytes() == StubKeyServer.key
+
+    @pytest.mark.parametrize("key_server", [2], indirect=True)
+    def test_retry(self, key_server: StubKeyServer):
+        provider = AsyncKeyProvider(key_server.url, backoff=0.01)
+
+        key = asyncio.run(provider.get())
+
+        assert key == StubKeyServer.key
+        assert key_server.requests == 3
+
+    def test_stale_while_revalidate(self, key_server: StubKeyServer):
+        provider = AsyncKeyProvider(key_server.url, refresh_interval=0)
+
+        async def get_twice():
+            first = await provider.get()
+            second = await provider.get()
+            await provider.refresh()
+            return first, second
+
+        first, second = asyncio.run(get_twice())
+
+        assert first == second == StubKeyServer.key
+        assert key_server.requests == 2
+
+    @pytest.mark.parametrize("key_server", [1], indirect=True)
+    def test_fetch(self, key_server: StubKeyServer, tmp_path: pathlib.Path):
+        path = tmp_path / "public.pem"
+        provider = AsyncKeyProvider(key_server.url, path=path, backoff=0.01)
+
+        assert provider.fetch() == StubKeyServer.key
+        assert provider.fetch() == StubKeyServer.key
+        assert path.read_bytes() == StubKeyServer.key
+        # One failure, retried, then the fresh key is reused.
+        assert key_server.requests == 2
+
+    def test_fetch_missing_file(
+        self, key_server: StubKeyServer, tmp_path: pathlib.Path
+    ):
+        path = tmp_path / "public.pem"
+        provider = AsyncKeyProvider(key_server.url, path=path)
+        provider.fetch()
+
+        path.unlink()
+
+        assert provider.fetch() == StubKeyServer.key
+        assert path.exists()
+        assert key_server.requests == 2
@@ -1,3 +1,29 @@
+import asyncio
+import re
+import sys
+from unittest import mock
+
+import core
+import pytest
+import sqlalchemy as sa
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import orm as sa_orm
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from fastapi_utils.dependencies import resources
+from fastapi_utils.dependencies.caches import ExistenceCache
+from fastapi_utils.dependencies.resources import AsyncResourceManager, ResourceManager
+from fastapi_utils.exceptions import (
+    ResourceAlreadyExistsException,
+    ResourceNotFoundException,
+)
+from fastapi_utils.middlewares.exception_handlers import (
+    handle_resource_already_exists,
+    handle_resource_not_found,
+)
+from tests.double import fake
+
 # from typing import Generator, Any
 # import uuid
 
@@ -75,3 +101,404 @@
 #             match=f"{fake.Model.__name__} not found: {{'id': '{id}'}}",
 #         ):
 #             resource_manager.verify_resource_existed("models", id=id)
+
+
+class Item:
+    pass
+
+
+class Order:
+    pass
+
+
+@pytest.fixture(scope="module")
+def item_table() -> sa.Table:
+    registry = sa_orm.registry()
+    table = sa.Table(
+        "items",
+        registry.metadata,
+        sa.Column("id", sa.String(64), primary_key=True),
+        sa.Column("name", sa.String(64)),
+    )
+    registry.map_imperatively(Item, table)
+    order_table = sa.Table(
+        "orders", registry.metadata, sa.Column("id", sa.Integer, primary_key=True)
+    )
+    registry.map_imperatively(Order, order_table)
+    return table
+
+
+@pytest.fixture
+def engine(item_table: sa.Table) -> sa.Engine:
+    engine = sa.create_engine("sqlite://")
+    item_table.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(
+            item_table.insert(),
+            [{"id": str(i), "name": f"item-{i}"} for i in range(0, 1200, 2)],
+        )
+    return engine
+
+
+@pytest.fixture
+def items_manager(engine: sa.Engine) -> ResourceManager:
+    return ResourceManager(model_cls_map={"items": Item}, engine=engine)
+
+
+class TestBatchedExistence:
+    def test_resource_exists(self, items_manager: ResourceManager):
+        assert items_manager.resource_exists("items", id="2")
+        assert items_manager.resource_exists("items", id="2", name="item-2")
+        assert not items_manager.resource_exists("items", id="3")
+
+    def test_verify_resource_existed(self, items_manager: ResourceManager):
+        items_manager.verify_resource_existed("items", id="2")
+        with pytest.raises(ValueError, match="Item not found"):
+            items_manager.verify_resource_existed("items", id="3")
+
+    def test_verify_resource_inexisted(self, items_manager: ResourceManager):
+        items_manager.verify_resource_inexisted("items", id="3")
+        with pytest.raises(ValueError, match="Item already existed"):
+            items_manager.verify_resource_inexisted("items", id="2")
+
+    def test_find_missing_ids_in_order(self, items_manager: ResourceManager):
+        ids = ["5", "4", "3", "5", "2"]
+
+        assert items_manager.find_missing_ids("items", ids) == ["5", "3"]
+
+    def test_one_query_per_chunk(self, items_manager: ResourceManager, engine):
+        statements = []
+        sa.event.listen(
+            engine,
+            "before_cursor_execute",
+            lambda *args: statements.append(args[2]),
+        )
+
+        existing = items_manager.find_existing_ids(
+            "items", (str(i) for i in range(1000))
+        )
+
+        assert len(existing) == 500
+        assert len(statements) == 2
+
+    def test_verify_resources_existed(self, items_manager: ResourceManager):
+        items_manager.verify_resources_existed("items", ["0", "2", "4"])
+        with pytest.raises(ResourceNotFoundException) as exc_info:
+            items_manager.verify_resources_existed("items", ["1", "2", "3"])
+
+        assert exc_info.value.id == ["1", "3"]
+        assert exc_info.value.resource == "Item"
+
+    def test_verify_resources_inexisted(self, items_manager: ResourceManager):
+        items_manager.verify_resources_inexisted("items", ["1", "3"])
+        with pytest.raises(ResourceAlreadyExistsException) as exc_info:
+            items_manager.verify_resources_inexisted("items", ["1", "2", "4"])
+
+        assert exc_info.value.id == ["2", "4"]
+
+    def test_managers_share_the_resource_engine(self, engine: sa.Engine):
+        resources.set_resource_engine(engine)
+        try:
+            managers = [ResourceManager(model_cls_map={"items": Item}) for _ in "ab"]
+
+            assert all(manager.engine is engine for manager in managers)
+            assert managers[0].resource_exists("items", id="2")
+        finally:
+            resources.set_resource_engine(None)
+
+
+class DeletedItemEvent(core.Event):
+    id: str
+
+
+@pytest.fixture
+def database_path(tmp_path) -> str:
+    return f"sqlite:///{tmp_path / 'items.db'}"
+
+
+@pytest.fixture
+def sqlite_engine(database_path: str, item_table: sa.Table) -> sa.Engine:
+    engine = sa.create_engine(database_path)
+    item_table.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(item_table.insert(), [{"id": "1"}, {"id": "2"}])
+    return engine
+
+
+@pytest.fixture
+def statements(sqlite_engine: sa.Engine) -> list[str]:
+    statements = []
+    sa.event.listen(
+        sqlite_engine,
+        "before_cursor_execute",
+        lambda *args: statements.append(args[2]),
+    )
+    return statements
+
+
+@pytest.fixture
+def existence_cache() -> ExistenceCache:
+    return ExistenceCache()
+
+
+@pytest.fixture
+def cached_manager(
+    sqlite_engine: sa.Engine, existence_cache: ExistenceCache
+) -> ResourceManager:
+    return ResourceManager(
+        model_cls_map={"items": Item},
+        engine=sqlite_engine,
+        existence_cache=existence_cache,
+    )
+
+
+class TestExistenceCache:
+    @pytest.fixture
+    def event_router(
+        self, event_router: core.EventRouter, existence_cache: ExistenceCache
+    ) -> core.EventRouter:
+        existence_cache.add_invalidation_handler(
+            event_router, fake.CreatedModelEvent, "items"
+        )
+        existence_cache.add_invalidation_handler(
+            event_router,
+            DeletedItemEvent,
+            "items",
+            get_id=lambda event: event.id,
+            exists=False,
+        )
+        return event_router
+
+    def test_cache_hits_skip_queries(
+        self, cached_manager: ResourceManager, statements: list[str]
+    ):
+        cached_manager.verify_resource_existed("items", id="1")
+        cached_manager.verify_resource_existed("items", id="1")
+        with pytest.raises(ValueError):
+            cached_manager.verify_resource_existed("items", id="3")
+        with pytest.raises(ValueError):
+            cached_manager.verify_resource_existed("items", id="3")
+
+        assert len(statements) == 2
+
+    def test_batches_query_uncached_ids(
+        self, cached_manager: ResourceManager, statements: list[str]
+    ):
+        cached_manager.verify_resource_existed("items", id="1")
+
+        missing = cached_manager.find_missing_ids("items", ["1", "2", "3"])
+        assert cached_manager.find_missing_ids("items", ["1", "2", "3"]) == missing
+
+        assert missing == ["3"]
+        assert len(statements) == 2
+
+    def test_other_keys_are_not_cached(
+        self, cached_manager: ResourceManager, existence_cache: ExistenceCache
+    ):
+        cached_manager.verify_resource_existed("items", id="1", name=None)
+
+        assert existence_cache.stats() == {}
+
+    def test_created_event_invalidates_resource_type(
+        self,
+        cached_manager: ResourceManager,
+        bus: core.MessageBus,
+        sqlite_engine: sa.Engine,
+        item_table: sa.Table,
+    ):
+        assert not cached_manager.resource_exists("items", id="3")
+
+        with sqlite_engine.begin() as connection:
+            connection.execute(item_table.insert(), {"id": "3"})
+        # Publishes `fake.CreatedModelEvent`.
+        bus.handle(fake.CreateModelCommand(name="test"))
+
+        assert cached_manager.resource_exists("items", id="3")
+
+    def test_deleted_event_writes_through(
+        self,
+        cached_manager: ResourceManager,
+        bus: core.MessageBus,
+        sqlite_engine: sa.Engine,
+        item_table: sa.Table,
+        statements: list[str],
+    ):
+        assert cached_manager.resource_exists("items", id="1")
+
+        with sqlite_engine.begin() as connection:
+            connection.execute(item_table.delete().where(item_table.c.id == "1"))
+        bus.handle(DeletedItemEvent(id="1"))
+
+        assert not cached_manager.resource_exists("items", id="1")
+        assert len(statements) == 2
+
+    def test_event_during_query_is_not_overwritten(
+        self,
+        cached_manager: ResourceManager,
+        existence_cache: ExistenceCache,
+        sqlite_engine: sa.Engine,
+    ):
+        handler = existence_cache.add_invalidation_handler(
+            {},
+            DeletedItemEvent,
+            "items",
+            get_id=lambda event: event.id,
+            exists=False,
+        )
+        # The row is deleted once the query read it, before the write-back.
+        sa.event.listen(
+            sqlite_engine,
+            "after_cursor_execute",
+            lambda *args: handler(DeletedItemEvent(id="1")),
+            once=True,
+        )
+
+        assert cached_manager.resource_exists("items", id="1")
+        assert existence_cache.get("items", "1") is False
+
+    def test_invalidation_during_batch_query_drops_results(
+        self,
+        cached_manager: ResourceManager,
+        existence_cache: ExistenceCache,
+        sqlite_engine: sa.Engine,
+        statements: list[str],
+    ):
+        sa.event.listen(
+            sqlite_engine,
+            "after_cursor_execute",
+            lambda *args: existence_cache.invalidate("items"),
+            once=True,
+        )
+
+        assert cached_manager.find_missing_ids("items", ["1", "3"]) == ["3"]
+        assert cached_manager.find_missing_ids("items", ["1", "3"]) == ["3"]
+        assert len(statements) == 2
+
+
+@pytest.fixture
+def async_manager(sqlite_engine: sa.Engine, database_path: str) -> AsyncResourceManager:
+    return AsyncResourceManager(
+        model_cls_map={"items": Item},
+        engine=create_async_engine(
+            database_path.replace("sqlite://", "sqlite+aiosqlite://")
+        ),
+    )
+
+
+class TestAsyncResourceManager:
+    def test_verify_resource_existed(self, async_manager: AsyncResourceManager):
+        async def main():
+            try:
+                await async_manager.verify_resource_existed("items", id="1")
+                with pytest.raises(ValueError, match="Item not found"):
+                    await async_manager.verify_resource_existed("items", id="3")
+            finally:
+                await async_manager.dispose()
+
+        asyncio.run(main())
+
+    def test_verify_resource_inexisted(self, async_manager: AsyncResourceManager):
+        async def main():
+            try:
+                await async_manager.verify_resource_inexisted("items", id="3")
+                with pytest.raises(ValueError, match="Item already existed"):
+                    await async_manager.verify_resource_inexisted("items", id="1")
+            finally:
+                await async_manager.dispose()
+
+        asyncio.run(main())
+
+    def test_verify_resources_existed(self, async_manager: AsyncResourceManager):
+        async def main():
+            try:
+                await async_manager.verify_resources_existed("items", ["1", "2"])
+                await async_manager.verify_resources_existed("items", ["1", "3", "4"])
+            finally:
+                await async_manager.dispose()
+
+        with pytest.raises(ResourceNotFoundException) as exc_info:
+            asyncio.run(main())
+
+        assert exc_info.value.id == ["3", "4"]
+
+    def test_concurrent_checks_share_one_query(
+        self, async_manager: AsyncResourceManager
+    ):
+        async_manager.existence_cache = ExistenceCache()
+        statements = []
+        sa.event.listen(
+            async_manager.engine.sync_engine,
+            "before_cursor_execute",
+            lambda *args: statements.append(args[2]),
+        )
+
+        async def main():
+            try:
+                await asyncio.gather(
+                    *(async_manager.resource_exists("items", id="1") for _ in range(5))
+                )
+                return await async_manager.find_missing_ids("items", ["1", "3"])
+            finally:
+                await async_manager.dispose()
+
+        assert asyncio.run(main()) == ["3"]
+        assert async_manager.existence_cache.get("items", "3") is False
+        # One query for the 5 concurrent checks of "1", one for "3".
+        assert len(statements) == 2
+
+    def test_parse_id(self, item_table: sa.Table):
+        manager = AsyncResourceManager(model_cls_map={"orders": Order, "items": Item})
+
+        assert manager.parse_id("orders", "7") == 7
+        assert manager.parse_id("items", "7") == "7"
+        with pytest.raises(ValueError):
+            manager.parse_id("orders", "seven")
+
+    def test_dependencies(self, async_manager: AsyncResourceManager):
+        app = FastAPI()
+        app.add_exception_handler(ResourceNotFoundException, handle_resource_not_found)
+        app.add_exception_handler(
+            ResourceAlreadyExistsException, handle_resource_already_exists
+        )
+
+        @app.get(
+            "/items/{id}",
+            dependencies=[Depends(resources.require_resource_existed("items"))],
+        )
+        async def get_item(id: str):
+            return id
+
+        @app.put(
+            "/items/{id}",
+            dependencies=[Depends(resources.require_resource_inexisted("items"))],
+        )
+        async def put_item(id: str):
+            return id
+
+        resources.set_async_resource_manager(async_manager)
+        try:
+            with TestClient(app) as client:
+                assert client.get("/items/1").status_code == 200
+                assert client.get("/items/3").status_code == 404
+                assert client.put("/items/3").status_code == 200
+                assert client.put("/items/1").status_code == 409
+        finally:
+            resources.set_async_resource_manager(None)
+
+    @pytest.mark.parametrize(
+        "url, requirement",
+        [
+            ("postgresql://user@localhost/db", "tex-corver-fastapi-utils[postgres]"),
+            ("mysql://user@localhost/db", "tex-corver-fastapi-utils[mysql]"),
+        ],
+    )
+    def test_missing_async_driver(
+        self, url: str, requirement: str, monkeypatch: pytest.MonkeyPatch
+    ):
+        engine = mock.Mock(url=sa.make_url(url))
+        monkeypatch.setattr(resources, "create_engine_from_config", lambda: engine)
+        for driver in resources.ASYNC_DRIVERS.values():
+            monkeypatch.setitem(sys.modules, driver, None)
+
+        with pytest.raises(ImportError, match=re.escape(requirement)):
+            resources.create_async_engine_from_config()
@@ -0,0 +1,145 @@
+import logging
+import threading
+
+import pytest
+from prometheus_client import CollectorRegistry
+
+from fastapi_utils.middlewares import error_log as error_log_module
+from fastapi_utils.middlewares.error_log import ErrorLog
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages: list[str] = []
+
+    def emit(self, record: logging.LogRecord):
+        self.messages.append(record.getMessage())
+
+
+@pytest.fixture
+def handler() -> ListHandler:
+    return ListHandler()
+
+
+@pytest.fixture
+def logger(handler: ListHandler) -> logging.Logger:
+    logger = logging.Logger("test_error_log")
+    logger.addHandler(handler)
+    return logger
+
+
+@pytest.fixture
+def registry() -> CollectorRegistry:
+    return CollectorRegistry()
+
+
+def dropped(registry: CollectorRegistry, policy: str) -> float:
+    return (
+        registry.get_sample_value(
+            "fastapi_utils_error_log_dropped_total", {"policy": policy}
+        )
+        or 0
+    )
+
+
+class TestErrorLog:
+    def test_deduplicates_within_window(
+        self, logger: logging.Logger, handler: ListHandler, registry: CollectorRegistry
+    ):
+        error_log = ErrorLog(logger, window=60, registry=registry)
+
+        for _ in range(5):
+            error_log.error("Traceback\nResourceNotFoundException: 1")
+        error_log.error("other")
+        error_log.stop()
+
+        assert handler.messages[:2] == [
+            "Traceback\nResourceNotFoundException: 1",
+            "other",
+        ]
+        assert len(handler.messages) == 3
+        assert handler.messages[2].startswith("4 more occurrences in ")
+        assert handler.messages[2].endswith(": ResourceNotFoundException: 1")
+        assert (
+            registry.get_sample_value("fastapi_utils_error_log_deduplicated_total") == 4
+        )
+
+    def test_logs_again_after_window(
+        self, logger: logging.Logger, handler: ListHandler, registry: CollectorRegistry
+    ):
+        error_log = ErrorLog(logger, window=0, registry=registry)
+
+        error_log.error("error")
+        error_log.error("error")
+        error_log.stop()
+
+        assert handler.messages == ["error", "error"]
+
+    def test_skips_disabled_levels(
+        self, logger: logging.Logger, handler: ListHandler, registry: CollectorRegistry
+    ):
+        logger.setLevel(logging.WARNING)
+        error_log = ErrorLog(logger, registry=registry)
+
+        error_log.info("info")
+        error_log.stop()
+
+        assert handler.messages == []
+        assert error_log.queue.empty()
+
+    @pytest.mark.parametrize("policy,kept", [("newest", "first"), ("oldest", "second")])
+    def test_drops_when_full(
+        self,
+        logger: logging.Logger,
+        handler: ListHandler,
+        registry: CollectorRegistry,
+        policy: str,
+        kept: str,
+    ):
+        error_log = ErrorLog(
+            logger, max_queue_size=1, drop_policy=policy, registry=registry
+        )
+        error_log._thread = object()  # Keeps the records on the queue.
+
+        error_log.error("first")
+        error_log.error("second")
+
+        assert dropped(registry, policy) == 1
+        assert error_log.queue.get_nowait().getMessage() == kept
+
+    def test_writes_directly_once_stopped(
+        self, logger: logging.Logger, handler: ListHandler, registry: CollectorRegistry
+    ):
+        error_log = ErrorLog(logger, registry=registry)
+        error_log.error("first")
+        error_log.stop()
+        thread = error_log._thread
+
+        error_log.error("second")
+        error_log.start()
+
+        assert handler.messages == ["first", "second"]
+        assert error_log._thread is thread
+        assert not thread.is_alive()
+
+    def test_stops_when_the_wake_up_is_dropped(
+        self, logger: logging.Logger, handler: ListHandler, registry: CollectorRegistry
+    ):
+        error_log = ErrorLog(
+            logger, max_queue_size=1, drop_policy="oldest", registry=registry
+        )
+        error_log._stopped.set()
+        error_log.queue.put_nowait(error_log_module._STOP)
+        error_log._logger.error("last")
+        thread = threading.Thread(target=error_log._run, daemon=True)
+
+        thread.start()
+        thread.join(timeout=5)
+
+        assert not thread.is_alive()
+        assert handler.messages == ["last"]
+
+    def test_rejects_unknown_policy(self, registry: CollectorRegistry):
+        with pytest.raises(ValueError):
+            ErrorLog(logging.getLogger(), drop_policy="random", registry=registry)
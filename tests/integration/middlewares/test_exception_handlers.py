@@ -0,0 +1,126 @@
+import logging
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import CollectorRegistry
+
+from fastapi_utils.exceptions import ResourceNotFoundException
+from fastapi_utils.middlewares import exception_handlers
+from fastapi_utils.middlewares.error_log import ErrorLog
+from fastapi_utils.middlewares.exception_handlers import ErrorRenderer
+
+
+@pytest.fixture
+def client() -> TestClient:
+    app = FastAPI()
+    app.add_exception_handler(
+        ResourceNotFoundException,
+        exception_handlers.handle_resource_not_found,
+    )
+
+    @app.get("/models/{id}")
+    def get_model(id: str):
+        raise ResourceNotFoundException(id, "Model")
+
+    return TestClient(app)
+
+
+@pytest.fixture
+def registry() -> CollectorRegistry:
+    return CollectorRegistry()
+
+
+@pytest.fixture
+def set_error_renderer():
+    previous = exception_handlers.ERROR_RENDERER
+    yield exception_handlers.set_error_renderer
+    exception_handlers.set_error_renderer(previous)
+
+
+def handled(registry: CollectorRegistry, exception: str, status_code: int) -> float:
+    return (
+        registry.get_sample_value(
+            "fastapi_utils_handled_exceptions_total",
+            {"exception": exception, "status_code": str(status_code)},
+        )
+        or 0
+    )
+
+
+class TestErrorRenderer:
+    def test_always_returns_traceback(
+        self, client: TestClient, set_error_renderer, registry: CollectorRegistry
+    ):
+        set_error_renderer(ErrorRenderer("always", registry=registry))
+
+        response = client.get("/models/1")
+
+        assert response.status_code == 404
+        assert response.headers["content-type"] == "application/json"
+        assert "ResourceNotFoundException" in response.json()["traceback"]
+        assert handled(registry, "ResourceNotFoundException", 404) == 1
+
+    def test_off_skips_traceback(
+        self,
+        client: TestClient,
+        set_error_renderer,
+        registry: CollectorRegistry,
+        monkeypatch,
+    ):
+        set_error_renderer(ErrorRenderer("off", registry=registry))
+        monkeypatch.setattr(
+            exception_handlers.traceback,
+            "format_exception",
+            pytest.fail,
+        )
+
+        response = client.get("/models/1")
+
+        assert response.status_code == 404
+        assert response.json() == {"message": "('1', 'Model')", "traceback": None}
+
+    @pytest.mark.parametrize("sample_rate,captured", [(0.0, False), (1.0, True)])
+    def test_sampled(
+        self,
+        client: TestClient,
+        set_error_renderer,
+        registry: CollectorRegistry,
+        sample_rate: float,
+        captured: bool,
+    ):
+        set_error_renderer(
+            ErrorRenderer("sampled", sample_rate=sample_rate, registry=registry)
+        )
+
+        response = client.get("/models/1")
+
+        assert (response.json()["traceback"] is not None) is captured
+
+    def test_logs_through_error_log(
+        self, client: TestClient, set_error_renderer, registry: CollectorRegistry
+    ):
+        records = []
+        logger = logging.Logger("test_exception_handlers")
+        logger.handle = records.append
+        error_log = ErrorLog(logger)
+        set_error_renderer(ErrorRenderer("off", error_log=error_log, registry=registry))
+
+        client.get("/models/1")
+        client.get("/models/1")
+        error_log.stop()
+
+        assert [record.levelno for record in records] == [logging.INFO] * 2
+        assert records[0].getMessage().startswith("ResourceNotFoundException (404)")
+        assert records[1].getMessage().startswith("1 more occurrences in ")
+
+    def test_template_escapes_message(self, registry: CollectorRegistry):
+        template = ErrorRenderer(registry=registry).template(409)
+
+        assert template.render('"quoted"\n', None) == (
+            b'{"message":"\\"quoted\\"\\n","traceback":null}'
+        )
+
+    def test_rejects_unknown_mode(self, registry: CollectorRegistry):
+        with pytest.raises(ValueError):
+            ErrorRenderer("sometimes", registry=registry)
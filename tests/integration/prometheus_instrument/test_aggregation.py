@@ -0,0 +1,145 @@
+import random
+import threading
+from typing import Dict, List, Tuple
+
+import pytest
+from prometheus_client import CollectorRegistry
+
+from fastapi_utils.prometheus_instrument import aggregation, buckets
+from fastapi_utils.prometheus_instrument.aggregation import AggregatedMetrics
+from fastapi_utils.prometheus_instrument.metrics import Info
+
+
+def _samples(registry: CollectorRegistry) -> Dict[Tuple, float]:
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for metric in registry.collect()
+        for sample in metric.samples
+    }
+
+
+def _observe(metrics: AggregatedMetrics, durations: List[float]) -> None:
+    for i, duration in enumerate(durations):
+        status = "2xx" if i % 3 else "5xx"
+        metrics.instrumentation(
+            Info(None, None, "GET", f"/items/{i % 2}", status, duration)
+        )
+
+
+class TestAggregatedMetrics:
+    @pytest.fixture
+    def durations(self) -> List[float]:
+        rng = random.Random(0)
+        durations = [rng.expovariate(5) for _ in range(1000)]
+        # Durations on a bound belong to the bucket of the bound.
+        return durations + [0.1, 0.5, 1.0, 0.01, 60.0]
+
+    @pytest.mark.parametrize("use_numpy", [False, True])
+    def test_buffered_same_as_unbuffered(
+        self,
+        durations: List[float],
+        use_numpy: bool,
+        monkeypatch: pytest.MonkeyPatch,
+    ):
+        if use_numpy:
+            pytest.importorskip("numpy")
+        else:
+            monkeypatch.setattr(aggregation, "numpy", None)
+        unbuffered_registry = CollectorRegistry()
+        buffered_registry = CollectorRegistry()
+        unbuffered = AggregatedMetrics(registry=unbuffered_registry)
+        buffered = AggregatedMetrics(registry=buffered_registry, buffer_size=64)
+
+        _observe(unbuffered, durations)
+        _observe(buffered, durations)
+
+        expected = _samples(unbuffered_registry)
+        actual = _samples(buffered_registry)
+        assert actual.keys() == expected.keys()
+        for key, value in expected.items():
+            assert actual[key] == pytest.approx(value)
+
+    def test_pending_durations_are_scraped_once(self):
+        registry = CollectorRegistry()
+        metrics = AggregatedMetrics(registry=registry, buffer_size=3)
+        labels = {
+            "method": "GET",
+            "handler": "/items/0",
+        }
+
+        _observe(metrics, [0.2, 0.2])
+        assert (
+            registry.get_sample_value("http_request_duration_seconds_count", labels)
+            == 1
+        )
+        _observe(metrics, [0.2, 0.2])
+        assert (
+            registry.get_sample_value("http_request_duration_seconds_count", labels)
+            == 2
+        )
+
+    @pytest.mark.parametrize("buffer_size", [None, 64])
+    def test_exited_threads_are_retired(self, buffer_size):
+        registry = CollectorRegistry()
+        metrics = AggregatedMetrics(registry=registry, buffer_size=buffer_size)
+        labels = {"method": "GET", "handler": "/items/0"}
+
+        for _ in range(20):
+            threads = [
+                threading.Thread(target=_observe, args=(metrics, [0.2] * 10))
+                for _ in range(5)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        assert len(metrics._shards) == 0
+        assert (
+            registry.get_sample_value("http_request_duration_seconds_count", labels)
+            == 500
+        )
+        _observe(metrics, [0.2] * 10)
+        assert len(metrics._shards) == 1
+        assert (
+            registry.get_sample_value("http_request_duration_seconds_count", labels)
+            == 505
+        )
+
+    def test_sparse_buckets(self):
+        registry = CollectorRegistry()
+        metrics = AggregatedMetrics(
+            latency_highr_buckets=[0.1, 0.2, 0.3, 0.4, 0.5],
+            registry=registry,
+            buffer_size=10,
+            sparse_buckets=True,
+        )
+
+        metrics.instrumentation(Info(None, None, "GET", "/", "2xx", 0.35))
+
+        bounds = [
+            sample.labels["le"]
+            for metric in registry.collect()
+            if metric.name == "http_request_duration_highr_seconds"
+            for sample in metric.samples
+            if sample.name.endswith("_bucket")
+        ]
+        assert bounds == ["0.3", "0.4", "+Inf"]
+
+
+class TestBuckets:
+    def test_exponential_buckets(self):
+        assert buckets.exponential_buckets(0.001, 10, 4) == pytest.approx(
+            [0.001, 0.01, 0.1, 1]
+        )
+
+    def test_linear_buckets(self):
+        assert buckets.linear_buckets(0.5, 0.5, 3) == [0.5, 1.0, 1.5]
+
+    def test_native_buckets(self):
+        assert buckets.native_buckets(0, 0.3, 2) == [0.25, 0.5, 1, 2]
+        assert buckets.native_buckets(1, 1, 2) == pytest.approx([1, 2**0.5, 2])
+
+    def test_invalid_layout(self):
+        with pytest.raises(ValueError):
+            buckets.native_buckets(9, 0.001, 10)
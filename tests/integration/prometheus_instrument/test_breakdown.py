@@ -0,0 +1,123 @@
+import asyncio
+import time
+
+import fastapi.routing
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.dependencies.utils import solve_dependencies
+from fastapi.routing import run_endpoint_function
+from prometheus_client import REGISTRY, CollectorRegistry
+from starlette.testclient import TestClient
+
+from fastapi_utils.prometheus_instrument import PrometheusInstrumentator
+from fastapi_utils.prometheus_instrument.breakdown import queue_duration
+
+
+class TestLatencyBreakdown:
+    @pytest.fixture
+    def registry(self) -> CollectorRegistry:
+        for collector in list(REGISTRY._collector_to_names):
+            REGISTRY.unregister(collector)
+        return REGISTRY
+
+    @pytest.fixture
+    def fastapi_app(self) -> FastAPI:
+        app = FastAPI()
+
+        def slow_dependency() -> int:
+            time.sleep(0.05)
+            return 1
+
+        @app.get("/items/{item_id}")
+        def read_item(item_id: int, value: int = Depends(slow_dependency)):
+            time.sleep(0.02)
+            return {"item_id": item_id, "value": value}
+
+        return app
+
+    def _segment(self, registry: CollectorRegistry, segment: str, stat: str = "sum"):
+        return registry.get_sample_value(
+            f"http_request_segment_duration_seconds_{stat}",
+            {"handler": "/items/{item_id}", "segment": segment},
+        )
+
+    def test_segments(self, fastapi_app: FastAPI, registry: CollectorRegistry):
+        PrometheusInstrumentator(registry=registry).instrument(
+            fastapi_app, latency_breakdown=True
+        )
+        client = TestClient(fastapi_app)
+
+        client.get(
+            "/items/1", headers={"X-Request-Start": f"t={time.time() - 0.5:.3f}"}
+        )
+
+        assert 0.5 <= self._segment(registry, "queue") < 5
+        assert 0.05 <= self._segment(registry, "dependencies") < 0.5
+        assert 0.02 <= self._segment(registry, "handler") < 0.05
+        assert self._segment(registry, "serialization", "count") == 1
+        assert self._segment(registry, "send", "count") == 1
+        assert (
+            registry.get_sample_value(
+                "http_requests_total",
+                {"method": "GET", "status": "200", "handler": "/items/{item_id}"},
+            )
+            == 1
+        )
+
+    def test_routes_added_later(self, registry: CollectorRegistry):
+        app = FastAPI()
+        PrometheusInstrumentator(registry=registry).instrument(
+            app, latency_breakdown=True
+        )
+
+        @app.get("/items/{item_id}")
+        async def read_item(item_id: int):
+            await asyncio.sleep(0.02)
+            return {"item_id": item_id}
+
+        with TestClient(app) as client:
+            client.get("/items/1")
+
+        assert 0.02 <= self._segment(registry, "handler") < 0.05
+        assert self._segment(registry, "dependencies", "count") == 1
+
+    def test_other_apps_untouched(
+        self, fastapi_app: FastAPI, registry: CollectorRegistry
+    ):
+        other_app = FastAPI()
+        other_app.get("/")(lambda: None)
+        route = other_app.router.routes[-1]
+        route_app, endpoint = route.app, route.dependant.call
+        PrometheusInstrumentator(registry=registry).instrument(
+            fastapi_app, latency_breakdown=True
+        )
+
+        assert (route.app, route.dependant.call) == (route_app, endpoint)
+        assert fastapi.routing.solve_dependencies is solve_dependencies
+        assert fastapi.routing.run_endpoint_function is run_endpoint_function
+
+    def test_disabled(self, fastapi_app: FastAPI, registry: CollectorRegistry):
+        PrometheusInstrumentator(registry=registry).instrument(fastapi_app)
+        client = TestClient(fastapi_app)
+
+        client.get("/items/1")
+
+        assert self._segment(registry, "handler", "count") is None
+
+
+class TestQueueDuration:
+    @pytest.mark.parametrize(
+        "value",
+        [b"t=1700000000.250", b"1700000000250", b"t=1700000000250000"],
+    )
+    def test_units(self, value: bytes):
+        duration = queue_duration([(b"x-request-start", value)], now=1700000001.0)
+
+        assert duration == pytest.approx(0.75)
+
+    @pytest.mark.parametrize(
+        "headers",
+        [[], [(b"x-request-start", b"garbage")], [(b"x-queue-start", b"t=1800000000")]],
+    )
+    def test_unknown(self, headers):
+        assert queue_duration(headers, now=1700000000.0) is None
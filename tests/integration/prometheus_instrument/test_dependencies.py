@@ -0,0 +1,227 @@
+import sys
+from typing import Annotated, Any
+
+import fastapi
+import pytest
+import utils
+from fastapi import Depends, FastAPI
+from prometheus_client import CollectorRegistry, generate_latest
+from starlette.testclient import TestClient
+
+import fastapi_utils.dependencies
+from fastapi_utils.dependencies import authorize, resources
+from fastapi_utils.dependencies.caches import ExistenceCache, TokenCache
+from fastapi_utils.prometheus_instrument import PrometheusInstrumentator
+
+
+def get_value() -> int:
+    return 1
+
+
+async def get_async_value(value: int = Depends(get_value)) -> int:
+    return value + 1
+
+
+def reject():
+    raise fastapi.HTTPException(status_code=403)
+
+
+class TestInstrumentDependencies:
+    @pytest.fixture
+    def registry(self) -> CollectorRegistry:
+        return CollectorRegistry()
+
+    @pytest.fixture
+    def fastapi_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.get("/values")
+        def read_values(
+            value: int = Depends(get_value),
+            async_value: int = Depends(get_async_value),
+        ):
+            return [value, async_value]
+
+        @app.get("/rejected", dependencies=[Depends(reject)])
+        def read_rejected():
+            return None
+
+        @app.get("/context")
+        def read_context(
+            context: Annotated[Any, Depends(authorize.get_authorization_context)],
+        ):
+            return context
+
+        return app
+
+    def _calls(self, registry: CollectorRegistry, dependency: str):
+        return registry.get_sample_value(
+            "fastapi_utils_dependency_duration_seconds_count",
+            {"dependency": dependency},
+        )
+
+    def test_dependencies_are_timed(
+        self, fastapi_app: FastAPI, registry: CollectorRegistry
+    ):
+        PrometheusInstrumentator(registry=registry).instrument_dependencies(
+            fastapi_app, get_value, get_async_value, reject
+        )
+        client = TestClient(fastapi_app)
+
+        assert client.get("/values").json() == [1, 2]
+        assert client.get("/values").json() == [1, 2]
+        assert client.get("/rejected").status_code == 403
+
+        # `get_value` is also a sub-dependency of `get_async_value`, FastAPI
+        # calls it once per request.
+        assert self._calls(registry, "get_value") == 2
+        assert self._calls(registry, "get_async_value") == 2
+        assert self._calls(registry, "reject") == 1
+        assert (
+            registry.get_sample_value(
+                "fastapi_utils_dependency_exceptions_total", {"dependency": "reject"}
+            )
+            == 1
+        )
+
+    def test_overrides_still_apply(
+        self, fastapi_app: FastAPI, registry: CollectorRegistry
+    ):
+        fastapi_app.dependency_overrides[get_value] = lambda: 10
+        PrometheusInstrumentator(registry=registry).instrument_dependencies(
+            fastapi_app, get_value, get_async_value
+        )
+        fastapi_app.dependency_overrides[authorize.get_authorization_context] = (
+            lambda: {"user_id": "user"}
+        )
+        client = TestClient(fastapi_app)
+
+        assert client.get("/values").json() == [10, 11]
+        assert client.get("/context").json() == {"user_id": "user"}
+        assert self._calls(registry, "get_value") == 0
+        assert self._calls(registry, "get_async_value") == 1
+
+    def test_overrides_assigned_after_instrumentation(
+        self, fastapi_app: FastAPI, registry: CollectorRegistry
+    ):
+        PrometheusInstrumentator(registry=registry).instrument_dependencies(
+            fastapi_app, get_value, get_async_value
+        )
+        fastapi_app.dependency_overrides = {get_value: lambda: 10}
+        client = TestClient(fastapi_app)
+
+        assert client.get("/values").json() == [10, 11]
+        assert self._calls(registry, "get_value") == 0
+        assert self._calls(registry, "get_async_value") == 1
+
+    def test_scrape_without_encryption_config(
+        self, registry: CollectorRegistry, monkeypatch: pytest.MonkeyPatch
+    ):
+        # As in an app that never imported `authorize`, with a config that
+        # `authorize` cannot be imported with.
+        monkeypatch.delitem(sys.modules, "fastapi_utils.dependencies.authorize")
+        monkeypatch.delattr(fastapi_utils.dependencies, "authorize")
+        monkeypatch.setattr(utils, "get_config", lambda: {"application": {}})
+        app = FastAPI()
+        app.get("/")(lambda: None)
+        PrometheusInstrumentator(registry=registry).instrument_dependencies(
+            app, include_library_dependencies=False
+        )
+
+        assert b"fastapi_utils_cache_requests_total" in generate_latest(registry)
+        assert "fastapi_utils.dependencies.authorize" not in sys.modules
+
+    def test_cache_metrics(self, fastapi_app: FastAPI, registry: CollectorRegistry):
+        token_cache = TokenCache()
+        authorize.set_token_cache(token_cache)
+        try:
+            PrometheusInstrumentator(registry=registry).instrument_dependencies(
+                fastapi_app
+            )
+            token_cache.set("token", "context")
+            token_cache.get("token")
+            token_cache.get("other")
+
+            assert (
+                registry.get_sample_value(
+                    "fastapi_utils_cache_requests_total",
+                    {"cache": "token", "result": "hit"},
+                )
+                == 1
+            )
+            assert (
+                registry.get_sample_value(
+                    "fastapi_utils_cache_requests_total",
+                    {"cache": "token", "result": "miss"},
+                )
+                == 1
+            )
+        finally:
+            authorize.set_token_cache(None)
+
+    def test_existence_cache_metrics(
+        self, fastapi_app: FastAPI, registry: CollectorRegistry
+    ):
+        existence_cache = ExistenceCache()
+        resources.set_resource_manager(
+            resources.ResourceManager({}, existence_cache=existence_cache)
+        )
+        try:
+            PrometheusInstrumentator(registry=registry).instrument_dependencies(
+                fastapi_app
+            )
+            existence_cache.set("models", "1", True)
+            existence_cache.get("models", "1")
+
+            assert (
+                registry.get_sample_value(
+                    "fastapi_utils_cache_requests_total",
+                    {"cache": "existence:models", "result": "hit"},
+                )
+                == 1
+            )
+        finally:
+            resources.set_resource_manager(None)
+
+    def test_async_existence_cache_metrics(
+        self, fastapi_app: FastAPI, registry: CollectorRegistry
+    ):
+        existence_cache = ExistenceCache()
+        async_existence_cache = ExistenceCache()
+        resources.set_resource_manager(
+            resources.ResourceManager({}, existence_cache=existence_cache)
+        )
+        resources.set_async_resource_manager(
+            resources.AsyncResourceManager({}, existence_cache=async_existence_cache)
+        )
+        try:
+            PrometheusInstrumentator(registry=registry).instrument_dependencies(
+                fastapi_app
+            )
+            for cache in (existence_cache, async_existence_cache):
+                cache.set("models", "1", True)
+                cache.get("models", "1")
+
+            assert (
+                registry.get_sample_value(
+                    "fastapi_utils_cache_requests_total",
+                    {"cache": "existence:models", "result": "hit"},
+                )
+                == 2
+            )
+
+            # A cache shared by both managers is counted once.
+            resources.set_async_resource_manager(
+                resources.AsyncResourceManager({}, existence_cache=existence_cache)
+            )
+
+            assert (
+                registry.get_sample_value(
+                    "fastapi_utils_cache_requests_total",
+                    {"cache": "existence:models", "result": "hit"},
+                )
+                == 1
+            )
+        finally:
+            resources.set_resource_manager(None)
+            resources.set_async_resource_manager(None)
@@ -87,3 +87,58 @@ class TestPrometheusInstrumentatorExpose:
         response = client.get("/metrics")
 
         assert response.status_code == 200
+
+    @pytest.mark.parametrize(
+        "accept_encoding", ["gzip", "deflate, GZIP;q=0.5", "br;q=1.0, *;q=0.1"]
+    )
+    def test_expose_gzip(self, fastapi_app, registry, accept_encoding):
+        PrometheusInstrumentator(registry=registry).instrument(fastapi_app).expose(
+            fastapi_app
+        )
+        client = TestClient(fastapi_app)
+
+        response = client.get("/metrics", headers={"Accept-Encoding": accept_encoding})
+
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert b"metrics_render_duration_seconds" in response.content
+
+    @pytest.mark.parametrize(
+        "accept_encoding", ["identity", "gzip;q=0", "*, gzip; q=0.000", "x-gzipped"]
+    )
+    def test_expose_gzip_refused(self, fastapi_app, registry, accept_encoding):
+        PrometheusInstrumentator(registry=registry).instrument(fastapi_app).expose(
+            fastapi_app
+        )
+        client = TestClient(fastapi_app)
+
+        response = client.get("/metrics", headers={"Accept-Encoding": accept_encoding})
+
+        assert "Content-Encoding" not in response.headers
+        assert b"metrics_render_duration_seconds" in response.content
+
+    def test_expose_openmetrics(self, fastapi_app, registry):
+        PrometheusInstrumentator(registry=registry).instrument(fastapi_app).expose(
+            fastapi_app
+        )
+        client = TestClient(fastapi_app)
+
+        response = client.get(
+            "/metrics", headers={"Accept": "application/openmetrics-text"}
+        )
+
+        assert response.headers["Content-Type"].startswith(
+            "application/openmetrics-text"
+        )
+        assert response.content.endswith(b"# EOF\n")
+
+    def test_expose_min_refresh_interval(self, fastapi_app, registry):
+        PrometheusInstrumentator(registry=registry).instrument(fastapi_app).expose(
+            fastapi_app, min_refresh_interval=60
+        )
+        client = TestClient(fastapi_app)
+
+        first = client.get("/metrics")
+        client.get("/")
+        second = client.get("/metrics")
+
+        assert first.content == second.content
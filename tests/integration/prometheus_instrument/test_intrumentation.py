@@ -9,15 +9,18 @@ from prometheus_client import (
     REGISTRY,
     CollectorRegistry,
     Counter,
+    Gauge,
     Info,
     generate_latest,
 )
 import pytest
 from requests import Response as TestClientResponse
-from starlette.responses import Response
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
 from starlette.testclient import TestClient
 
 from fastapi_utils.prometheus_instrument import PrometheusInstrumentator, metrics
+from fastapi_utils.prometheus_instrument.aggregation import AggregatedMetrics
 from icecream import ic
 from prometheus_client import gc_collector, platform_collector, process_collector
 
@@ -200,3 +203,219 @@ class TestInstrumentation:
 
         assert b'handler="/404_does_not_exist"' not in response.content
         assert b'handler="none"' in response.content
+
+    def test_info_request_and_response_adapters(
+        self, fastapi_app: FastAPI, registry: CollectorRegistry
+    ):
+        infos = []
+        (
+            PrometheusInstrumentator(registry=registry)
+            .add(infos.append)
+            .instrument(fastapi_app)
+        )
+        client = TestClient(fastapi_app)
+
+        client.post("/items", json={"name": "item"})
+
+        info = infos[0]
+        assert info.modified_handler == "/items"
+        assert info.request.url.path == "/items"
+        assert info.request.headers["Content-Length"] == str(
+            info.request_content_length
+        )
+        assert info.response.status_code == 200
+        assert info.response.headers["Content-Length"] == str(
+            info.response_content_length
+        )
+
+    def test_content_length_sizes(
+        self, fastapi_app: FastAPI, registry: CollectorRegistry
+    ):
+        PrometheusInstrumentator(registry=registry).instrument(fastapi_app)
+        client = TestClient(fastapi_app)
+
+        client.post("/items", content=b'{"name": "item"}')
+
+        assert (
+            registry.get_sample_value(
+                "http_request_size_bytes_sum", {"handler": "/items"}
+            )
+            == 16
+        )
+        assert (
+            registry.get_sample_value(
+                "http_response_size_bytes_sum", {"handler": "/items"}
+            )
+            == 4
+        )
+
+    def test_streamed_body_sizes(
+        self, fastapi_app: FastAPI, registry: CollectorRegistry
+    ):
+        @fastapi_app.post("/upload")
+        async def upload(request: Request):
+            size = 0
+            async for chunk in request.stream():
+                size += len(chunk)
+            return StreamingResponse(iter([b"a" * size] * 3))
+
+        PrometheusInstrumentator(registry=registry).add(
+            metrics.default(registry=registry),
+            metrics.response_timing(registry=registry),
+        ).instrument(fastapi_app)
+        client = TestClient(fastapi_app)
+
+        response = client.post("/upload", content=iter([b"abc", b"de"]))
+
+        assert "content-length" not in response.headers
+        assert (
+            registry.get_sample_value(
+                "http_request_size_bytes_sum", {"handler": "/upload"}
+            )
+            == 5
+        )
+        assert (
+            registry.get_sample_value(
+                "http_response_size_bytes_sum", {"handler": "/upload"}
+            )
+            == 15
+        )
+        first_byte = registry.get_sample_value(
+            "http_response_first_byte_seconds_sum", {"handler": "/upload"}
+        )
+        last_byte = registry.get_sample_value(
+            "http_response_last_byte_seconds_sum", {"handler": "/upload"}
+        )
+        assert 0 < first_byte <= last_byte
+
+    def test_resolve_handler_after_routing(
+        self, fastapi_app: FastAPI, registry: CollectorRegistry
+    ):
+        sub_app = FastAPI()
+
+        @sub_app.get("/users/{user_id}")
+        def read_user(user_id: int):
+            return None
+
+        fastapi_app.mount("/api", sub_app)
+
+        infos = []
+        (
+            PrometheusInstrumentator(registry=registry)
+            .add(infos.append)
+            .instrument(fastapi_app, resolve_handler_after_routing=True)
+        )
+        client = TestClient(fastapi_app)
+
+        client.get("/items/1")
+        client.get("/api/users/1")
+        client.get("/404_does_not_exist")
+        client.post("/")
+
+        assert [info.modified_handler for info in infos] == [
+            "/items/{item_id}",
+            "/api/users/{user_id}",
+            "none",
+            "none",
+        ]
+
+    def test_max_label_sets(self, fastapi_app: FastAPI, registry: CollectorRegistry):
+        PrometheusInstrumentator(registry=registry).instrument(
+            fastapi_app, max_label_sets=2
+        )
+        client = TestClient(fastapi_app)
+
+        client.get("/")
+        client.get("/items/1")
+        client.get("/just_another_endpoint")
+        client.get("/ignore")
+
+        assert (
+            registry.get_sample_value(
+                "http_requests_total",
+                {"method": "GET", "status": "200", "handler": "/items/{item_id}"},
+            )
+            == 1
+        )
+        assert (
+            registry.get_sample_value(
+                "http_requests_total",
+                {
+                    "method": "__overflow__",
+                    "status": "__overflow__",
+                    "handler": "__overflow__",
+                },
+            )
+            == 2
+        )
+        assert (
+            registry.get_sample_value(
+                "http_label_sets_dropped_total", {"metric": "http_requests"}
+            )
+            == 2
+        )
+
+    def test_aggregated_metrics(
+        self, fastapi_app: FastAPI, registry: CollectorRegistry
+    ):
+        aggregated = AggregatedMetrics(registry=registry)
+        PrometheusInstrumentator(registry=registry).add(
+            aggregated.instrumentation
+        ).instrument(fastapi_app)
+        client = TestClient(fastapi_app)
+
+        client.get("/items/1")
+        client.get("/items/2")
+        client.post("/items", content=b'{"a": 1}')
+
+        assert (
+            registry.get_sample_value(
+                "http_requests_total",
+                {"method": "GET", "status": "200", "handler": "/items/{item_id}"},
+            )
+            == 2
+        )
+        assert (
+            registry.get_sample_value(
+                "http_request_size_bytes_sum", {"handler": "/items"}
+            )
+            == 8
+        )
+        assert (
+            registry.get_sample_value(
+                "http_request_duration_seconds_bucket",
+                {"method": "GET", "handler": "/items/{item_id}", "le": "+Inf"},
+            )
+            == 2
+        )
+        assert (
+            registry.get_sample_value("http_request_duration_highr_seconds_count", {})
+            == 3
+        )
+
+    def test_several_apps_share_registry(self, registry: CollectorRegistry):
+        clients = []
+        for _ in range(2):
+            app = FastAPI()
+            app.get("/")(lambda: None)
+            PrometheusInstrumentator(registry=registry).instrument(app)
+            clients.append(TestClient(app))
+
+        for client in clients:
+            assert client.get("/").status_code == 200
+
+    def test_get_or_create_reuses_metric(self, registry: CollectorRegistry):
+        counter = metrics.get_or_create(
+            Counter, "requests", registry, documentation="", namespace="app"
+        )
+
+        assert (
+            metrics.get_or_create(
+                Counter, "requests", registry, documentation="", namespace="app"
+            )
+            is counter
+        )
+        with pytest.raises(ValueError):
+            metrics.get_or_create(
+                Gauge, "requests", registry, documentation="", namespace="app"
+            )
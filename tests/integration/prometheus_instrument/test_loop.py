@@ -0,0 +1,54 @@
+import time
+
+import pytest
+from fastapi import FastAPI
+from prometheus_client import REGISTRY, CollectorRegistry
+from starlette.testclient import TestClient
+
+from fastapi_utils.prometheus_instrument import PrometheusInstrumentator
+from fastapi_utils.prometheus_instrument.loop import LoopMonitor
+
+
+async def blocking_endpoint():
+    time.sleep(0.3)
+    return None
+
+
+class TestLoopMonitor:
+    @pytest.fixture
+    def registry(self) -> CollectorRegistry:
+        for collector in list(REGISTRY._collector_to_names):
+            REGISTRY.unregister(collector)
+        return REGISTRY
+
+    def test_slow_callback(self, registry: CollectorRegistry):
+        app = FastAPI()
+        app.get("/block")(blocking_endpoint)
+        monitor = LoopMonitor(
+            registry=registry, interval=0.05, slow_callback_threshold=0.1
+        )
+        app.router.lifespan_context = monitor.lifespan
+
+        with TestClient(app) as client:
+            client.get("/block")
+            time.sleep(0.1)
+
+        assert (
+            registry.get_sample_value(
+                "event_loop_slow_callbacks_total", {"callback": "blocking_endpoint"}
+            )
+            == 1
+        )
+        assert registry.get_sample_value("event_loop_lag_seconds_sum") >= 0.2
+        assert registry.get_sample_value("threadpool_total_tokens") == 40
+
+    def test_instrumentator_starts_monitor(self, registry: CollectorRegistry):
+        app = FastAPI()
+        PrometheusInstrumentator(registry=registry).instrument(
+            app, monitor_event_loop=True
+        )
+
+        with TestClient(app):
+            time.sleep(0.6)
+
+        assert registry.get_sample_value("event_loop_lag_seconds_count") >= 1
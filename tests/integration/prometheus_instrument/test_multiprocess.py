@@ -0,0 +1,41 @@
+import os
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+from fastapi_utils.prometheus_instrument import multiprocess
+
+
+class TestRemoveDeadProcessFiles:
+    def test_remove_dead_process_files(self, tmp_path: pathlib.Path):
+        process = subprocess.Popen([sys.executable, "-c", "pass"])
+        process.wait()
+        dead_files = [
+            tmp_path / f"gauge_livesum_{process.pid}.db",
+            tmp_path / f"gauge_liveall_{process.pid}.db",
+        ]
+        kept_files = [
+            tmp_path / f"gauge_livesum_{os.getpid()}.db",
+            tmp_path / f"counter_{process.pid}.db",
+        ]
+        for path in dead_files + kept_files:
+            path.touch()
+
+        multiprocess.remove_dead_process_files(str(tmp_path))
+
+        assert not any(path.exists() for path in dead_files)
+        assert all(path.exists() for path in kept_files)
+
+    def test_files_removed_by_another_worker(
+        self, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+    ):
+        process = subprocess.Popen([sys.executable, "-c", "pass"])
+        process.wait()
+        removed_file = tmp_path / f"gauge_livesum_{process.pid}.db"
+        monkeypatch.setattr(
+            multiprocess.glob, "glob", lambda pattern: [str(removed_file)]
+        )
+
+        multiprocess.remove_dead_process_files(str(tmp_path))
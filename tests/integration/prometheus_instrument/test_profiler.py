@@ -0,0 +1,119 @@
+import time
+
+import pytest
+from fastapi import FastAPI
+from prometheus_client import REGISTRY, CollectorRegistry
+from starlette.testclient import TestClient
+
+from fastapi_utils.prometheus_instrument import PrometheusInstrumentator
+from fastapi_utils.prometheus_instrument.profiler import SlowRequestProfiler
+
+
+def compute_slowly():
+    time.sleep(0.2)
+
+
+class TestSlowRequestProfiler:
+    @pytest.fixture
+    def registry(self) -> CollectorRegistry:
+        for collector in list(REGISTRY._collector_to_names):
+            REGISTRY.unregister(collector)
+        return REGISTRY
+
+    @pytest.fixture
+    def fastapi_app(self, registry: CollectorRegistry) -> FastAPI:
+        app = FastAPI()
+
+        @app.get("/async/{item_id}")
+        async def read_async(item_id: int):
+            compute_slowly()
+            return item_id
+
+        @app.get("/sync")
+        def read_sync():
+            compute_slowly()
+            return None
+
+        @app.get("/fast")
+        def read_fast():
+            return None
+
+        PrometheusInstrumentator(registry=registry).instrument(
+            app, slow_request_threshold=0.05
+        ).expose(app)
+        return app
+
+    def _profile(self, client: TestClient) -> dict[str, int]:
+        response = client.get("/metrics/profile")
+        assert response.status_code == 200
+        return {
+            stack: int(count)
+            for stack, count in (
+                line.rsplit(" ", 1) for line in response.text.splitlines()
+            )
+        }
+
+    def test_async_handler(self, fastapi_app: FastAPI):
+        with TestClient(fastapi_app) as client:
+            client.get("/async/1")
+            profile = self._profile(client)
+
+        stacks = [stack for stack in profile if stack.startswith("/async/{item_id};")]
+        assert stacks
+        assert all(stack.endswith(":compute_slowly") for stack in stacks)
+        assert any("read_async" in stack for stack in stacks)
+
+    def test_sync_handler(self, fastapi_app: FastAPI):
+        with TestClient(fastapi_app) as client:
+            client.get("/sync")
+            profile = self._profile(client)
+
+        assert any(
+            stack.startswith("/sync;") and stack.endswith(":compute_slowly")
+            for stack in profile
+        )
+
+    def test_mounted_handler(self, registry: CollectorRegistry):
+        app = FastAPI()
+        v1 = FastAPI()
+
+        @v1.get("/items/{item_id}")
+        async def read_item(item_id: int):
+            compute_slowly()
+            return item_id
+
+        app.mount("/v1", v1)
+        PrometheusInstrumentator(registry=registry).instrument(
+            app, resolve_handler_after_routing=True, slow_request_threshold=0.05
+        ).expose(app)
+
+        with TestClient(app) as client:
+            client.get("/v1/items/1")
+            profile = self._profile(client)
+
+        assert profile
+        assert all(stack.startswith("/v1/items/{item_id};") for stack in profile)
+
+    def test_fast_requests_are_not_sampled(self, fastapi_app: FastAPI):
+        with TestClient(fastapi_app) as client:
+            for _ in range(10):
+                client.get("/fast")
+            assert client.get("/metrics/profile").text == ""
+
+    def test_reset(self, fastapi_app: FastAPI):
+        with TestClient(fastapi_app) as client:
+            client.get("/sync")
+            assert client.get("/metrics/profile?reset=true").text
+            assert client.get("/metrics/profile").text == ""
+
+    def test_bounded_table(self):
+        profiler = SlowRequestProfiler(max_stacks=2)
+
+        profiler._record(["/a;x", "/a;y", "/a;z", "/b;x", "/a;x"])
+
+        assert profiler.render().splitlines() == [
+            "/a;x 2",
+            "/a;y 1",
+            "/a;[other] 1",
+            "/b;[other] 1",
+        ]
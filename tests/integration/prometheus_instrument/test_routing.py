@@ -0,0 +1,98 @@
+from typing import Any
+
+import pytest
+from fastapi import APIRouter, FastAPI
+
+from fastapi_utils.prometheus_instrument import routing
+
+
+def create_scope(path: str, method: str = "GET") -> dict[str, Any]:
+    return {
+        "type": "http",
+        "path": path,
+        "root_path": "",
+        "method": method,
+        "headers": [],
+    }
+
+
+class TestRouteIndex:
+    @pytest.fixture
+    def fastapi_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.get("/")
+        def read_root():
+            return "Hello World!"
+
+        @app.get("/items/{item_id}")
+        def read_item(item_id: int):
+            return {"item_id": item_id}
+
+        @app.post("/items")
+        def create_item():
+            return None
+
+        @app.get("/{category}/latest")
+        def read_latest(category: str):
+            return None
+
+        router = APIRouter()
+
+        @router.get("/users/me")
+        def read_me():
+            return None
+
+        @router.get("/users/{user_id}")
+        def read_user(user_id: int):
+            return None
+
+        app.mount("/api", FastAPI(routes=router.routes))
+
+        return app
+
+    @pytest.mark.parametrize(
+        "path, method",
+        [
+            ("/", "GET"),
+            ("/items", "POST"),
+            ("/items", "GET"),
+            ("/items/1", "GET"),
+            ("/items/abc", "GET"),
+            ("/api/users/me", "GET"),
+            ("/api/users/me", "DELETE"),
+            ("/api/users/1", "GET"),
+            ("/api/users/abc", "GET"),
+            ("/items/latest", "GET"),
+            ("/books/latest", "GET"),
+            ("/books/latest", "PATCH"),
+            ("/does_not_exist", "GET"),
+        ],
+    )
+    def test_same_result_as_scan(self, fastapi_app: FastAPI, path: str, method: str):
+        scope = create_scope(path, method)
+        index = routing.get_route_index(fastapi_app)
+
+        assert index.get_route_name(scope) == routing._get_route_name(
+            scope, fastapi_app.routes
+        )
+
+    def test_rebuild_on_new_route(self, fastapi_app: FastAPI):
+        index = routing.get_route_index(fastapi_app)
+
+        @fastapi_app.get("/new")
+        def read_new():
+            return None
+
+        new_index = routing.get_route_index(fastapi_app)
+        assert new_index is not index
+        assert new_index.get_route_name(create_scope("/new")) == "/new"
+
+    def test_index_without_static_table(self, fastapi_app: FastAPI):
+        index = routing.RouteIndex(fastapi_app.routes, static=False)
+
+        for path in ["/", "/items/1", "/api/users/me", "/api/users/2", "/x/latest"]:
+            scope = create_scope(path)
+            assert index.get_route_name(scope) == routing._get_route_name(
+                scope, fastapi_app.routes
+            )
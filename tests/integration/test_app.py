@@ -1,3 +1,10 @@
+import anyio
+import fastapi
+import pytest
+from prometheus_client import CollectorRegistry
+
+from fastapi_utils import app as app_module
+
 # import fastapi_utils
 # import pydantic as pdt
 # import fastapi
@@ -156,3 +163,56 @@
 #         """"""
 #         response = rest_client.request(method, path)
 #         assert response.status_code == status_code
+
+
+class TestWarmUp:
+    def test_slow_step_is_skipped(self, monkeypatch: pytest.MonkeyPatch):
+        calls = []
+
+        async def slow(app: fastapi.FastAPI):
+            await anyio.sleep(10)
+
+        async def fast(app: fastapi.FastAPI):
+            calls.append(app)
+
+        monkeypatch.setattr(app_module, "WARM_UP_TIMEOUT", 0.05)
+        monkeypatch.setattr(app_module, "WARM_UP_STEPS", {"slow": slow, "fast": fast})
+        fastapi_app = fastapi.FastAPI()
+        registry = CollectorRegistry()
+
+        async def main():
+            with anyio.fail_after(1):
+                async with app_module.warm_up(fastapi_app, registry=registry):
+                    pass
+
+        anyio.run(main)
+
+        assert calls == [fastapi_app]
+        for step in ("slow", "fast"):
+            assert (
+                registry.get_sample_value(
+                    "fastapi_utils_warm_up_duration_seconds", {"step": step}
+                )
+                is not None
+            )
+
+    def test_create_app_registry(self, monkeypatch: pytest.MonkeyPatch):
+        async def fast(app: fastapi.FastAPI):
+            pass
+
+        monkeypatch.setattr(app_module, "WARM_UP_STEPS", {"fast": fast})
+        registry = CollectorRegistry()
+        fastapi_app = app_module.create_app(registry=registry)
+
+        async def main():
+            async with fastapi_app.router.lifespan_context(fastapi_app):
+                pass
+
+        anyio.run(main)
+
+        assert (
+            registry.get_sample_value(
+                "fastapi_utils_warm_up_duration_seconds", {"step": "fast"}
+            )
+            is not None
+        )